@@ -1,17 +1,54 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
+import contextvars
 import googlemaps
+import json
+import logging
 import random
 import math
 import os
-from datetime import datetime
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from functools import partial
 from dotenv import load_dotenv
 
+from boundary import CityBoundary
+from call_budget import BudgetExceeded, BudgetedClient, current_budget, request_budget
+from candidates import CandidateGenerator, ferry_filter, random_points_in_radius, water_filter
+from cities import CITIES, DEFAULT_CITY, city_data_path, local_now, DATA_DIR
+from eta_cache import EtaCache, distance_matrix_eta, parse_mode_hours
+from ferry_index import CLEAR, FERRY, FerryIndex
+from game_pool import GamePool
+from geocode_cache import GeocodeCache
+from gtfs import TransitStops
+from logs import configure_logging
+from metrics import InstrumentedClient, Metrics
+from rate_limit import QuotaLimitedClient, SharedRateLimiter, Throttled, parse_rates
+from revalidation import DailyBudget, Revalidator
+from road_nodes import RoadNodes
+from sampler import AdaptiveSampler
+from street_router import StreetRouter, load_street_graph
+from tracing import TracedClient, Tracer
+from transit_router import TransitRouter
+from water_mask import WaterMask
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Structured logging: JSON lines (LOG_FORMAT=text for plain messages) written
+# by a background thread, so request threads never block on output.
+# Per-attempt detail (origins, ETA tables, rejections) is logged at DEBUG.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
+configure_logging(LOG_LEVEL, LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
-CORS(app)
+# Expose the per-request budget headers to the frontend's fetch()
+CORS(app, expose_headers=['X-Google-Calls', 'X-Game-Source', 'Server-Timing'])
 
 # Google Maps API key from environment variable
 API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
@@ -22,57 +59,91 @@ if not API_KEY:
         "or create a local .env file with GOOGLE_MAPS_API_KEY=your_key_here."
     )
 
-# Shared Google Maps client, used for backend ETA / geocoding calls
-gmaps = googlemaps.Client(key=API_KEY)
-
-# City configurations
-CITIES = {
-    'toronto': {
-        'name': 'Toronto',
-        'center': {'lat': 43.6452, 'lng': -79.3806},  # Union Station
-        'center_name': 'Union Station',
-        'radius_km': 10,
-        'radius_meters': 10000
-    },
-    'san-francisco': {
-        'name': 'San Francisco',
-        'center': {'lat': 37.7749, 'lng': -122.4194},  # Downtown SF
-        'center_name': 'Downtown',
-        'radius_km': 10,
-        'radius_meters': 10000
-    },
-    'calgary': {
-        'name': 'Calgary',
-        'center': {'lat': 51.0447, 'lng': -114.0719},  # Downtown Calgary
-        'center_name': 'Downtown',
-        'radius_km': 10,
-        'radius_meters': 10000
-    },
-    'vancouver': {
-        'name': 'Vancouver',
-        'center': {'lat': 49.2827, 'lng': -123.1207},  # Downtown Vancouver
-        'center_name': 'Downtown',
-        'radius_km': 10,
-        'radius_meters': 10000
-    },
-    'new-york': {
-        'name': 'New York',
-        'center': {'lat': 40.7580, 'lng': -73.9855},  # Times Square
-        'center_name': 'Times Square',
-        'radius_km': 10,
-        'radius_meters': 10000
-    },
-    'boston': {
-        'name': 'Boston',
-        'center': {'lat': 42.3601, 'lng': -71.0589},  # Downtown Boston
-        'center_name': 'Downtown',
-        'radius_km': 10,
-        'radius_meters': 10000
-    }
-}
-
-# Default city
-DEFAULT_CITY = 'toronto'
+# Prometheus metrics (served on /metrics), aggregated across workers through
+# a SQLite file in the data directory
+METRICS_PATH = os.getenv('METRICS_PATH', os.path.join(DATA_DIR, 'metrics.sqlite3'))
+
+metrics = Metrics(METRICS_PATH)
+metrics.histogram('google_api_seconds', 'Latency of Google Maps API calls by operation and mode')
+metrics.counter('google_api_errors_total', 'Google Maps API calls that raised, by operation and mode')
+metrics.histogram('etaguessr_game_attempts', 'Candidate attempts per generated game',
+                  buckets=(1, 2, 3, 5, 8, 13, 20, 30))
+metrics.counter('etaguessr_games_total', 'Game generation runs by city and outcome')
+metrics.counter('etaguessr_rejections_total', 'Rejected candidates by city and reason')
+metrics.histogram('etaguessr_request_seconds', 'End-to-end /random-destination latency by city and source')
+metrics.counter('google_api_throttled_total', 'Google Maps calls refused for lack of quota, by API')
+metrics.start()
+
+# Request tracing: a span per request, per attempt and per Google call,
+# written to rotating JSON Lines files, one per worker next to TRACE_PATH
+# (data/traces.<pid>.jsonl; summarise them with
+# `python etaguessr.py traces`). A TRACE_SAMPLE_RATE fraction of requests
+# is kept, plus every request slower than TRACE_SLOW_SECONDS.
+TRACE_PATH = os.getenv('TRACE_PATH', os.path.join(DATA_DIR, 'traces.jsonl'))
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+TRACE_SLOW_SECONDS = float(os.getenv('TRACE_SLOW_SECONDS')) if os.getenv('TRACE_SLOW_SECONDS') else None
+
+tracer = Tracer(TRACE_PATH, TRACE_SAMPLE_RATE, TRACE_SLOW_SECONDS)
+
+# Per-request limits for /random-destination: at most
+# REQUEST_MAX_GOOGLE_CALLS Google calls and REQUEST_DEADLINE_SECONDS of
+# generation (keep it under the gunicorn worker timeout). When either runs
+# out the request is answered with a pooled or archived game. 0 = no limit.
+REQUEST_MAX_GOOGLE_CALLS = int(os.getenv('REQUEST_MAX_GOOGLE_CALLS', '150')) or None
+REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', '20')) or None
+
+# Longest a request waits for Google calls still in progress on pool threads
+# before reporting the calls it spent
+REQUEST_SETTLE_SECONDS = 5
+
+# Google quotas are per project, so every worker takes its calls from the
+# same token buckets, one per API (data/quota.sqlite3). GOOGLE_QPS overrides
+# the per-second rates ('directions=20,geocoding=20'; 0 = unlimited). A call
+# waits up to QUOTA_MAX_WAIT_SECONDS for a token, then is throttled, and the
+# request stops making calls (answered with a fallback game or a 503).
+GOOGLE_QPS = {api: rate for api, rate in parse_rates(os.getenv('GOOGLE_QPS')).items() if rate > 0}
+QUOTA_PATH = os.getenv('QUOTA_PATH', os.path.join(DATA_DIR, 'quota.sqlite3'))
+QUOTA_MAX_WAIT_SECONDS = float(os.getenv('QUOTA_MAX_WAIT_SECONDS', '2'))
+
+quota_limiter = SharedRateLimiter(QUOTA_PATH, GOOGLE_QPS)
+
+
+def quota_wait_seconds():
+    """How long a call may wait for quota: capped by the request's deadline."""
+    budget = current_budget()
+    remaining = budget.remaining_seconds() if budget is not None else None
+    if remaining is None:
+        return QUOTA_MAX_WAIT_SECONDS
+    return min(QUOTA_MAX_WAIT_SECONDS, remaining)
+
+
+def record_throttle(api):
+    """Count a throttled call and stop the current request's calls."""
+    metrics.inc('google_api_throttled_total', api=api)
+    logger.warning(f"Throttled {api} call: out of quota", extra={'stage': 'quota', 'api': api})
+    budget = current_budget()
+    if budget is not None:
+        budget.record_throttle()
+
+
+# Seconds before a Google call times out; transient errors are retried for
+# at most as long. Keeps a slow call from holding a request thread.
+GOOGLE_TIMEOUT_SECONDS = float(os.getenv('GOOGLE_TIMEOUT_SECONDS', '10'))
+
+# Shared Google Maps client, used for backend ETA / geocoding calls.
+# OVER_QUERY_LIMIT answers aren't retried by the client; they throttle the
+# request like a local quota miss.
+gmaps = BudgetedClient(TracedClient(QuotaLimitedClient(
+    InstrumentedClient(googlemaps.Client(
+        key=API_KEY,
+        timeout=GOOGLE_TIMEOUT_SECONDS,
+        retry_timeout=GOOGLE_TIMEOUT_SECONDS,
+        retry_over_query_limit=False
+    ), metrics),
+    quota_limiter,
+    quota_wait_seconds,
+    on_throttle=record_throttle
+), tracer))
 
 # Backwards compatibility - Toronto Union Station coordinates
 UNION_STATION = CITIES['toronto']['center']
@@ -85,27 +156,22 @@ def generate_random_point_in_radius(center_lat, center_lng, radius_meters):
     Generate a random point within a given radius of a center point.
     Uses uniform distribution for more even coverage.
     """
-    # Convert radius from meters to degrees (approximate)
-    radius_in_degrees = radius_meters / 111320.0
-
-    # Generate random angle and distance
-    angle = random.uniform(0, 2 * math.pi)
-    # Use square root for uniform distribution
-    distance = math.sqrt(random.uniform(0, 1)) * radius_in_degrees
+    lats, lngs = random_points_in_radius(center_lat, center_lng, radius_meters, 1)
+    return float(lats[0]), float(lngs[0])
 
-    # Calculate new coordinates
-    delta_lat = distance * math.cos(angle)
-    delta_lng = distance * math.sin(angle) / math.cos(math.radians(center_lat))
 
-    new_lat = center_lat + delta_lat
-    new_lng = center_lng + delta_lng
+# Places returns at most 3 pages of 20 results for one search
+PLACES_MAX_PAGES = 3
 
-    return new_lat, new_lng
+# Seconds before a Places next_page_token becomes valid
+PLACES_PAGE_TOKEN_DELAY = 2
 
 
 def get_nearby_subway_stations(center_lat, center_lng, radius_meters=10000):
     """
     Get subway/metro stations within a given radius using Places API.
+    Follows next_page_token so up to 60 stations are returned, not just the
+    first 20.
     Returns list of station coordinates.
     """
     try:
@@ -117,21 +183,191 @@ def get_nearby_subway_stations(center_lat, center_lng, radius_meters=10000):
         )
 
         stations = []
-        if places_result.get('results'):
-            for place in places_result['results']:
+        seen = set()
+        for page in range(PLACES_MAX_PAGES):
+            for place in places_result.get('results', []):
                 location = place['geometry']['location']
+                place_id = place.get('place_id') or (location['lat'], location['lng'])
+                if place_id in seen:
+                    continue
+                seen.add(place_id)
+
                 stations.append({
                     'lat': location['lat'],
                     'lng': location['lng'],
                     'name': place.get('name', 'Unknown Station')
                 })
 
+            page_token = places_result.get('next_page_token')
+            if not page_token or page + 1 == PLACES_MAX_PAGES:
+                break
+            time.sleep(PLACES_PAGE_TOKEN_DELAY)
+            places_result = gmaps.places_nearby(page_token=page_token)
+
         return stations
     except Exception as e:
-        print(f"Warning: Could not fetch subway stations: {e}")
+        logger.warning(f"Could not fetch subway stations: {e}")
         return []
 
 
+# Subway stations per city, kept in memory so origin sampling never calls
+# Places. Warmed in the background at startup and refreshed every
+# STATION_CACHE_TTL_HOURS. While a city's list is still empty (the warm-up
+# failed), its fetch is retried with a backoff instead.
+STATION_CACHE_TTL_HOURS = float(os.getenv('STATION_CACHE_TTL_HOURS', '24'))
+STATION_RETRY_SECONDS = 30
+STATION_MAX_RETRY_SECONDS = 30 * 60
+
+station_cache = {}
+station_cache_lock = threading.Lock()
+
+
+def city_key(city_config):
+    """Key for per-city sampling data: the centre and radius of the city."""
+    center = city_config['center']
+    return (center['lat'], center['lng'], city_config['radius_meters'])
+
+
+def refresh_station_cache(missing_only=False):
+    """
+    Re-fetch the subway stations for every city (with missing_only, just
+    the cities that have none cached). A city keeps its previous list if
+    the new fetch comes back empty. Returns the number of cities still
+    without stations.
+    """
+    missing = 0
+    for city_id, city_config in CITIES.items():
+        if city_key(city_config) in transit_stops:
+            # Origins for this city are sampled from its GTFS stops instead
+            continue
+        if missing_only and get_cached_stations(city_config):
+            continue
+
+        center = city_config['center']
+        stations = get_nearby_subway_stations(center['lat'], center['lng'], city_config['radius_meters'])
+        if not stations:
+            if not get_cached_stations(city_config):
+                missing += 1
+            continue
+        with station_cache_lock:
+            station_cache[city_key(city_config)] = stations
+        logger.info(f"✓ Cached {len(stations)} subway stations for {city_config['name']}")
+    return missing
+
+
+def get_cached_stations(city_config):
+    """
+    Cached subway stations for a city (no network call). Empty until the
+    cache has been warmed.
+    """
+    with station_cache_lock:
+        return station_cache.get(city_key(city_config), [])
+
+
+# Transit stops from local GTFS feeds (data/<city_id>/gtfs/), used for
+# origin sampling instead of Places. Cities without a feed use the station
+# cache. Set GTFS_STOP_WEIGHTS=frequency to weight stops by departures.
+GTFS_STOP_WEIGHTS = os.getenv('GTFS_STOP_WEIGHTS', 'uniform')
+
+
+def load_transit_stops():
+    """
+    Load the GTFS stops for every city that has a feed.
+    """
+    stops = {}
+    for city_id, city_config in CITIES.items():
+        gtfs_dir = city_data_path(city_id, 'gtfs')
+        if not os.path.exists(os.path.join(gtfs_dir, 'stops.txt')):
+            continue
+        try:
+            city_stops = TransitStops.from_gtfs(
+                gtfs_dir,
+                city_config,
+                weight_by_frequency=GTFS_STOP_WEIGHTS == 'frequency'
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load GTFS stops for {city_id}: {e}", extra={'city': city_id})
+            continue
+        if len(city_stops):
+            stops[city_key(city_config)] = city_stops
+            logger.info(f"✓ Loaded {len(city_stops)} GTFS stops for {city_config['name']}", extra={'city': city_id})
+    return stops
+
+
+transit_stops = load_transit_stops()
+
+
+def start_station_refresher():
+    """
+    Warm the station cache and keep it refreshed in a daemon thread. Cities
+    left without stations are retried with an exponential backoff; the long
+    refresh interval only starts once every city has some.
+    """
+    def run():
+        missing = refresh_station_cache()
+        while True:
+            delay = STATION_RETRY_SECONDS
+            while missing:
+                logger.warning(f"No subway stations cached for {missing} cities, retrying in {delay}s")
+                time.sleep(delay)
+                delay = min(STATION_MAX_RETRY_SECONDS, delay * 2)
+                missing = refresh_station_cache(missing_only=True)
+            time.sleep(STATION_CACHE_TTL_HOURS * 3600)
+            missing = refresh_station_cache()
+
+    threading.Thread(target=run, name='station-refresh', daemon=True).start()
+
+
+start_station_refresher()
+
+
+# Adaptive importance sampling (see sampler.py): points are drawn from grid
+# cells in proportion to how often candidates there have been accepted.
+# Set ADAPTIVE_SAMPLING=false to sample uniformly over the radius.
+ADAPTIVE_SAMPLING = os.getenv('ADAPTIVE_SAMPLING', 'true').lower() in ('1', 'true', 'yes')
+SAMPLER_CELL_METERS = float(os.getenv('SAMPLER_CELL_METERS', '500'))
+SAMPLER_FLOOR = float(os.getenv('SAMPLER_FLOOR', '0.05'))
+
+samplers = {
+    city_key(city_config): AdaptiveSampler(city_config, cell_meters=SAMPLER_CELL_METERS, floor=SAMPLER_FLOOR)
+    for city_config in CITIES.values()
+} if ADAPTIVE_SAMPLING else {}
+
+
+def sample_point(city_config, radius_meters):
+    """
+    Random point within radius_meters of a city's centre, from the city's
+    adaptive sampler when adaptive sampling is on.
+    """
+    sampler = samplers.get(city_key(city_config))
+    if sampler is not None:
+        return sampler.sample(radius_meters)
+
+    center = city_config['center']
+    return generate_random_point_in_radius(center['lat'], center['lng'], radius_meters)
+
+
+def record_sampled_points(city_config, points, reason):
+    """
+    Feed a candidate's outcome back to the city's adaptive sampler.
+    Accepted candidates count for every point; a rejection only counts
+    against the points it blames (route failures also blame the destination).
+    """
+    sampler = samplers.get(city_key(city_config))
+    if sampler is None:
+        return
+
+    if reason is None:
+        blamed = set(points)
+    else:
+        blamed = {name for name in points if name in reason}
+        if 'requires ferry' in reason or 'missing modes' in reason:
+            blamed.add('destination')
+
+    for name in blamed:
+        sampler.record(points[name]['lat'], points[name]['lng'], reason is None)
+
+
 def generate_biased_origin(city_config):
     """
     Generate origin with bias toward transit stations or city center proximity.
@@ -148,11 +384,20 @@ def generate_biased_origin(city_config):
     if rand < 0.6:
         # Try to get near transit station
         try:
-            stations = get_nearby_subway_stations(
-                center['lat'],
-                center['lng'],
-                radius_meters
-            )
+            stops = transit_stops.get(city_key(city_config))
+            if stops:
+                # Pick a GTFS stop and generate point within 500m
+                stop = stops.sample()
+                origin_lat, origin_lng = generate_random_point_in_radius(
+                    stops.lats[stop],
+                    stops.lngs[stop],
+                    500  # 500m radius around stop
+                )
+                logger.debug(f"→ Generated origin near transit stop: {stops.names[stop]}",
+                             extra={'stage': 'origin', 'source': 'gtfs_stop'})
+                return origin_lat, origin_lng
+
+            stations = get_cached_stations(city_config)
 
             if stations:
                 # Pick random station and generate point within 500m
@@ -162,39 +407,124 @@ def generate_biased_origin(city_config):
                     station['lng'],
                     500  # 500m radius around station
                 )
-                print(f"  → Generated origin near transit station: {station['name']}")
+                logger.debug(f"→ Generated origin near transit station: {station['name']}",
+                             extra={'stage': 'origin', 'source': 'station'})
                 return origin_lat, origin_lng
         except Exception as e:
-            print(f"  → Transit station selection failed, falling back to random: {e}")
+            logger.warning(f"Transit station selection failed, falling back to random: {e}", extra={'stage': 'origin'})
 
     if rand < 0.8:
         # Within 3km of city center
-        origin_lat, origin_lng = generate_random_point_in_radius(
-            center['lat'],
-            center['lng'],
-            3000  # 3km radius
-        )
-        print(f"  → Generated origin near {center_name} (< 3km)")
+        origin_lat, origin_lng = sample_point(city_config, 3000)  # 3km radius
+        logger.debug(f"→ Generated origin near {center_name} (< 3km)", extra={'stage': 'origin', 'source': 'center'})
         return origin_lat, origin_lng
 
     # Anywhere in city radius
-    origin_lat, origin_lng = generate_random_point_in_radius(
-        center['lat'],
-        center['lng'],
-        radius_meters
-    )
-    print(f"  → Generated origin anywhere in {city_config['radius_km']}km radius")
+    origin_lat, origin_lng = sample_point(city_config, radius_meters)
+    logger.debug(f"→ Generated origin anywhere in {city_config['radius_km']}km radius",
+                 extra={'stage': 'origin', 'source': 'radius'})
     return origin_lat, origin_lng
 
 
+# Reverse-geocode results cached in a local SQLite file shared by every
+# worker, so the water check and the address lookup for a point cost one call.
+# Set GEOCODE_CACHE_SIZE=0 to disable the cache.
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', '100000'))
+GEOCODE_CACHE_PRECISION = int(os.getenv('GEOCODE_CACHE_PRECISION', '5'))
+GEOCODE_CACHE_TTL_DAYS = float(os.getenv('GEOCODE_CACHE_TTL_DAYS', '30'))
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', os.path.join(DATA_DIR, 'geocode_cache.sqlite3'))
+
+geocode_cache = GeocodeCache(
+    GEOCODE_CACHE_PATH,
+    precision=GEOCODE_CACHE_PRECISION,
+    max_entries=GEOCODE_CACHE_SIZE,
+    ttl_seconds=GEOCODE_CACHE_TTL_DAYS * 24 * 3600
+) if GEOCODE_CACHE_SIZE > 0 else None
+
+
+def reverse_geocode(lat, lng):
+    """
+    Reverse geocode a point through the shared cache.
+    """
+    if geocode_cache is None:
+        return gmaps.reverse_geocode((lat, lng))
+
+    result = geocode_cache.get(lat, lng)
+    if result is None:
+        result = gmaps.reverse_geocode((lat, lng))
+        geocode_cache.put(lat, lng, result)
+    return result
+
+
+# ETAs cached in a local SQLite file shared by every worker, keyed on the
+# endpoints' grid cells, the mode and (for driving and transit) a weekday +
+# 15-minute departure bucket. ETA_CACHE_TTL_HOURS overrides the per-mode TTLs,
+# e.g. 'driving=6,transit=72'. Set ETA_CACHE_SIZE=0 to disable the cache.
+ETA_CACHE_SIZE = int(os.getenv('ETA_CACHE_SIZE', '500000'))
+ETA_CACHE_CELL_METERS = float(os.getenv('ETA_CACHE_CELL_METERS', '100'))
+ETA_CACHE_TTL_HOURS = parse_mode_hours(os.getenv('ETA_CACHE_TTL_HOURS'))
+ETA_CACHE_PATH = os.getenv('ETA_CACHE_PATH', os.path.join(DATA_DIR, 'eta_cache.sqlite3'))
+
+eta_cache = EtaCache(
+    ETA_CACHE_PATH,
+    cell_meters=ETA_CACHE_CELL_METERS,
+    ttl_hours=ETA_CACHE_TTL_HOURS,
+    max_entries=ETA_CACHE_SIZE
+) if ETA_CACHE_SIZE > 0 else None
+
+
+# Precomputed per-city land/water masks (see water_mask.py). Points outside
+# every mask are treated as land unless WATER_CHECK_API_FALLBACK is set, in
+# which case they go through the reverse-geocode heuristic instead.
+WATER_CHECK_API_FALLBACK = os.getenv('WATER_CHECK_API_FALLBACK', '').lower() in ('1', 'true', 'yes')
+
+
+def load_water_masks():
+    """
+    Load the water mask for every city that has one built.
+    """
+    masks = {}
+    for city_id in CITIES:
+        path = city_data_path(city_id, 'water_mask.npy')
+        if not os.path.exists(path):
+            continue
+        try:
+            masks[city_id] = WaterMask.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load water mask for {city_id}: {e}", extra={'city': city_id})
+    return masks
+
+
+water_masks = load_water_masks()
+
+
 def is_on_water(destination):
     """
     Check if a destination point is on water (lake, ocean, etc.).
     Returns True if on water, False if on land.
+    Uses the precomputed water masks; the reverse-geocode heuristic is only
+    used for points no mask covers, and only if WATER_CHECK_API_FALLBACK is set.
+    """
+    for mask in water_masks.values():
+        on_water = mask.is_water(destination['lat'], destination['lng'])
+        if on_water is not None:
+            return on_water
+
+    if WATER_CHECK_API_FALLBACK:
+        return is_on_water_geocode(destination)
+
+    # No mask covers this point, assume it's on land
+    return False
+
+
+def is_on_water_geocode(destination):
+    """
+    Check if a destination point is on water using reverse geocoding.
+    Returns True if on water, False if on land.
     """
     try:
         # Reverse geocode the location
-        result = gmaps.reverse_geocode((destination['lat'], destination['lng']))
+        result = reverse_geocode(destination['lat'], destination['lng'])
 
         if not result:
             # No result means likely in water or invalid location
@@ -228,252 +558,1439 @@ def is_on_water(destination):
         return False
 
     except Exception as e:
-        print(f"Warning: Could not check if on water: {e}")
+        logger.warning(f"Could not check if on water: {e}", extra={'stage': 'water'})
         # On error, assume it's not on water to avoid blocking valid locations
         return False
 
 
-def has_ferry_in_route(origin, destination):
+def get_driving_route(origin, destination):
     """
-    Check if any route to the destination requires a ferry.
-    Returns True if ferry is required, False otherwise.
+    Get the driving route with one Directions request and derive both the
+    ferry check and the driving ETA from it.
+    Returns (has_ferry, eta) where eta has the same format as the entries of
+    get_etas().
     """
     origin_str = f"{origin['lat']},{origin['lng']}"
     dest_str = f"{destination['lat']},{destination['lng']}"
+    departure = local_now(destination)
 
-    # Check driving route for ferry
     try:
         directions = gmaps.directions(
             origin_str,
             dest_str,
             mode='driving',
-            departure_time=datetime.now()
+            departure_time=departure
         )
+    except Exception as e:
+        logger.warning(f"Could not check for ferry: {e}", extra={'stage': 'ferry'})
+        return False, {'error': str(e)}
+
+    if not directions:
+        return False, {'error': 'Route not available'}
+
+    has_ferry = False
+    # Check all steps in the route for ferry
+    for leg in directions[0]['legs']:
+        for step in leg['steps']:
+            # Check if travel mode is ferry, or if instructions mention ferry
+            if (step.get('travel_mode') == 'FERRY' or
+                    'ferry' in step.get('html_instructions', '').lower()):
+                has_ferry = True
+
+    # No waypoints, so the route has a single leg
+    leg = directions[0]['legs'][0]
+    eta = {
+        'duration': leg['duration']['text'],
+        'distance': leg['distance']['text'],
+        'duration_seconds': leg['duration']['value'],
+        'distance_meters': leg['distance']['value']
+    }
+    if eta_cache is not None:
+        eta_cache.put('driving', origin, destination, eta, departure)
+    return has_ferry, eta
 
-        if directions:
-            # Check all steps in the route for ferry
-            for leg in directions[0]['legs']:
-                for step in leg['steps']:
-                    # Check if travel mode is ferry
-                    if step.get('travel_mode') == 'FERRY':
-                        return True
-                    # Check if instructions mention ferry
-                    if 'ferry' in step.get('html_instructions', '').lower():
-                        return True
 
-        return False
-    except Exception as e:
-        print(f"Warning: Could not check for ferry: {e}")
-        return False
+def has_ferry_in_route(origin, destination):
+    """
+    Check if any route to the destination requires a ferry.
+    Returns True if ferry is required, False otherwise.
+    """
+    has_ferry, _ = get_driving_route(origin, destination)
+    return has_ferry
+
+
+# Index of the cells where driving routes started or ended with a ferry
+# (see ferry_index.py). Candidates with a point in a known ferry cell are
+# rejected without an API call, and ones with every point in proven
+# ferry-free cells skip the Directions request, except for a
+# FERRY_INDEX_RECHECK_RATE share that still runs it so the counts of those
+# cells keep up with the roads. Set FERRY_INDEX_ENABLED=false to always
+# check with Directions.
+FERRY_INDEX_ENABLED = os.getenv('FERRY_INDEX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+FERRY_INDEX_PRECISION = int(os.getenv('FERRY_INDEX_PRECISION', '6'))
+FERRY_INDEX_MIN_SAMPLES = int(os.getenv('FERRY_INDEX_MIN_SAMPLES', '5'))
+FERRY_INDEX_CONFIDENCE = float(os.getenv('FERRY_INDEX_CONFIDENCE', '0.95'))
+FERRY_INDEX_PATH = os.getenv('FERRY_INDEX_PATH', os.path.join(DATA_DIR, 'ferry_index.sqlite3'))
+FERRY_INDEX_RECHECK_RATE = float(os.getenv('FERRY_INDEX_RECHECK_RATE', '0.05'))
+
+ferry_index = FerryIndex(
+    FERRY_INDEX_PATH,
+    precision=FERRY_INDEX_PRECISION,
+    min_samples=FERRY_INDEX_MIN_SAMPLES,
+    confidence=FERRY_INDEX_CONFIDENCE
+) if FERRY_INDEX_ENABLED else None
+
+
+def classify_ferry_risk(city_id, points):
+    """
+    The ferry index's verdict on a {name: point} dict of route endpoints:
+    (FERRY, name) if a point is in a known ferry cell, (CLEAR, None) if all
+    of them are in proven ferry-free cells (bar the FERRY_INDEX_RECHECK_RATE
+    share that gets checked anyway), otherwise (None, None).
+    """
+    if ferry_index is None:
+        return None, None
+    risks = {name: ferry_index.classify(city_id, point['lat'], point['lng']) for name, point in points.items()}
+    for name, risk in risks.items():
+        if risk == FERRY:
+            return FERRY, name
+    if all(risk == CLEAR for risk in risks.values()) and random.random() >= FERRY_INDEX_RECHECK_RATE:
+        return CLEAR, None
+    return None, None
 
 
-def get_etas(origin, destination):
+def record_ferry_check(city_id, origin, destination, has_ferry):
+    """Count a Directions ferry check for the cells at both ends of its route."""
+    if ferry_index is not None:
+        for point in (origin, destination):
+            ferry_index.record(city_id, point['lat'], point['lng'], has_ferry)
+
+
+# Where transit ETAs come from: 'google' (Distance Matrix) or 'gtfs' (the
+# local RAPTOR router in transit_router.py over data/<city_id>/gtfs/). With
+# 'gtfs', destinations no city's feed covers still use the Distance Matrix.
+TRANSIT_PROVIDER = os.getenv('TRANSIT_PROVIDER', 'google')
+
+
+def load_transit_routers():
     """
-    Get ETAs for all travel modes from origin to destination.
+    Build the local transit router for every city that has a GTFS feed.
     """
-    modes = ['driving', 'transit', 'bicycling', 'walking']
-    etas = {}
+    routers = {}
+    for city_id, city_config in CITIES.items():
+        gtfs_dir = city_data_path(city_id, 'gtfs')
+        if not os.path.exists(os.path.join(gtfs_dir, 'stop_times.txt')):
+            continue
+        try:
+            router = TransitRouter.from_gtfs(gtfs_dir, city_config)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not build transit router for {city_id}: {e}", extra={'city': city_id})
+            continue
+        if len(router):
+            routers[city_id] = router
+            logger.info(f"✓ Built transit router for {city_config['name']} "
+                        f"({len(router.stops)} stops, {len(router)} route patterns)", extra={'city': city_id})
+    return routers
 
-    print("\n" + "="*80)
-    print(f"ROUTE: Union Station → Destination")
-    print(f"Origin: {origin['lat']:.4f}, {origin['lng']:.4f}")
-    print(f"Destination: {destination['lat']:.4f}, {destination['lng']:.4f}")
-    print("="*80)
 
-    origin_str = f"{origin['lat']},{origin['lng']}"
-    dest_str = f"{destination['lat']},{destination['lng']}"
+# Where walking and bicycling ETAs come from: 'google' (Distance Matrix) or
+# 'osm' (the local street router in street_router.py over
+# data/<city_id>/street_graph.npz, Google for cities without a graph)
+STREET_PROVIDER = os.getenv('STREET_PROVIDER', 'google')
 
-    for mode in modes:
+STREET_MODES = ['walking', 'bicycling']
+
+
+def load_street_routers():
+    """
+    Load the street graph for every city that has one and build a router
+    per street mode. Returns {mode: {city_id: router}}.
+    """
+    routers = {mode: {} for mode in STREET_MODES}
+    for city_id, city_config in CITIES.items():
+        path = city_data_path(city_id, 'street_graph.npz')
+        if not os.path.exists(path):
+            continue
         try:
-            result = gmaps.distance_matrix(
-                origins=origin_str,
-                destinations=dest_str,
-                mode=mode,
-                departure_time=datetime.now()
-            )
+            graph = load_street_graph(path)
+            for mode in STREET_MODES:
+                router = StreetRouter(graph, mode, city_config)
+                if len(router):
+                    routers[mode][city_id] = router
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load street graph for {city_id}: {e}", extra={'city': city_id})
+            continue
+        logger.info(f"✓ Loaded street graph for {city_config['name']} ({len(graph['lats'])} nodes)",
+                    extra={'city': city_id})
+    return routers
 
-            if result['rows'][0]['elements'][0]['status'] == 'OK':
-                element = result['rows'][0]['elements'][0]
-                duration = element['duration']['text']
-                distance = element['distance']['text']
-
-                etas[mode] = {
-                    'duration': duration,
-                    'distance': distance,
-                    'duration_seconds': element['duration']['value'],
-                    'distance_meters': element['distance']['value']
-                }
-
-                # Print to console
-                mode_emoji = {
-                    'driving': '🚗',
-                    'transit': '🚇',
-                    'bicycling': '🚴',
-                    'walking': '🚶'
-                }
-                print(f"{mode_emoji.get(mode, '•')} {mode.upper():12} - {duration:15} ({distance})")
 
-            else:
-                etas[mode] = {'error': 'Route not available'}
-                print(f"• {mode.upper():12} - NOT AVAILABLE")
+# Local routers answering ETAs without the Distance Matrix, by mode then city
+local_routers = {}
+if TRANSIT_PROVIDER == 'gtfs':
+    local_routers['transit'] = load_transit_routers()
+if STREET_PROVIDER == 'osm':
+    local_routers.update(load_street_routers())
 
-        except Exception as e:
-            etas[mode] = {'error': str(e)}
-            print(f"• {mode.upper():12} - ERROR: {str(e)}")
 
-    print("="*80 + "\n")
+def format_duration(seconds):
+    """Duration text in the Distance Matrix's style, e.g. '1 hour 5 mins'."""
+    minutes = max(1, round(seconds / 60))
+    hours, minutes = divmod(minutes, 60)
+    parts = []
+    if hours:
+        parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
+    if minutes or not hours:
+        parts.append(f"{minutes} min{'s' if minutes != 1 else ''}")
+    return ' '.join(parts)
+
+
+def format_distance(meters):
+    """Distance text in the Distance Matrix's style, e.g. '850 m' or '12.3 km'."""
+    if meters < 1000:
+        return f"{round(meters)} m"
+    return f"{meters / 1000:.1f} km"
+
+
+def local_router_for(mode, point):
+    """The local router answering a mode's ETAs to a point, or None."""
+    for router in local_routers.get(mode, {}).values():
+        if router.contains(point['lat'], point['lng']):
+            return router
+    return None
+
+
+def get_local_etas(mode, origins, destination):
+    """
+    Get ETAs for one travel mode from a local router covering the
+    destination, in the same format as get_mode_etas(). Returns None if no
+    local router covers the destination for this mode.
+    """
+    router = local_router_for(mode, destination)
+    if router is None:
+        return None
+
+    try:
+        results = router.etas(
+            [(origin['lat'], origin['lng']) for origin in origins],
+            (destination['lat'], destination['lng']),
+            local_now(destination)
+        )
+    except Exception as e:
+        return [{'error': str(e)} for _ in origins]
+
+    etas = []
+    for result in results:
+        if result is None:
+            etas.append({'error': 'Route not available'})
+            continue
+        seconds, meters = result
+        etas.append({
+            'duration': format_duration(seconds),
+            'distance': format_distance(meters),
+            'duration_seconds': seconds,
+            'distance_meters': meters
+        })
+    return etas
+
+
+ETA_MODES = ['driving', 'transit', 'bicycling', 'walking']
+
+MODE_EMOJI = {
+    'driving': '🚗',
+    'transit': '🚇',
+    'bicycling': '🚴',
+    'walking': '🚶'
+}
+
+
+def get_mode_etas(mode, origins, destination):
+    """
+    Get ETAs for one travel mode from several origins to one destination
+    with a single Distance Matrix request.
+    Returns one ETA dict per origin, in the same order as origins.
+    Modes with a local router covering the destination don't call Google,
+    and origins with a cached ETA are left out of the request.
+    """
+    local_etas = get_local_etas(mode, origins, destination)
+    if local_etas is not None:
+        return local_etas
+
+    departure = local_now(destination)
+    etas = [None] * len(origins)
+    if eta_cache is not None:
+        etas = [eta_cache.get(mode, origin, destination, departure) for origin in origins]
+    missing = [i for i, eta in enumerate(etas) if eta is None]
+    if not missing:
+        return etas
+
+    origin_strs = [f"{origins[i]['lat']},{origins[i]['lng']}" for i in missing]
+    dest_str = f"{destination['lat']},{destination['lng']}"
 
+    try:
+        result = gmaps.distance_matrix(
+            origins=origin_strs,
+            destinations=dest_str,
+            mode=mode,
+            departure_time=departure
+        )
+    except Exception as e:
+        for i in missing:
+            etas[i] = {'error': str(e)}
+        return etas
+
+    for i, row in zip(missing, result['rows']):
+        etas[i] = distance_matrix_eta(row['elements'][0])
+        if eta_cache is not None:
+            eta_cache.put(mode, origins[i], destination, etas[i], departure)
     return etas
 
 
+def log_etas(origin, destination, etas):
+    """
+    Log the per-mode ETA table for one route at DEBUG level. Nothing is
+    formatted unless DEBUG is enabled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
+    lines = [
+        "=" * 80,
+        "ROUTE: Origin → Destination",
+        f"Origin: {origin['lat']:.4f}, {origin['lng']:.4f}",
+        f"Destination: {destination['lat']:.4f}, {destination['lng']:.4f}",
+        "=" * 80
+    ]
+    for mode, eta in etas.items():
+        if 'error' not in eta:
+            lines.append(f"{MODE_EMOJI.get(mode, '•')} {mode.upper():12} - {eta['duration']:15} ({eta['distance']})")
+        elif eta['error'] == 'Route not available':
+            lines.append(f"• {mode.upper():12} - NOT AVAILABLE")
+        else:
+            lines.append(f"• {mode.upper():12} - ERROR: {eta['error']}")
+    lines.append("=" * 80)
+
+    logger.debug('\n'.join(lines), extra={
+        'stage': 'etas',
+        'origin': origin,
+        'destination': destination,
+        'etas': {mode: eta.get('duration_seconds', eta.get('error')) for mode, eta in etas.items()}
+    })
+
+
+def get_etas_batch(origins, destination, modes=None):
+    """
+    Get ETAs for all travel modes from several origins to one destination.
+    Makes one Distance Matrix request per mode regardless of how many
+    origins there are, with the modes fetched concurrently.
+    Returns a list with one {mode: eta} dict per origin, in order.
+    """
+    modes = modes or ETA_MODES
+    etas = [{} for _ in origins]
+
+    results, _ = run_checks({
+        mode: partial(get_mode_etas, mode, origins, destination)
+        for mode in modes
+    })
+    for mode in modes:
+        for origin_etas, eta in zip(etas, results[mode]):
+            origin_etas[mode] = eta
+
+    for origin, origin_etas in zip(origins, etas):
+        log_etas(origin, destination, origin_etas)
+
+    return etas
+
+
+def get_etas(origin, destination):
+    """
+    Get ETAs for all travel modes from origin to destination.
+    """
+    return get_etas_batch([origin], destination)[0]
+
+
 def get_address(lat, lng):
     """
     Get human-readable address from coordinates using reverse geocoding.
+    Falls back to the coordinates if the lookup fails, but not when the
+    request is out of budget or quota (those are raised).
     """
     try:
-        result = gmaps.reverse_geocode((lat, lng))
+        result = reverse_geocode(lat, lng)
         if result:
             return result[0]['formatted_address']
         return f"{lat:.4f}, {lng:.4f}"
+    except (BudgetExceeded, Throttled):
+        raise
     except Exception as e:
-        print(f"Error getting address: {e}")
+        logger.warning(f"Could not get address: {e}", extra={'stage': 'address'})
         return f"{lat:.4f}, {lng:.4f}"
 
 
-@app.route('/random-destination', methods=['GET'])
-def random_destination():
+# Modes a game needs from both origins. Walking is fetched but not required
+# since it's not displayed to the user.
+REQUIRED_MODES = ['driving', 'transit', 'bicycling']
+
+# Number of threads used to fan out independent Google API calls within one
+# generation attempt. Set API_CONCURRENCY=1 to run every check serially.
+API_CONCURRENCY = int(os.getenv('API_CONCURRENCY', '8'))
+
+api_executor = ThreadPoolExecutor(max_workers=API_CONCURRENCY) if API_CONCURRENCY > 1 else None
+
+
+def in_current_context(fn):
     """
-    Pick TWO random origins and one destination within a city's radius
-    and return ETAs for all travel modes from both origins.
-    Only returns locations accessible by driving, transit, and bicycling.
-    Excludes routes that require ferry rides.
+    fn bound to a copy of the current context, so it runs on a pool thread
+    within the caller's trace span and request budget.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
 
-    Query parameters:
-    - city: City identifier (e.g., 'toronto', 'san-francisco'). Defaults to 'toronto'.
+
+def budget_exhausted():
     """
-    from flask import request
+    Which limit the current request has reached ('quota' if it was
+    throttled, 'calls' or 'deadline'), or None.
+    """
+    budget = current_budget()
+    return budget.exceeded() if budget is not None else None
 
-    # Get city from query parameter, default to Toronto
-    city_id = request.args.get('city', DEFAULT_CITY)
 
-    # Validate city
-    if city_id not in CITIES:
-        return jsonify({
-            'error': f'Invalid city: {city_id}. Available cities: {list(CITIES.keys())}'
-        }), 400
+# Result of a run_checks() task skipped because its candidate was cancelled
+CANCELLED = object()
+
+
+def run_checks(tasks, reject=None, cancelled=None):
+    """
+    Run independent API calls, concurrently when the thread-pool mode is on.
+
+    - tasks: dict of name -> zero-argument callable.
+    - reject: optional callable (name, result) -> rejection reason or None.
+    - cancelled: optional event; once it is set, tasks that haven't started
+      are skipped instead of calling Google.
 
+    Returns (results, None) with a name -> result dict when nothing was
+    rejected, or (None, reason) as soon as any result is rejected (reason
+    "cancelled" once cancelled is set). On rejection, outstanding calls that
+    haven't started yet are cancelled.
+
+    Inside a request with a deadline, results are only waited for until
+    then: BudgetExceeded is raised, and calls already in progress finish in
+    the background.
+    """
+    results = {}
+    # Google call spans started by each task, to tag with the rejection reason
+    call_spans = {}
+
+    def traced(name, task):
+        def run():
+            if cancelled is not None and cancelled.is_set():
+                return CANCELLED
+            with tracer.collect() as spans:
+                call_spans[name] = spans
+                return task()
+        return in_current_context(run)
+
+    def rejected(name, reason):
+        for span in call_spans.get(name, []):
+            span.set(rejection=reason)
+        return None, reason
+
+    if api_executor is None:
+        for name, task in tasks.items():
+            results[name] = traced(name, task)()
+            if results[name] is CANCELLED:
+                return None, "cancelled"
+            reason = reject(name, results[name]) if reject else None
+            if reason:
+                return rejected(name, reason)
+        return results, None
+
+    budget = current_budget()
+    timeout = budget.remaining_seconds() if budget is not None else None
+    futures = {api_executor.submit(traced(name, task)): name for name, task in tasks.items()}
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            name = futures[future]
+            results[name] = future.result()
+            if results[name] is CANCELLED:
+                return None, "cancelled"
+            reason = reject(name, results[name]) if reject else None
+            if reason:
+                return rejected(name, reason)
+    except TimeoutError:
+        budget.expire()
+        raise BudgetExceeded(f"Request deadline budget exhausted after {budget.calls} calls "
+                             f"in {budget.elapsed():.1f}s")
+    finally:
+        for future in futures:
+            future.cancel()
+
+    return results, None
+
+
+def evaluate_candidate(city_id, origin1, origin2, destination, cancelled=None):
+    """
+    Run every check on a candidate (origin1, origin2, destination) triple:
+    1. all three points are inside the city boundary (if the city has one),
+       none of them is in a known ferry cell, and none of them is on water
+    2. neither route needs a ferry, and all required modes are available
+       from both origins (the driving ETA comes from the ferry check's
+       directions request, unless all three cells are proven ferry-free
+       and directions are skipped)
+
+    Addresses aren't looked up here; with_addresses() adds them to the one
+    candidate that gets served. If the optional cancelled event gets set
+    (another candidate already won), no further Google calls are made.
+
+    Returns (game, None) for a valid candidate, or (None, reason) if it was
+    rejected.
+    """
+    points = {'origin1': origin1, 'origin2': origin2, 'destination': destination}
+
+    boundary = city_boundaries.get(city_id)
+    if boundary is not None:
+        inside = boundary.contains_many(
+            [point['lat'] for point in points.values()],
+            [point['lng'] for point in points.values()]
+        )
+        for name, is_inside in zip(points, inside):
+            if not is_inside:
+                return None, f"{name} is outside the city boundary"
+
+    ferry_risk, name = classify_ferry_risk(city_id, points)
+    if ferry_risk == FERRY:
+        return None, f"{name} is in a known ferry cell"
+
+    # Water checks for all three points
+    _, reason = run_checks(
+        {name: partial(is_on_water, point) for name, point in points.items()},
+        lambda name, on_water: f"{name} is on water" if on_water else None,
+        cancelled
+    )
+    if reason:
+        return None, reason
+
+    # Driving routes (ferry check + driving ETA) and every other mode's ETAs
+    # (both origins per request). Between proven ferry-free cells the
+    # driving ETA comes from the distance matrix like the other modes.
+    tasks = {}
+    if ferry_risk != CLEAR:
+        tasks['origin1'] = partial(get_driving_route, origin1, destination)
+        tasks['origin2'] = partial(get_driving_route, origin2, destination)
+    for mode in ETA_MODES:
+        if mode != 'driving' or ferry_risk == CLEAR:
+            tasks[mode] = partial(get_mode_etas, mode, [origin1, origin2], destination)
+
+    def reject_route(name, result):
+        if name in points:
+            has_ferry, driving_eta = result
+            if 'error' not in driving_eta:
+                record_ferry_check(city_id, points[name], destination, has_ferry)
+            if has_ferry:
+                return f"{name} requires ferry"
+            if 'error' in driving_eta:
+                return f"{name} missing modes: ['driving']"
+            return None
+        if name in REQUIRED_MODES:
+            for origin_name, eta in zip(['origin1', 'origin2'], result):
+                if 'error' in eta:
+                    return f"{origin_name} missing modes: {[name]}"
+        return None
+
+    results, reason = run_checks(tasks, reject_route, cancelled)
+    if reason:
+        return None, reason
+
+    if 'driving' not in results:
+        results['driving'] = [results['origin1'][1], results['origin2'][1]]
+    etas1 = {mode: results[mode][0] for mode in ETA_MODES}
+    etas2 = {mode: results[mode][1] for mode in ETA_MODES}
+    log_etas(origin1, destination, etas1)
+    log_etas(origin2, destination, etas2)
+
+    return {
+        'origin1': origin1,
+        'origin2': origin2,
+        'destination': destination,
+        'etas1': etas1,
+        'etas2': etas2,
+        'validated_at': time.time()
+    }, None
+
+
+def with_addresses(game):
+    """A validated game with the human-readable addresses of its three points."""
+    names = ['origin1', 'origin2', 'destination']
+    addresses, _ = run_checks({
+        name: partial(get_address, game[name]['lat'], game[name]['lng'])
+        for name in names
+    })
+    return dict(game, **{f"{name}_address": addresses[name] for name in names})
+
+
+# Speculative candidate evaluation: keep up to K candidate triples in flight
+# at once and serve the first valid one. K is set per city with
+# 'speculative_k' in CITIES (falling back to SPECULATIVE_K) and is lowered
+# automatically for cities whose observed acceptance rate is high.
+# SPECULATIVE_K=1 keeps attempts strictly sequential.
+SPECULATIVE_K = int(os.getenv('SPECULATIVE_K', '1'))
+
+# Probability of at least one valid candidate per round that K is sized for
+SPECULATIVE_TARGET = 0.8
+
+# Minimum attempts seen for a city before its acceptance rate is trusted
+SPECULATIVE_MIN_SAMPLES = 10
+
+# Per-city {'attempts': n, 'accepted': n} counts, shared by all requests
+acceptance_stats = {city_id: {'attempts': 0, 'accepted': 0} for city_id in CITIES}
+acceptance_lock = threading.Lock()
+
+# Room for a request's candidates next to the refill worker's, and next to
+# candidates a request gave up on at its deadline that are still finishing
+candidate_executor = ThreadPoolExecutor(
+    max_workers=2 * max([SPECULATIVE_K] + [c.get('speculative_k', 1) for c in CITIES.values()])
+)
+
+
+def record_attempt(city_id, accepted):
+    """Record the outcome of one candidate for a city's acceptance rate."""
+    with acceptance_lock:
+        stats = acceptance_stats[city_id]
+        stats['attempts'] += 1
+        if accepted:
+            stats['accepted'] += 1
+
+
+def get_speculative_k(city_id):
+    """
+    Number of candidates to evaluate concurrently for a city.
+    Starts at the configured K and, once enough attempts have been seen, is
+    reduced to the smallest K that finds a valid candidate in one round with
+    probability SPECULATIVE_TARGET at the city's observed acceptance rate.
+    """
+    max_k = CITIES[city_id].get('speculative_k', SPECULATIVE_K)
+
+    with acceptance_lock:
+        attempts = acceptance_stats[city_id]['attempts']
+        accepted = acceptance_stats[city_id]['accepted']
+
+    if max_k <= 1 or attempts < SPECULATIVE_MIN_SAMPLES:
+        return max(1, max_k)
+
+    # Smoothed acceptance rate, so a run of failures never divides by zero
+    rate = (accepted + 1) / (attempts + 2)
+    if rate >= SPECULATIVE_TARGET:
+        return 1
+    k = math.ceil(math.log(1 - SPECULATIVE_TARGET) / math.log(1 - rate))
+    return max(1, min(max_k, k))
+
+
+# Optional city boundary polygons (data/<city_id>/boundary.geojson). Points
+# outside a city's boundary are rejected before any API call.
+BOUNDARY_GRID_METERS = float(os.getenv('BOUNDARY_GRID_METERS', '100'))
+
+
+def load_city_boundaries():
+    """
+    Load the boundary polygon for every city that has one.
+    """
+    boundaries = {}
+    for city_id, city_config in CITIES.items():
+        path = city_data_path(city_id, 'boundary.geojson')
+        if not os.path.exists(path):
+            continue
+        try:
+            boundaries[city_id] = CityBoundary.from_geojson(path, city_config, BOUNDARY_GRID_METERS)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            logger.warning(f"Could not load boundary for {city_id}: {e}", extra={'city': city_id})
+    return boundaries
+
+
+city_boundaries = load_city_boundaries()
+
+
+# Road nodes extracted from a local OSM extract (data/<city_id>/road_nodes.npy).
+# Candidate origins and destinations are snapped to the nearest routable road
+# point within ROAD_SNAP_TOLERANCE_METERS before validation.
+ROAD_SNAP_TOLERANCE_METERS = float(os.getenv('ROAD_SNAP_TOLERANCE_METERS', '150'))
+
+# Attempts at drawing an origin that lies close enough to a road
+ROAD_SNAP_ORIGIN_TRIES = 5
+
+
+def load_road_nodes():
+    """
+    Load the road nodes for every city that has them.
+    """
+    nodes = {}
+    for city_id, city_config in CITIES.items():
+        path = city_data_path(city_id, 'road_nodes.npy')
+        if not os.path.exists(path):
+            continue
+        try:
+            city_nodes = RoadNodes.load(path, city_config)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load road nodes for {city_id}: {e}", extra={'city': city_id})
+            continue
+        if len(city_nodes):
+            nodes[city_id] = city_nodes
+            logger.info(f"✓ Loaded {len(city_nodes)} road nodes for {city_config['name']}", extra={'city': city_id})
+    return nodes
+
+
+road_nodes = load_road_nodes()
+
+
+def generate_snapped_origin(city_id):
+    """
+    Generate a biased origin snapped onto a road. Redraws if no road is
+    within the tolerance, and keeps the last unsnapped origin if none of the
+    tries could be snapped.
+    """
+    city_config = CITIES[city_id]
+    nodes = road_nodes.get(city_id)
+
+    origin_lat, origin_lng = generate_biased_origin(city_config)
+    if nodes is None:
+        return origin_lat, origin_lng
+
+    for _ in range(ROAD_SNAP_ORIGIN_TRIES):
+        snapped = nodes.snap(origin_lat, origin_lng, ROAD_SNAP_TOLERANCE_METERS)
+        if snapped is not None:
+            return snapped
+        origin_lat, origin_lng = generate_biased_origin(city_config)
+
+    return origin_lat, origin_lng
+
+
+# Destinations are drawn in batches of CANDIDATE_BATCH_SIZE and prefiltered
+# against the city boundary, water mask and known ferry cells before any API
+# call.
+CANDIDATE_BATCH_SIZE = int(os.getenv('CANDIDATE_BATCH_SIZE', '64'))
+
+
+def build_candidate_generator(city_id):
+    """
+    Destination generator for a city: draws from the adaptive sampler (or
+    uniformly over the radius), snaps onto roads if the city has road nodes,
+    and filters with every local check available.
+    """
     city_config = CITIES[city_id]
+    filters = []
+    if city_id in city_boundaries:
+        filters.append(city_boundaries[city_id].contains_many)
+    if city_id in water_masks:
+        filters.append(water_filter(water_masks[city_id]))
+    if ferry_index is not None:
+        filters.append(ferry_filter(ferry_index, city_id))
+
+    snap = None
+    if city_id in road_nodes:
+        snap = partial(road_nodes[city_id].snap_many, tolerance_meters=ROAD_SNAP_TOLERANCE_METERS)
+
+    sampler = samplers.get(city_key(city_config))
+    if sampler is not None:
+        return CandidateGenerator(sampler.sample_many, filters, snap)
+
     center = city_config['center']
-    radius_meters = city_config['radius_meters']
+    return CandidateGenerator.uniform(center['lat'], center['lng'], city_config['radius_meters'], filters, snap)
 
-    print(f"\n🌆 Generating game for {city_config['name']}")
 
-    max_attempts = 30  # Try up to 30 times to find valid origins/destination
+candidate_generators = {city_id: build_candidate_generator(city_id) for city_id in CITIES}
+destination_buffers = {city_id: deque() for city_id in CITIES}
+destination_lock = threading.Lock()
 
-    for attempt in range(max_attempts):
-        try:
-            # Generate first origin
-            origin1_lat, origin1_lng = generate_biased_origin(city_config)
-            origin1 = {
-                'lat': origin1_lat,
-                'lng': origin1_lng
-            }
 
-            # Check if origin1 is on water - skip if it is
-            if is_on_water(origin1):
-                print(f"✗ Attempt {attempt + 1}: Skipping - origin1 is on water")
-                continue
+def next_destination(city_id):
+    """
+    Next prefiltered destination for a city, refilling its buffer with a
+    new batch when it runs out.
+    """
+    with destination_lock:
+        if destination_buffers[city_id]:
+            return destination_buffers[city_id].popleft()
 
-            # Generate second origin
-            origin2_lat, origin2_lng = generate_biased_origin(city_config)
-            origin2 = {
-                'lat': origin2_lat,
-                'lng': origin2_lng
-            }
+    lats, lngs = candidate_generators[city_id].generate(CANDIDATE_BATCH_SIZE)
 
-            # Check if origin2 is on water - skip if it is
-            if is_on_water(origin2):
-                print(f"✗ Attempt {attempt + 1}: Skipping - origin2 is on water")
-                continue
+    with destination_lock:
+        destination_buffers[city_id].extend(zip(lats.tolist(), lngs.tolist()))
+        if destination_buffers[city_id]:
+            return destination_buffers[city_id].popleft()
 
-            # Generate random destination
-            dest_lat, dest_lng = generate_random_point_in_radius(
-                center['lat'],
-                center['lng'],
-                radius_meters
-            )
+    # Every drawn point was filtered out, fall back to an unfiltered one
+    city_config = CITIES[city_id]
+    return sample_point(city_config, city_config['radius_meters'])
 
-            destination = {
-                'lat': dest_lat,
-                'lng': dest_lng
-            }
 
-            # Check if destination is on water - skip if it is
-            if is_on_water(destination):
-                print(f"✗ Attempt {attempt + 1}: Skipping - destination is on water")
-                continue
+def sample_candidate(city_id):
+    """
+    Generate a candidate (origin1, origin2, destination) triple for a city.
+    """
+    origin1_lat, origin1_lng = generate_snapped_origin(city_id)
+    origin2_lat, origin2_lng = generate_snapped_origin(city_id)
+    dest_lat, dest_lng = next_destination(city_id)
+
+    return (
+        {'lat': origin1_lat, 'lng': origin1_lng},
+        {'lat': origin2_lat, 'lng': origin2_lng},
+        {'lat': dest_lat, 'lng': dest_lng}
+    )
 
-            # Check if routes require ferry - skip if any do
-            if has_ferry_in_route(origin1, destination):
-                print(f"✗ Attempt {attempt + 1}: Skipping - origin1 requires ferry")
-                continue
 
-            if has_ferry_in_route(origin2, destination):
-                print(f"✗ Attempt {attempt + 1}: Skipping - origin2 requires ferry")
-                continue
+def rejection_category(reason):
+    """Coarse label for a rejection reason, for the rejections counter."""
+    if reason.startswith('Error'):
+        return 'error'
+    for needle, category in (('on water', 'water'), ('ferry', 'ferry'),
+                             ('missing modes', 'missing_modes'), ('boundary', 'boundary')):
+        if needle in reason:
+            return category
+    return 'other'
 
-            # Get ETAs for all modes from both origins
-            etas1 = get_etas(origin1, destination)
-            etas2 = get_etas(origin2, destination)
 
-            # Check if all three modes are available (no errors) for both origins
-            # Excluding walking as it's not displayed to the user
-            required_modes = ['driving', 'transit', 'bicycling']
-            all_modes_available_1 = all(
-                mode in etas1 and 'error' not in etas1[mode]
-                for mode in required_modes
-            )
-            all_modes_available_2 = all(
-                mode in etas2 and 'error' not in etas2[mode]
-                for mode in required_modes
-            )
+def run_attempt(city_id, attempt, cancelled=None):
+    """
+    Sample one candidate for a city and run every check on it.
+    Returns the game dict, or None if the candidate was rejected.
+    """
+    with tracer.span('attempt', city=city_id, attempt=attempt):
+        return evaluate_attempt(city_id, attempt, cancelled)
 
-            if not all_modes_available_1:
-                missing_modes = [m for m in required_modes if m not in etas1 or 'error' in etas1[m]]
-                print(f"✗ Attempt {attempt + 1}: Skipping - origin1 missing modes: {missing_modes}")
-                continue
 
-            if not all_modes_available_2:
-                missing_modes = [m for m in required_modes if m not in etas2 or 'error' in etas2[m]]
-                print(f"✗ Attempt {attempt + 1}: Skipping - origin2 missing modes: {missing_modes}")
+def evaluate_attempt(city_id, attempt, cancelled=None):
+    """run_attempt() inside the attempt's trace span."""
+    city_config = CITIES[city_id]
+    points = None
+    start = time.perf_counter()
+    try:
+        origin1, origin2, destination = sample_candidate(city_id)
+        points = {'origin1': origin1, 'origin2': origin2, 'destination': destination}
+        game, reason = evaluate_candidate(city_id, origin1, origin2, destination, cancelled)
+    except Exception as e:
+        game, reason = None, f"Error - {str(e)}"
+
+    if cancelled is not None and cancelled.is_set():
+        # Another candidate already won; don't count this one either way
+        tracer.set(cancelled=True)
+        return game
+    limit = budget_exhausted() if game is None else None
+    if limit:
+        # Cut short by the request's budget or throttled, which says nothing
+        # about the candidate
+        tracer.set(out_of_budget=limit)
+        logger.debug(f"✗ Attempt {attempt}: Stopped - out of {limit} budget",
+                     extra={'city': city_id, 'attempt': attempt, 'stage': 'stopped', 'reason': limit})
+        return None
+
+    record_attempt(city_id, game is not None)
+    if points is not None and not (reason or '').startswith('Error'):
+        record_sampled_points(city_config, points, reason)
+    context = {'city': city_id, 'attempt': attempt, 'duration': round(time.perf_counter() - start, 3)}
+    if reason:
+        category = rejection_category(reason)
+        metrics.inc('etaguessr_rejections_total', city=city_id, reason=category)
+        tracer.set(rejection=reason, category=category)
+        logger.debug(f"✗ Attempt {attempt}: Skipping - {reason}",
+                     extra=dict(context, stage='rejected', reason=category))
+    else:
+        tracer.set(found=True)
+        logger.debug(f"✓ Found valid origins/destination on attempt {attempt}", extra=dict(context, stage='found'))
+    return game
+
+
+def generate_game(city_id, max_attempts=30):
+    """
+    Pick TWO random origins and one destination within a city's radius
+    and get ETAs for all travel modes from both origins.
+    Only accepts locations accessible by driving, transit, and bicycling.
+    Excludes routes that require ferry rides.
+
+    Candidates are checked on candidate_executor. With speculative
+    evaluation on (K > 1), up to K are checked concurrently and the first
+    valid one wins; no new candidates are submitted once it has, and the
+    others stop before their next Google call. Losers that had already
+    passed every check, or pass them while finishing, go to the game pool.
+    Only the served game's addresses are looked up.
+
+    Inside a request budget (see call_budget.py), no new attempts start once
+    it runs out, and generation gives up at its deadline without waiting
+    for the candidates still in flight.
+
+    Returns the game dict served by /random-destination, or None if no valid
+    origins/destination were found within max_attempts (or the budget).
+    """
+    city_config = CITIES[city_id]
+    k = get_speculative_k(city_id)
+
+    logger.debug(f"🌆 Generating game for {city_config['name']} ({k} candidate(s) at a time)",
+                 extra={'city': city_id, 'stage': 'generate'})
+
+    cancelled = threading.Event()
+    in_flight = set()
+    submitted = 0
+    budget = current_budget()
+    game, spares = None, []
+
+    try:
+        while submitted < max_attempts or in_flight:
+            while submitted < max_attempts and len(in_flight) < k and not budget_exhausted():
+                submitted += 1
+                in_flight.add(candidate_executor.submit(
+                    in_current_context(run_attempt), city_id, submitted, cancelled
+                ))
+            if not in_flight:
+                break
+
+            timeout = budget.remaining_seconds() if budget is not None else None
+            done, in_flight = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Past the request's deadline
+                budget.expire()
+                break
+            valid = [result for result in (future.result() for future in done) if result is not None]
+            if valid:
+                game, spares = valid[0], valid[1:]
+                break
+    finally:
+        # Stop the losing candidates from making any further API calls
+        cancelled.set()
+        for future in in_flight:
+            future.cancel()
+
+    # Losers stop before their next Google call, but one waiting on Google
+    # finishes in the background rather than hold up the request. Keep any
+    # that pass every check rather than waste their calls.
+    for future in in_flight:
+        future.add_done_callback(partial(pool_finished_candidate, city_id))
+    for spare in spares:
+        candidate_executor.submit(pool_spare_game, city_id, spare)
+
+    if game is None:
+        return record_game(city_id, submitted, None)
+    # Only the winner's addresses are looked up
+    return finish_game(city_id, submitted, game)
+
+
+def finish_game(city_id, attempts, game):
+    """
+    Look up the addresses of the game a generation run found and record it.
+    If the request's budget or quota runs out first, the game goes to the
+    pool for a later request and the run counts as a failure.
+    """
+    try:
+        game = with_addresses(game)
+    except (BudgetExceeded, Throttled) as e:
+        logger.debug(f"✗ Could not look up addresses: {e}", extra={'city': city_id, 'stage': 'address'})
+        candidate_executor.submit(pool_spare_game, city_id, game)
+        return record_game(city_id, attempts, None)
+    return record_game(city_id, attempts, game)
+
+
+def pool_finished_candidate(city_id, future):
+    """Done callback for a losing candidate: pool its game if it was valid."""
+    if not future.cancelled() and future.result() is not None:
+        candidate_executor.submit(pool_spare_game, city_id, future.result())
+
+
+def pool_spare_game(city_id, game):
+    """
+    Add a valid candidate that lost the speculative race to the game pool,
+    if the city's queue has room. Runs outside the request, so its address
+    lookups don't count against the request's budget.
+    """
+    if game_pool.size(city_id) < game_pool.target_size:
+        game_pool.put(city_id, with_addresses(game), max_size=game_pool.target_size)
+
+
+def record_game(city_id, attempts, game):
+    """Count and log a generation run's attempts and outcome; returns game."""
+    if game is not None:
+        outcome = 'found'
+    else:
+        limit = budget_exhausted()
+        outcome = {None: 'failed', 'quota': 'throttled'}.get(limit, 'out_of_budget')
+    metrics.observe('etaguessr_game_attempts', attempts, city=city_id)
+    metrics.inc('etaguessr_games_total', city=city_id, outcome=outcome)
+    logger.info(f"{'✓' if game is not None else '✗'} Game generation {outcome} after {attempts} attempt(s)",
+                extra={'city': city_id, 'attempt': attempts, 'stage': 'generate', 'outcome': outcome})
+    return game
+
+
+# Bulk generation: a batch of origins and destinations is checked with one
+# Distance Matrix request per mode covering every pair, and any two origins
+# that reach a destination by every required mode make a game. Google caps a
+# request at 25 origins, 25 destinations and 100 elements, so larger batches
+# are split into several requests per mode.
+BULK_ORIGINS = int(os.getenv('BULK_ORIGINS', '10'))
+BULK_DESTINATIONS = int(os.getenv('BULK_DESTINATIONS', '10'))
+
+# Games taken per destination, so one destination doesn't dominate a batch
+BULK_GAMES_PER_DESTINATION = 3
+
+MATRIX_MAX_DIMENSION = 25
+MATRIX_MAX_ELEMENTS = 100
+
+
+def get_matrix_etas(mode, origins, destinations, avoid=None, refresh=False):
+    """
+    Get ETAs for one travel mode for every (origin, destination) pair.
+    Local routers and the ETA cache are used first; the remaining pairs are
+    requested in as few Distance Matrix calls as the element limits allow.
+    With avoid (e.g. 'ferries', which only biases the route), the cache is
+    bypassed since it holds unrestricted routes. With refresh, cached ETAs are ignored but
+    overwritten with the fresh ones.
+    Returns a list of ETA dict lists indexed [origin][destination].
+    """
+    use_cache = eta_cache is not None and avoid is None
+    # Bulk requests are for one city, so its clock applies to every pair
+    departure = local_now(destinations[0]) if destinations else None
+    etas = [[None] * len(destinations) for _ in origins]
+
+    for j, destination in enumerate(destinations):
+        local_etas = get_local_etas(mode, origins, destination)
+        if local_etas is not None:
+            for i, eta in enumerate(local_etas):
+                etas[i][j] = eta
+        elif use_cache and not refresh:
+            for i, origin in enumerate(origins):
+                etas[i][j] = eta_cache.get(mode, origin, destination, departure)
+
+    rows = [i for i in range(len(origins)) if any(eta is None for eta in etas[i])]
+    cols = [j for j in range(len(destinations)) if any(etas[i][j] is None for i in rows)]
+    if not rows:
+        return etas
+
+    col_chunk = min(MATRIX_MAX_DIMENSION, len(cols))
+    row_chunk = min(MATRIX_MAX_DIMENSION, MATRIX_MAX_ELEMENTS // col_chunk)
+    options = {'avoid': avoid} if avoid else {}
+
+    for c in range(0, len(cols), col_chunk):
+        chunk_cols = cols[c:c + col_chunk]
+        for r in range(0, len(rows), row_chunk):
+            chunk_rows = rows[r:r + row_chunk]
+            try:
+                result = gmaps.distance_matrix(
+                    origins=[f"{origins[i]['lat']},{origins[i]['lng']}" for i in chunk_rows],
+                    destinations=[f"{destinations[j]['lat']},{destinations[j]['lng']}" for j in chunk_cols],
+                    mode=mode,
+                    departure_time=departure,
+                    **options
+                )
+            except Exception as e:
+                for i in chunk_rows:
+                    for j in chunk_cols:
+                        if etas[i][j] is None:
+                            etas[i][j] = {'error': str(e)}
                 continue
 
-            # Get human-readable addresses
-            origin1_address = get_address(origin1_lat, origin1_lng)
-            origin2_address = get_address(origin2_lat, origin2_lng)
-            destination_address = get_address(dest_lat, dest_lng)
+            for i, row in zip(chunk_rows, result['rows']):
+                for j, element in zip(chunk_cols, row['elements']):
+                    if etas[i][j] is None:
+                        etas[i][j] = distance_matrix_eta(element)
+                        if use_cache:
+                            eta_cache.put(mode, origins[i], destinations[j], etas[i][j], departure)
 
-            print(f"✓ Found valid origins/destination on attempt {attempt + 1}")
+    return etas
 
-            return jsonify({
-                'origin1': origin1,
-                'origin1_address': origin1_address,
-                'origin2': origin2,
-                'origin2_address': origin2_address,
-                'destination': destination,
-                'destination_address': destination_address,
-                'etas1': etas1,
-                'etas2': etas2
-            })
 
-        except Exception as e:
-            print(f"✗ Attempt {attempt + 1}: Error - {str(e)}")
+def passes_local_checks(city_id, point):
+    """
+    True if a point is inside the city boundary (if any), not in a known
+    ferry cell and not on water.
+    """
+    boundary = city_boundaries.get(city_id)
+    if boundary is not None and not boundary.contains(point['lat'], point['lng']):
+        return False
+    if classify_ferry_risk(city_id, {'point': point})[0] == FERRY:
+        return False
+    return not is_on_water(point)
+
+
+def sample_valid_points(city_id, sample, n, max_tries=None):
+    """
+    Up to n points from sample() (a zero-argument callable returning
+    (lat, lng)) that pass the local checks.
+    """
+    points = []
+    for _ in range(max_tries or n * 5):
+        if len(points) >= n:
+            break
+        lat, lng = sample()
+        point = {'lat': lat, 'lng': lng}
+        if passes_local_checks(city_id, point):
+            points.append(point)
+    return points
+
+
+def generate_games_bulk(city_id, n_origins=None, n_destinations=None):
+    """
+    Generate a batch of games for a city from one set of matrix requests.
+
+    Samples n_origins origins and n_destinations destinations that pass the
+    local checks, fetches every mode for every pair, and pairs up origins
+    that reach the same destination by all required modes. Driving asks the
+    matrix to avoid ferries, but that only biases the route, so each route
+    of a game still gets the single-game ferry check (Directions, unless
+    the ferry index vouches for both ends), which also gives its driving
+    ETA.
+
+    Returns a list of game dicts in the /random-destination format (possibly
+    empty).
+    """
+    city_config = CITIES[city_id]
+    n_origins = n_origins or BULK_ORIGINS
+    n_destinations = n_destinations or BULK_DESTINATIONS
+
+    start = time.perf_counter()
+    logger.debug(f"📦 Bulk generating games for {city_config['name']} "
+                 f"({n_origins} origins × {n_destinations} destinations)", extra={'city': city_id, 'stage': 'bulk'})
+
+    origins = sample_valid_points(city_id, partial(generate_snapped_origin, city_id), n_origins)
+    destinations = sample_valid_points(city_id, partial(next_destination, city_id), n_destinations)
+    if len(origins) < 2 or not destinations:
+        logger.warning("✗ Not enough valid origins/destinations sampled", extra={'city': city_id, 'stage': 'bulk'})
+        return []
+
+    results, _ = run_checks({
+        mode: partial(get_matrix_etas, mode, origins, destinations, 'ferries' if mode == 'driving' else None)
+        for mode in ETA_MODES
+    })
+
+    # (has_ferry, driving ETA from Directions or None) per (origin, destination)
+    routes = {}
+
+    def ferry_free(i, j):
+        """Whether driving from origin i to destination j avoids ferries (checked once per route)."""
+        if (i, j) not in routes:
+            risk, _ = classify_ferry_risk(city_id, {'origin': origins[i], 'destination': destinations[j]})
+            if risk is not None:
+                routes[(i, j)] = (risk == FERRY, None)
+            else:
+                has_ferry, eta = get_driving_route(origins[i], destinations[j])
+                if 'error' not in eta:
+                    record_ferry_check(city_id, origins[i], destinations[j], has_ferry)
+                routes[(i, j)] = (has_ferry or 'error' in eta, eta)
+        return not routes[(i, j)][0]
+
+    def pick_pairs(j):
+        """Up to BULK_GAMES_PER_DESTINATION ferry-free origin pairs for destination j, and a rejection reason."""
+        reachable = [
+            i for i in range(len(origins))
+            if all('error' not in results[mode][i][j] for mode in REQUIRED_MODES)
+        ]
+        pairs = [(a, b) for k, a in enumerate(reachable) for b in reachable[k + 1:]]
+        if not pairs:
+            return [], "destination missing modes"
+        random.shuffle(pairs)
+        picked = []
+        for a, b in pairs:
+            if len(picked) >= BULK_GAMES_PER_DESTINATION:
+                break
+            if ferry_free(a, j) and ferry_free(b, j):
+                picked.append((a, b))
+        return picked, None if picked else "destination requires ferry"
+
+    # Destinations are checked concurrently; each only touches its own routes
+    picked, _ = run_checks({j: partial(pick_pairs, j) for j in range(len(destinations))})
+
+    picks = []
+    for j, destination in enumerate(destinations):
+        pairs, reason = picked[j]
+        picks.extend((a, b, j) for a, b in pairs)
+        record_sampled_points(city_config, {'destination': destination}, reason)
+
+    def etas(i, j):
+        """ETAs from origin i to destination j, driving from Directions when it was asked."""
+        route_eta = routes.get((i, j), (False, None))[1]
+        return {mode: route_eta if mode == 'driving' and route_eta else results[mode][i][j] for mode in ETA_MODES}
+
+    # Human-readable addresses for every point used in a game
+    used = {('origin', a) for a, _, _ in picks} | {('origin', b) for _, b, _ in picks}
+    used |= {('destination', j) for _, _, j in picks}
+    addresses, _ = run_checks({
+        (kind, index): partial(
+            get_address,
+            (origins if kind == 'origin' else destinations)[index]['lat'],
+            (origins if kind == 'origin' else destinations)[index]['lng']
+        )
+        for kind, index in used
+    })
+
+    games = []
+    for a, b, j in picks:
+        games.append({
+            'origin1': origins[a],
+            'origin1_address': addresses[('origin', a)],
+            'origin2': origins[b],
+            'origin2_address': addresses[('origin', b)],
+            'destination': destinations[j],
+            'destination_address': addresses[('destination', j)],
+            'etas1': etas(a, j),
+            'etas2': etas(b, j),
+            'validated_at': time.time()
+        })
+
+    logger.info(f"✓ Bulk generated {len(games)} games from {len(origins)} origins × {len(destinations)} destinations",
+                extra={'city': city_id, 'stage': 'bulk', 'duration': round(time.perf_counter() - start, 3)})
+    return games
+
+
+# Pool of pre-generated games, kept topped up by a background worker so most
+# requests don't have to run the generation loop at all. Every worker shares
+# the pool's SQLite file, and only one of them refills it at a time.
+# Set GAME_POOL_SIZE=0 to disable the pool and always generate inline.
+GAME_POOL_SIZE = int(os.getenv('GAME_POOL_SIZE', '10'))
+GAME_POOL_LOW_WATER = int(os.getenv('GAME_POOL_LOW_WATER', '5'))
+GAME_POOL_PATH = os.getenv('GAME_POOL_PATH', os.path.join(DATA_DIR, 'game_pool.sqlite3'))
+
+# Refill the pool with bulk generation (generate_games_bulk) instead of one
+# game at a time
+GAME_POOL_BULK = os.getenv('GAME_POOL_BULK', '').lower() in ('1', 'true', 'yes')
+
+game_pool = GamePool(
+    generate_game,
+    CITIES.keys(),
+    target_size=GAME_POOL_SIZE,
+    low_water=GAME_POOL_LOW_WATER,
+    path=GAME_POOL_PATH,
+    generate_many=generate_games_bulk if GAME_POOL_BULK else None
+)
+if GAME_POOL_SIZE > 0:
+    game_pool.start()
+
+
+# Background revalidation of pooled games (see revalidation.py): every
+# REVALIDATE_INTERVAL_MINUTES the oldest games are re-queried, within a daily
+# (UTC) budget of REVALIDATE_DAILY_BUDGET Distance Matrix elements shared by
+# every worker through REVALIDATE_BUDGET_PATH.
+# Games missing a required mode, or whose ETAs moved by more than
+# REVALIDATE_MAX_DRIFT (0.5 = 50%), are evicted. Set the budget to 0 to disable.
+REVALIDATE_DAILY_BUDGET = int(os.getenv('REVALIDATE_DAILY_BUDGET', '500'))
+REVALIDATE_INTERVAL_MINUTES = float(os.getenv('REVALIDATE_INTERVAL_MINUTES', '30'))
+REVALIDATE_MAX_DRIFT = float(os.getenv('REVALIDATE_MAX_DRIFT', '0.5'))
+REVALIDATE_BUDGET_PATH = os.getenv('REVALIDATE_BUDGET_PATH', os.path.join(DATA_DIR, 'revalidation.sqlite3'))
+
+
+def fetch_revalidation_etas(origins, destination):
+    """
+    Fresh ETAs for every mode from several origins to one destination, with
+    driving avoiding ferries like bulk generation.
+    Returns {mode: [eta per origin]}.
+    """
+    results, _ = run_checks({
+        mode: partial(
+            get_matrix_etas, mode, origins, [destination],
+            'ferries' if mode == 'driving' else None, refresh=True
+        )
+        for mode in ETA_MODES
+    })
+    return {mode: [row[0] for row in results[mode]] for mode in ETA_MODES}
+
+
+def revalidation_cost(origins, destination):
+    """Distance Matrix elements fetch_revalidation_etas() will use."""
+    google_modes = [mode for mode in ETA_MODES if local_router_for(mode, destination) is None]
+    return len(origins) * len(google_modes)
+
+
+revalidator = Revalidator(
+    fetch_revalidation_etas,
+    revalidation_cost,
+    DailyBudget(REVALIDATE_DAILY_BUDGET, REVALIDATE_BUDGET_PATH),
+    REQUIRED_MODES,
+    max_drift=REVALIDATE_MAX_DRIFT
+)
+
+
+def revalidate_pool():
+    """Revalidate the pooled games of every city, oldest first."""
+    for city_id in CITIES:
+        pooled = game_pool.games(city_id)
+        if not pooled:
             continue
+        # The revalidator keys its changes by id() of the dicts it was given
+        game_ids = {id(game): game_id for game_id, game in pooled}
+        changes = revalidator.revalidate([game for _, game in pooled])
+        if changes:
+            game_pool.apply(city_id, {game_ids[key]: game for key, game in changes.items()})
+            evicted = sum(1 for game in changes.values() if game is None)
+            logger.info(f"🔄 Revalidated {len(changes)} pooled games for {CITIES[city_id]['name']} "
+                        f"({evicted} evicted, {revalidator.budget.remaining()} elements left today)",
+                        extra={'city': city_id, 'stage': 'revalidate'})
+        if revalidator.budget.remaining() <= 0:
+            break
+
+
+def start_revalidation():
+    """Revalidate the pool periodically in a daemon thread."""
+    def run():
+        while True:
+            time.sleep(REVALIDATE_INTERVAL_MINUTES * 60)
+            try:
+                revalidate_pool()
+            except Exception as e:
+                logger.warning(f"Revalidation failed: {e}", extra={'stage': 'revalidate'})
+
+    threading.Thread(target=run, name='revalidation', daemon=True).start()
+
+
+if GAME_POOL_SIZE > 0 and REVALIDATE_DAILY_BUDGET > 0:
+    start_revalidation()
+
+
+# Archived games (data/<city_id>/games.jsonl, written by `etaguessr.py
+# build-pool`), served when inline generation fails or runs out of budget
+# while the pool is empty. Re-read whenever the file changes.
+archived_games = {}
+archived_games_lock = threading.Lock()
+
+
+def load_archived_games(city_id):
+    """A city's archived games (empty without an archive)."""
+    path = city_data_path(city_id, 'games.jsonl')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return []
+    with archived_games_lock:
+        cached = archived_games.get(city_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
 
-    # If we couldn't find a valid origins/destination after max_attempts
-    return jsonify({
-        'error': f'Could not find valid origins/destination with all transport modes after {max_attempts} attempts'
-    }), 500
+    games = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    games.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError as e:
+        logger.warning(f"Could not read archived games from {path}: {e}", extra={'city': city_id})
+        return []
+
+    with archived_games_lock:
+        archived_games[city_id] = (mtime, games)
+    return games
+
+
+def fallback_game(city_id):
+    """
+    A game to serve when generation came up empty: one the pool has gained
+    in the meantime, else a random archived one. Returns (game, source), or
+    (None, None) if there's neither.
+    """
+    game = game_pool.pop(city_id)
+    if game is not None:
+        return game, 'pool'
+    archived = load_archived_games(city_id)
+    if archived:
+        return random.choice(archived), 'archive'
+    return None, None
+
+
+def finish_request(city_id, budget, source, body, status=200, detail='', headers=None):
+    """
+    Record the latency of a /random-destination request, log it, and build
+    the response with headers reporting the Google calls and time it used.
+    The budget is closed first, so the count is final, and calls still in
+    progress on pool threads are waited for until the request's deadline.
+    """
+    settle_budget(budget)
+    duration = budget.elapsed()
+    metrics.observe('etaguessr_request_seconds', duration, city=city_id, source=source)
+    tracer.set(source=source, google_calls=budget.calls)
+    logger.info(f"{'✗' if source in ('failed', 'throttled') else '✓'} Served {source} game for {CITIES[city_id]['name']} {detail}".rstrip(),
+                extra={'city': city_id, 'stage': 'request', 'source': source,
+                       'google_calls': budget.calls, 'duration': round(duration, 3)})
+    headers = dict(headers or {}, **{
+        'X-Google-Calls': str(budget.calls),
+        'X-Game-Source': source,
+        'Server-Timing': f"generate;dur={duration * 1000:.0f}"
+    })
+    return jsonify(body), status, headers
+
+
+def settle_budget(budget):
+    """
+    Refuse a request's further Google calls and wait for those in progress,
+    but not past the request's deadline.
+    """
+    budget.close()
+    remaining = budget.remaining_seconds()
+    timeout = REQUEST_SETTLE_SECONDS if remaining is None else min(REQUEST_SETTLE_SECONDS, remaining)
+    if not budget.settle(timeout):
+        logger.warning(f"{budget.active} Google call(s) still running after the request",
+                       extra={'stage': 'request'})
+
+
+@app.route('/random-destination', methods=['GET'])
+def random_destination():
+    """
+    Return a game for a city: TWO random origins and one destination with
+    ETAs for all travel modes from both origins.
+    Served from the pre-generated game pool when possible, falling back to
+    generating one inline when the pool for the city is empty, within the
+    request's Google call and time budget. If that fails too, a game the
+    pool gained meanwhile or an archived game is served instead.
+
+    If Google calls were throttled (see rate_limit.py) and there's no
+    fallback game, answers 503 with Retry-After rather than a 500, so
+    throttling can be told apart from candidates that failed validation.
+
+    The X-Google-Calls, X-Game-Source and Server-Timing response headers
+    report the calls spent, where the game came from and the time used.
+
+    Query parameters:
+    - city: City identifier (e.g., 'toronto', 'san-francisco'). Defaults to 'toronto'.
+    """
+    from flask import request
+
+    # Get city from query parameter, default to Toronto
+    city_id = request.args.get('city', DEFAULT_CITY)
+
+    # Validate city
+    if city_id not in CITIES:
+        return jsonify({
+            'error': f'Invalid city: {city_id}. Available cities: {list(CITIES.keys())}'
+        }), 400
+
+    with tracer.trace('random_destination', city=city_id), \
+            request_budget(REQUEST_MAX_GOOGLE_CALLS, REQUEST_DEADLINE_SECONDS) as budget:
+        game = game_pool.pop(city_id)
+        if game is not None:
+            return finish_request(city_id, budget, 'pool', game, detail=f"({game_pool.size(city_id)} left in pool)")
+
+        max_attempts = 30  # Try up to 30 times to find valid origins/destination
+        game = generate_game(city_id, max_attempts)
+        if game is not None:
+            return finish_request(city_id, budget, 'generated', game)
+
+        # Stragglers from rejected candidates may still be spending
+        settle_budget(budget)
+        limit = budget.exceeded()
+        game, source = fallback_game(city_id)
+        if game is not None:
+            detail = f"(generation ran out of {limit} budget)" if limit else "(generation failed)"
+            return finish_request(city_id, budget, source, game, detail=detail)
+
+        if limit == 'quota':
+            # Throttled: tell the client to back off rather than report a failure
+            return finish_request(city_id, budget, 'throttled', {
+                'error': 'Google Maps quota exhausted, try again shortly'
+            }, status=503, headers={'Retry-After': str(max(1, round(QUOTA_MAX_WAIT_SECONDS)))})
+
+        # Report what actually stopped generation
+        if limit == 'calls':
+            error = (f'Could not find valid origins/destination within the request limit of '
+                     f'{REQUEST_MAX_GOOGLE_CALLS} Google calls')
+        elif limit == 'deadline':
+            error = (f'Could not find valid origins/destination within the request deadline of '
+                     f'{REQUEST_DEADLINE_SECONDS:g}s')
+        else:
+            error = f'Could not find valid origins/destination with all transport modes after {max_attempts} attempts'
+        return finish_request(city_id, budget, 'failed', {'error': error}, status=500)
 
 
 @app.route('/cities', methods=['GET'])
@@ -496,6 +2013,25 @@ def get_cities():
     })
 
 
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """
+    Hit/miss counters for the reverse-geocode and ETA caches in this worker.
+    """
+    return jsonify({
+        'geocode': geocode_cache.stats() if geocode_cache is not None else None,
+        'eta': eta_cache.stats() if eta_cache is not None else None
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus metrics summed across every worker.
+    """
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 @app.route('/maps-api-key', methods=['GET'])
 def maps_api_key():
     """
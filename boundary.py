@@ -0,0 +1,94 @@
+"""
+City boundary polygons with a precomputed cell classification.
+
+A city's radius takes in neighbouring municipalities, open water and (for
+some cities) another country. An optional boundary polygon
+(data/<city_id>/boundary.geojson) trims candidates to the city itself.
+The polygon is classified onto a grid once at load time, so most
+point-in-polygon tests are a single array lookup; only points in cells the
+boundary passes through need the exact test.
+"""
+import numpy as np
+
+from geo import city_grid, grid_cells, load_geojson_polygons, points_in_polygons, rasterize_polygons
+
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+# Default cell size of the classification grid, in meters
+DEFAULT_RESOLUTION_METERS = 100
+
+
+def classify_grid(polygons, grid):
+    """
+    Classify every grid cell as INSIDE, OUTSIDE or BOUNDARY. Cells an edge
+    passes through, plus their neighbours, are BOUNDARY so the
+    classification stays conservative.
+    """
+    cells = np.where(rasterize_polygons(polygons, grid), INSIDE, OUTSIDE).astype(np.uint8)
+    boundary = np.zeros(cells.shape, dtype=bool)
+
+    # Walk every edge in steps of a quarter cell and mark the cells it visits
+    step = min(grid['dlat'], grid['dlng']) / 4
+    for rings in polygons:
+        for ring in rings:
+            starts, ends = ring, np.roll(ring, -1, axis=0)
+            lengths = np.hypot(ends[:, 0] - starts[:, 0], ends[:, 1] - starts[:, 1])
+            counts = np.maximum(np.ceil(lengths / step).astype(np.int64), 1) + 1
+            t = np.concatenate([np.linspace(0, 1, count) for count in counts])
+            edge = np.repeat(np.arange(len(starts)), counts)
+            lngs = starts[edge, 0] + t * (ends[edge, 0] - starts[edge, 0])
+            lats = starts[edge, 1] + t * (ends[edge, 1] - starts[edge, 1])
+
+            rows, cols, covered = grid_cells(grid, lats, lngs)
+            boundary[rows[covered], cols[covered]] = True
+
+    # Grow the boundary by one cell in every direction (wrapping at the
+    # grid edges only makes it more conservative)
+    grown = boundary.copy()
+    for drow in (-1, 0, 1):
+        for dcol in (-1, 0, 1):
+            grown |= np.roll(boundary, (drow, dcol), axis=(0, 1))
+
+    cells[grown] = BOUNDARY
+    return cells
+
+
+class CityBoundary:
+    """
+    Boundary polygon(s) of one city with a grid classification for fast
+    containment tests. Points outside the grid are outside the city.
+    """
+
+    def __init__(self, polygons, grid):
+        self.polygons = polygons
+        self.grid = grid
+        self.cells = classify_grid(polygons, grid)
+
+    @classmethod
+    def from_geojson(cls, path, city_config, resolution_meters=DEFAULT_RESOLUTION_METERS):
+        """Load a city's boundary from a GeoJSON file of Polygon/MultiPolygon features."""
+        polygons = load_geojson_polygons(path)
+        if not polygons:
+            raise ValueError(f"No polygons found in {path}")
+        return cls(polygons, city_grid(city_config, resolution_meters))
+
+    def contains_many(self, lats, lngs):
+        """Boolean array of which points lie inside the boundary."""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        rows, cols, covered = grid_cells(self.grid, lats, lngs)
+
+        kinds = np.full(lats.shape, OUTSIDE, dtype=np.uint8)
+        kinds[covered] = self.cells[rows[covered], cols[covered]]
+
+        inside = kinds == INSIDE
+        exact = kinds == BOUNDARY
+        if exact.any():
+            inside[exact] = points_in_polygons(lats[exact], lngs[exact], self.polygons)
+        return inside
+
+    def contains(self, lat, lng):
+        """True if the point lies inside the boundary."""
+        return bool(self.contains_many([lat], [lng])[0])
@@ -0,0 +1,160 @@
+"""
+Per-request limits on Google Maps calls and wall-clock time.
+
+A request opens a CallBudget with request_budget(); it lives in a context
+variable, so it follows the request into the thread pools its checks run
+on (as long as work is submitted with a copy of the request's context).
+Every call through a BudgetedClient spends one call from the current
+budget, and raises BudgetExceeded instead once the budget is out of calls,
+past its deadline, or has been throttled (see rate_limit.py): once the
+quota is short, the request backs off instead of adding to the load.
+Calls made outside any request (pool refills, offline tools) aren't
+limited.
+
+Checks run on pool threads can still be calling Google when the request
+has its answer. Before reporting what a request spent, close() its budget
+so no new calls start and settle() to wait for the ones in progress.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+_current_budget = contextvars.ContextVar('call_budget', default=None)
+
+
+class BudgetExceeded(Exception):
+    """A Google call was refused because the request's budget ran out."""
+
+
+class CallBudget:
+    """
+    Calls spent and time used by one request.
+
+    - max_calls: most Google calls the request may make (None: no limit).
+    - deadline_seconds: wall-clock time after which no more calls are made
+      (None: no limit).
+    """
+
+    def __init__(self, max_calls=None, deadline_seconds=None):
+        self.max_calls = max_calls
+        self.deadline_seconds = deadline_seconds
+        self.calls = 0
+        self.throttled = 0
+        self.active = 0
+        self.closed = False
+        self.expired = False
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def elapsed(self):
+        """Seconds since the budget was opened."""
+        return time.perf_counter() - self.started
+
+    def remaining_seconds(self):
+        """Seconds until the deadline, or None without one."""
+        if self.deadline_seconds is None:
+            return None
+        return max(0.0, self.deadline_seconds - self.elapsed())
+
+    def exceeded(self):
+        """Which limit has been reached ('quota', 'calls' or 'deadline'), or None."""
+        if self.throttled:
+            return 'quota'
+        if self.max_calls is not None and self.calls >= self.max_calls:
+            return 'calls'
+        if self.expired or (self.deadline_seconds is not None and self.elapsed() >= self.deadline_seconds):
+            return 'deadline'
+        return None
+
+    def expire(self):
+        """
+        Treat the deadline as reached, e.g. when a wait for it timed out a
+        hair before elapsed() agrees.
+        """
+        with self._lock:
+            self.expired = True
+
+    def record_throttle(self):
+        """Note a call refused for lack of quota; no more calls are made."""
+        with self._lock:
+            self.throttled += 1
+
+    def spend(self):
+        """
+        Count one call about to start, or raise BudgetExceeded if the budget
+        is closed or no limit allows it. Pair with release() once the call
+        is over.
+        """
+        with self._lock:
+            if self.closed:
+                raise BudgetExceeded(f"Request finished after {self.calls} calls")
+            limit = self.exceeded()
+            if limit is not None:
+                raise BudgetExceeded(f"Request {limit} budget exhausted after {self.calls} calls "
+                                     f"in {self.elapsed():.1f}s")
+            self.calls += 1
+            self.active += 1
+
+    def release(self):
+        """Note that a call counted by spend() is over."""
+        with self._lock:
+            self.active -= 1
+            if not self.active:
+                self._idle.notify_all()
+
+    def close(self):
+        """Refuse every further call."""
+        with self._lock:
+            self.closed = True
+
+    def settle(self, timeout=None):
+        """
+        Wait up to timeout seconds (None: as long as it takes) for the calls
+        in progress to finish. Returns True if none are left.
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: not self.active, timeout)
+
+
+def current_budget():
+    """The budget of the request being handled, or None outside one."""
+    return _current_budget.get()
+
+
+@contextmanager
+def request_budget(max_calls=None, deadline_seconds=None):
+    """Open a CallBudget for the duration of a with block; yields it."""
+    budget = CallBudget(max_calls, deadline_seconds)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+class BudgetedClient:
+    """
+    Proxy for a googlemaps.Client whose method calls each spend one call
+    from the current request's budget first.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            budget = _current_budget.get()
+            if budget is None:
+                return attr(*args, **kwargs)
+            budget.spend()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                budget.release()
+        return call
@@ -0,0 +1,113 @@
+"""
+Vectorized candidate point generation.
+
+Draws points in batches as numpy arrays and runs them through cheap local
+filters (water mask, known ferry cells, ...) before any of them costs a
+network call. Used by app.py for destinations and by the
+generate_valid_locations test scripts.
+"""
+import numpy as np
+
+from geo import LocalProjection, geohash_encode
+
+
+def random_points_in_radius(center_lat, center_lng, radius_meters, n):
+    """
+    n points uniformly distributed over the disk of radius_meters around a
+    centre, as (lats, lngs) arrays. The disk is laid out in an azimuthal
+    equidistant projection, so it is a true circle on the ground.
+    """
+    angle = np.random.uniform(0, 2 * np.pi, n)
+    # Square root for uniform distribution over the area
+    distance = np.sqrt(np.random.uniform(0, 1, n)) * radius_meters
+    projection = LocalProjection(center_lat, center_lng)
+    return projection.to_latlng(distance * np.sin(angle), distance * np.cos(angle))
+
+
+def water_filter(mask):
+    """Filter keeping points a WaterMask says are not on water."""
+    def keep(lats, lngs):
+        on_water, _ = mask.is_water_many(lats, lngs)
+        return ~on_water
+    return keep
+
+
+def ferry_filter(ferry_index, city_id):
+    """Filter dropping points in a city's known ferry cells."""
+    def keep(lats, lngs):
+        ferry_cells = ferry_index.ferry_cells(city_id)
+        if not ferry_cells:
+            return np.ones(len(lats), dtype=bool)
+        return np.array([
+            geohash_encode(lat, lng, ferry_index.precision) not in ferry_cells
+            for lat, lng in zip(lats.tolist(), lngs.tolist())
+        ], dtype=bool)
+    return keep
+
+
+class CandidateGenerator:
+    """
+    Batches of prefiltered candidate points for one city.
+
+    - draw: callable n -> (lats, lngs) arrays of raw candidate points.
+    - filters: callables (lats, lngs) -> boolean array of points to keep,
+      applied in order, each only to the points that survived the last.
+    - snap: optional callable (lats, lngs) -> (lats, lngs, snapped) that
+      moves points (e.g. onto roads) before filtering; points it couldn't
+      snap are dropped.
+    """
+
+    def __init__(self, draw, filters=(), snap=None):
+        self.draw = draw
+        self.filters = list(filters)
+        self.snap = snap
+
+    @classmethod
+    def uniform(cls, center_lat, center_lng, radius_meters, filters=(), snap=None):
+        """Generator drawing uniformly over a disk around a centre."""
+        return cls(
+            lambda n: random_points_in_radius(center_lat, center_lng, radius_meters, n),
+            filters,
+            snap
+        )
+
+    def apply_filters(self, lats, lngs):
+        """Snap the points if configured, then drop every point that fails a filter."""
+        if self.snap is not None and len(lats):
+            lats, lngs, snapped = self.snap(lats, lngs)
+            lats, lngs = lats[snapped], lngs[snapped]
+
+        for keep in self.filters:
+            if len(lats) == 0:
+                break
+            kept = keep(lats, lngs)
+            lats, lngs = lats[kept], lngs[kept]
+        return lats, lngs
+
+    def generate(self, n, max_rounds=20):
+        """
+        Up to n prefiltered points as (lats, lngs) arrays. Draws in rounds,
+        oversampling by the acceptance rate seen so far, and gives up after
+        max_rounds (so a city whose filters reject everything can't hang).
+        """
+        lats_parts, lngs_parts = [], []
+        found, drawn, kept = 0, 0, 0
+
+        for _ in range(max_rounds):
+            if found >= n:
+                break
+            rate = kept / drawn if drawn else 1.0
+            batch = int(min((n - found) / max(rate, 0.05) * 1.2, 100 * n)) + 1
+
+            lats, lngs = self.draw(batch)
+            lats, lngs = self.apply_filters(np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float))
+
+            drawn += batch
+            kept += len(lats)
+            found += len(lats)
+            lats_parts.append(lats)
+            lngs_parts.append(lngs)
+
+        if not lats_parts:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(lats_parts)[:n], np.concatenate(lngs_parts)[:n]
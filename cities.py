@@ -0,0 +1,94 @@
+"""
+City configurations shared by the Flask backend and the offline tools.
+
+Kept separate from app.py so offline commands (see etaguessr.py) can read
+the city list without a Google Maps API key.
+"""
+import math
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Directory for generated data: game pool snapshots, per-city masks, caches
+DATA_DIR = os.getenv(
+    'ETAGUESSR_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+)
+
+# City configurations
+CITIES = {
+    'toronto': {
+        'name': 'Toronto',
+        'center': {'lat': 43.6452, 'lng': -79.3806},  # Union Station
+        'center_name': 'Union Station',
+        'radius_km': 10,
+        'radius_meters': 10000,
+        'timezone': 'America/Toronto',
+        'speculative_k': 4  # Lake Ontario and the Islands reject many candidates
+    },
+    'san-francisco': {
+        'name': 'San Francisco',
+        'center': {'lat': 37.7749, 'lng': -122.4194},  # Downtown SF
+        'center_name': 'Downtown',
+        'radius_km': 10,
+        'radius_meters': 10000,
+        'timezone': 'America/Los_Angeles'
+    },
+    'calgary': {
+        'name': 'Calgary',
+        'center': {'lat': 51.0447, 'lng': -114.0719},  # Downtown Calgary
+        'center_name': 'Downtown',
+        'radius_km': 10,
+        'radius_meters': 10000,
+        'timezone': 'America/Edmonton'
+    },
+    'vancouver': {
+        'name': 'Vancouver',
+        'center': {'lat': 49.2827, 'lng': -123.1207},  # Downtown Vancouver
+        'center_name': 'Downtown',
+        'radius_km': 10,
+        'radius_meters': 10000,
+        'timezone': 'America/Vancouver'
+    },
+    'new-york': {
+        'name': 'New York',
+        'center': {'lat': 40.7580, 'lng': -73.9855},  # Times Square
+        'center_name': 'Times Square',
+        'radius_km': 10,
+        'radius_meters': 10000,
+        'timezone': 'America/New_York'
+    },
+    'boston': {
+        'name': 'Boston',
+        'center': {'lat': 42.3601, 'lng': -71.0589},  # Downtown Boston
+        'center_name': 'Downtown',
+        'radius_km': 10,
+        'radius_meters': 10000,
+        'timezone': 'America/New_York'
+    }
+}
+
+# Default city
+DEFAULT_CITY = 'toronto'
+
+
+def city_data_path(city_id, filename):
+    """
+    Path of a per-city data file, e.g. data/toronto/water_mask.npy.
+    """
+    return os.path.join(DATA_DIR, city_id, filename)
+
+
+def local_now(point):
+    """
+    The current time, as an aware datetime, in the time zone of the city
+    nearest a {'lat', 'lng'} point, so departure-time buckets and local
+    timetables read the city's clock rather than the server's.
+    """
+    def distance(city_config):
+        center = city_config['center']
+        dx = (point['lng'] - center['lng']) * math.cos(math.radians(center['lat']))
+        return math.hypot(point['lat'] - center['lat'], dx)
+
+    city_config = min(CITIES.values(), key=distance)
+    return datetime.now(ZoneInfo(city_config['timezone']))
@@ -0,0 +1,221 @@
+"""
+Persistent cache for ETA lookups.
+
+Every Distance Matrix call departs "now", so exact results never repeat,
+but two routes whose endpoints are a few dozen meters apart at the same
+time of week get essentially the same answer. Keys quantize both endpoints
+to grid cells of a configurable size and the departure time to a
+weekday + 15-minute bucket. Walking and cycling don't depend on the
+departure time, so their keys leave the bucket out.
+
+Backed by a local SQLite file shared by every worker, like the geocode
+cache. Each mode has its own TTL (long for walking, short for driving), and
+the least recently used entries are evicted past max_entries.
+"""
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from geo import METERS_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+# How many puts happen between checks of the cache size
+EVICT_EVERY = 100
+
+# Modes whose ETAs change with the time of day
+TIME_DEPENDENT_MODES = {'driving', 'transit'}
+
+# Default TTL per mode, in hours
+DEFAULT_TTL_HOURS = {
+    'walking': 30 * 24,
+    'bicycling': 30 * 24,
+    'transit': 7 * 24,
+    'driving': 24
+}
+
+
+def parse_mode_hours(value, defaults=DEFAULT_TTL_HOURS):
+    """
+    Per-mode hours from a 'mode=hours,mode=hours' string, filling in the
+    defaults for modes it doesn't mention.
+    """
+    hours = dict(defaults)
+    for item in (value or '').split(','):
+        if '=' in item:
+            mode, amount = item.split('=', 1)
+            hours[mode.strip()] = float(amount)
+    return hours
+
+
+def distance_matrix_eta(element):
+    """The ETA dict for one Distance Matrix element."""
+    if element['status'] != 'OK':
+        return {'error': 'Route not available'}
+    return {
+        'duration': element['duration']['text'],
+        'distance': element['distance']['text'],
+        'duration_seconds': element['duration']['value'],
+        'distance_meters': element['distance']['value']
+    }
+
+
+class EtaCache:
+    """
+    SQLite-backed LRU + per-mode TTL cache of ETA dicts.
+
+    - path: SQLite file shared by every process using the cache.
+    - cell_meters: size of the grid cells endpoints are quantized to.
+    - bucket_minutes: width of the departure-time buckets.
+    - ttl_hours: mode -> hours an entry stays valid.
+    - max_entries: LRU eviction threshold.
+    """
+
+    def __init__(self, path, cell_meters=100, bucket_minutes=15, ttl_hours=None, max_entries=500000):
+        self.path = path
+        self.cell_meters = cell_meters
+        self.bucket_minutes = bucket_minutes
+        self.ttl_hours = dict(ttl_hours or DEFAULT_TTL_HOURS)
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS eta ('
+                ' key TEXT PRIMARY KEY,'
+                ' mode TEXT NOT NULL,'
+                ' eta TEXT NOT NULL,'
+                ' created REAL NOT NULL,'
+                ' last_used REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS eta_last_used ON eta (last_used)')
+
+    def _connect(self):
+        """One connection per thread; SQLite connections can't be shared."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def cell(self, lat, lng):
+        """Grid cell of a point as 'row:col', with cells about cell_meters wide."""
+        dlat = self.cell_meters / METERS_PER_DEGREE
+        row = math.floor(lat / dlat)
+        # Cell width in longitude follows the latitude of the cell's row
+        dlng = dlat / max(math.cos(math.radians((row + 0.5) * dlat)), 0.01)
+        return f"{row}:{math.floor(lng / dlng)}"
+
+    def bucket(self, mode, departure=None):
+        """Departure-time bucket for a mode: 'weekday/slot', or '*' for time-independent modes."""
+        if mode not in TIME_DEPENDENT_MODES:
+            return '*'
+        departure = departure or datetime.now()
+        minutes = departure.hour * 60 + departure.minute
+        return f"{departure.weekday()}/{minutes // self.bucket_minutes}"
+
+    def key(self, mode, origin, destination, departure=None):
+        """Cache key for one origin -> destination ETA."""
+        return '|'.join([
+            mode,
+            self.cell(origin['lat'], origin['lng']),
+            self.cell(destination['lat'], destination['lng']),
+            self.bucket(mode, departure)
+        ])
+
+    def ttl_seconds(self, mode):
+        """How long a mode's entries stay valid, in seconds."""
+        return self.ttl_hours.get(mode, 24) * 3600
+
+    def get(self, mode, origin, destination, departure=None):
+        """Cached ETA dict for a route, or None on a miss."""
+        key = self.key(mode, origin, destination, departure)
+        now = time.time()
+        try:
+            with self._connect() as db:
+                row = db.execute(
+                    'SELECT eta FROM eta WHERE key = ? AND created > ?',
+                    (key, now - self.ttl_seconds(mode))
+                ).fetchone()
+                if row is not None:
+                    db.execute('UPDATE eta SET last_used = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"ETA cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, mode, origin, destination, eta, departure=None):
+        """
+        Store an ETA dict for a route. Only answers are cached (an ETA or
+        'Route not available'), never errors from a failed request.
+        """
+        if 'error' in eta and eta['error'] != 'Route not available':
+            return
+
+        now = time.time()
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO eta (key, mode, eta, created, last_used) VALUES (?, ?, ?, ?, ?)',
+                    (self.key(mode, origin, destination, departure), mode, json.dumps(eta), now, now)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"ETA cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over max_entries."""
+        now = time.time()
+        try:
+            with self._connect() as db:
+                for mode in self.ttl_hours:
+                    db.execute('DELETE FROM eta WHERE mode = ? AND created <= ?',
+                               (mode, now - self.ttl_seconds(mode)))
+                count = db.execute('SELECT COUNT(*) FROM eta').fetchone()[0]
+                if count > self.max_entries:
+                    db.execute(
+                        'DELETE FROM eta WHERE key IN '
+                        '(SELECT key FROM eta ORDER BY last_used LIMIT ?)',
+                        (count - self.max_entries,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"ETA cache eviction failed: {e}")
+
+    def stats(self):
+        """Hit/miss counters for this process."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0
+        }
@@ -0,0 +1,369 @@
+"""
+Offline tools for ETA Guesser.
+
+Usage:
+    python -m etaguessr build-water-mask --city toronto --polygons water.geojson
+    python -m etaguessr build-road-nodes --city toronto --osm toronto.osm
+    python -m etaguessr build-street-graph --city toronto --osm toronto.osm
+    python -m etaguessr build-pool --city vancouver --games 5000
+    python -m etaguessr revalidate-pool --city vancouver --budget 2000
+    python -m etaguessr traces --top 10
+"""
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from cities import CITIES, DATA_DIR, city_data_path
+
+# Backoff between failed build-pool generations: doubles per consecutive
+# failure, from BACKOFF_SECONDS up to MAX_BACKOFF_SECONDS
+BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 60
+
+
+def selected_cities(args):
+    """City ids picked with --city, or every configured city."""
+    if args.city:
+        return [args.city]
+    return list(CITIES.keys())
+
+
+def build_water_mask_command(args):
+    """Rasterize a local water/land polygon file into per-city water masks."""
+    from geo import load_geojson_polygons
+    from water_mask import build_water_mask, save_water_mask
+
+    print(f"Loading polygons from {args.polygons}...")
+    polygons = load_geojson_polygons(args.polygons)
+    print(f"✓ Loaded {len(polygons)} polygons")
+
+    for city_id in selected_cities(args):
+        water, grid = build_water_mask(
+            CITIES[city_id],
+            polygons,
+            polygons_are=args.polygons_are,
+            resolution_meters=args.resolution
+        )
+        path = city_data_path(city_id, 'water_mask.npy')
+        save_water_mask(path, water, grid)
+        print(f"✓ {CITIES[city_id]['name']}: {grid['rows']}x{grid['cols']} cells, "
+              f"{water.mean() * 100:.1f}% water → {path}")
+
+    return 0
+
+
+def build_road_nodes_command(args):
+    """Extract routable road nodes for snapping from a local OSM extract."""
+    from road_nodes import extract_road_nodes, save_road_nodes
+
+    for city_id in selected_cities(args):
+        print(f"Extracting road nodes for {CITIES[city_id]['name']} from {args.osm}...")
+        points = extract_road_nodes(args.osm, CITIES[city_id], spacing_meters=args.spacing)
+        path = city_data_path(city_id, 'road_nodes.npy')
+        save_road_nodes(path, points)
+        print(f"✓ {CITIES[city_id]['name']}: {len(points)} road nodes → {path}")
+
+    return 0
+
+
+def build_street_graph_command(args):
+    """Extract the walking/cycling street graph from a local OSM extract."""
+    from street_router import build_street_graph, save_street_graph
+
+    for city_id in selected_cities(args):
+        print(f"Building street graph for {CITIES[city_id]['name']} from {args.osm}...")
+        graph = build_street_graph(args.osm, CITIES[city_id])
+        path = city_data_path(city_id, 'street_graph.npz')
+        save_street_graph(path, graph)
+        print(f"✓ {CITIES[city_id]['name']}: {len(graph['lats'])} nodes, "
+              f"{len(graph['indices'])} edges → {path}")
+
+    return 0
+
+
+def configure_app_logging(verbose):
+    """
+    With --verbose, show app.py's per-attempt DEBUG logs as plain text.
+    Must run before app is imported, since app configures logging on import.
+    """
+    if verbose:
+        os.environ.setdefault('LOG_LEVEL', 'DEBUG')
+        os.environ.setdefault('LOG_FORMAT', 'text')
+
+
+def build_pool_command(args):
+    """
+    Generate games for a city into a JSON Lines store with app.py's
+    validation, using a pool of workers under a global requests-per-second
+    limit. Every game is written as soon as it's found, and a rerun
+    continues until the store holds --games games. Workers back off after
+    a generation that raised or found no game, and the build stops after
+    --max-failures such failures in a row.
+    """
+    from game_store import GameStore
+    from rate_limit import RateLimitedClient, RateLimiter
+
+    path = args.output or city_data_path(args.city, 'games.jsonl')
+    store = GameStore(path)
+    if len(store) >= args.games:
+        print(f"✓ {path} already holds {len(store)} games")
+        return 0
+    print(f"Building {args.games} games for {CITIES[args.city]['name']} → {path} "
+          f"({len(store)} already done, {args.workers} workers, {args.rps:g} requests/s)")
+
+    # The app's own game pool would compete for the same requests
+    os.environ['GAME_POOL_SIZE'] = '0'
+    configure_app_logging(args.verbose)
+    quiet = contextlib.redirect_stdout(open(os.devnull, 'w')) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        import app
+    if args.rps > 0:
+        app.gmaps = RateLimitedClient(app.gmaps, RateLimiter(args.rps))
+
+    def generate():
+        if args.bulk:
+            return app.generate_games_bulk(args.city)
+        game = app.generate_game(args.city)
+        return [game] if game is not None else []
+
+    stop = threading.Event()
+    started = time.time()
+    resumed_at = len(store)
+    # Failures in a row across all workers; any game written resets it
+    failures = {'consecutive': 0, 'gave_up': False}
+    failures_lock = threading.Lock()
+
+    def work():
+        while not stop.is_set() and len(store) < args.games:
+            try:
+                games = generate()
+                error = 'no valid game found'
+            except Exception as e:
+                games, error = [], e
+            if not games:
+                # generate_game() and generate_games_bulk() report most
+                # failures (a bad key, REQUEST_DENIED, no quota) by coming up
+                # empty, so that counts as a failure too
+                with failures_lock:
+                    failures['consecutive'] += 1
+                    consecutive = failures['consecutive']
+                    if consecutive >= args.max_failures and not failures['gave_up']:
+                        failures['gave_up'] = True
+                        print(f"✗ Giving up after {consecutive} failed generations in a row: {error}",
+                              file=sys.stderr)
+                        stop.set()
+                if stop.is_set():
+                    return
+                delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (consecutive - 1))
+                print(f"Warning: Generation failed ({consecutive} in a row), retrying in {delay}s: {error}",
+                      file=sys.stderr)
+                stop.wait(delay)
+                continue
+            for game in games:
+                if not store.append(game, limit=args.games):
+                    return
+                with failures_lock:
+                    failures['consecutive'] = 0
+                done = len(store)
+                rate = (done - resumed_at) / (time.time() - started) * 60
+                print(f"✓ {done}/{args.games} games ({rate:.1f}/min)", file=sys.stderr)
+
+    workers = [threading.Thread(target=work, daemon=True) for _ in range(args.workers)]
+    with quiet:
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            print("Stopping after the games in progress (Ctrl-C again to quit now)...", file=sys.stderr)
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+    store.close()
+    print(f"{'✗' if failures['gave_up'] else '✓'} {path}: {len(store)}/{args.games} games")
+    return 0 if len(store) >= args.games and not failures['gave_up'] else 1
+
+
+def revalidate_pool_command(args):
+    """
+    Re-query the oldest games of a city's store within an element budget,
+    updating their ETAs or evicting them, and rewrite the store.
+    """
+    from game_store import GameStore
+    from revalidation import DailyBudget, Revalidator
+
+    path = args.output or city_data_path(args.city, 'games.jsonl')
+    if not os.path.exists(path):
+        print(f"No games at {path}")
+        return 1
+    store = GameStore(path)
+    games = list(store)
+
+    os.environ['GAME_POOL_SIZE'] = '0'
+    configure_app_logging(args.verbose)
+    quiet = contextlib.redirect_stdout(open(os.devnull, 'w')) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        import app
+
+    revalidator = Revalidator(
+        app.fetch_revalidation_etas,
+        app.revalidation_cost,
+        DailyBudget(args.budget),
+        app.REQUIRED_MODES,
+        max_drift=args.max_drift
+    )
+    print(f"Revalidating {CITIES[args.city]['name']} games in {path} "
+          f"({len(games)} stored, budget {args.budget} elements)")
+    with quiet:
+        changes = revalidator.revalidate(games)
+
+    kept = []
+    for game in games:
+        if id(game) not in changes:
+            kept.append(game)
+        elif changes[id(game)] is not None:
+            kept.append(changes[id(game)])
+    store.rewrite(kept)
+    store.close()
+
+    evicted = len(games) - len(kept)
+    print(f"✓ Revalidated {len(changes)} games: {len(changes) - evicted} updated, {evicted} evicted "
+          f"→ {len(kept)} games in {path}")
+    return 0
+
+
+def describe_span(span):
+    """One-line label for a span: its name and most telling attributes."""
+    attributes = span['attributes']
+    label = span['name']
+    if span['name'] == 'attempt':
+        label += f" #{attributes.get('attempt')}"
+    if attributes.get('mode'):
+        label += f" ({attributes['mode']})"
+    for key in ('source', 'rejection'):
+        if attributes.get(key):
+            label += f" - {attributes[key]}"
+    if span['error']:
+        label += f" - {span['error']}"
+    return label
+
+
+def traces_command(args):
+    """
+    Summarise the slowest recorded requests, then show the critical path of
+    the slowest one (or of --trace): the chain of attempts and Google calls
+    that its time was spent waiting on.
+    """
+    from tracing import critical_path, group_traces, read_spans
+
+    path = args.file or os.getenv('TRACE_PATH') or os.path.join(DATA_DIR, 'traces.jsonl')
+    traces = group_traces(read_spans(path))
+    if args.city:
+        traces = {trace_id: trace for trace_id, trace in traces.items()
+                  if trace[0]['attributes'].get('city') == args.city}
+    if not traces:
+        print(f"No traces in {path}")
+        return 1
+
+    def descendants(span_id, children):
+        for child in children.get(span_id, []):
+            yield child
+            yield from descendants(child['span_id'], children)
+
+    slowest = sorted(traces.items(), key=lambda item: item[1][0]['duration'] or 0, reverse=True)
+    print(f"{len(traces)} traces in {path}, slowest {min(args.top, len(traces))}:")
+    for trace_id, (root, children) in slowest[:args.top]:
+        spans = list(descendants(root['span_id'], children))
+        attempts = sum(1 for span in spans if span['name'] == 'attempt')
+        calls = [span for span in spans if span['name'].startswith('google.')]
+        call_seconds = sum(span['duration'] or 0 for span in calls)
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(root['start']))
+        print(f"  {root['duration']:7.2f}s  {trace_id[:12]}  {started}  "
+              f"{root['attributes'].get('city', '?')}/{root['attributes'].get('source', '?')}  "
+              f"{attempts} attempts, {len(calls)} Google calls ({call_seconds:.2f}s)")
+
+    if args.trace:
+        matches = [trace_id for trace_id in traces if trace_id.startswith(args.trace)]
+        if len(matches) != 1:
+            print(f"No single trace matches {args.trace}")
+            return 1
+        trace_id = matches[0]
+    else:
+        trace_id = slowest[0][0]
+
+    root, children = traces[trace_id]
+    print(f"\nCritical path of {trace_id}:")
+    for depth, span in critical_path(root, children):
+        offset = span['start'] - root['start']
+        print(f"  +{offset:6.2f}s {span['duration'] or 0:6.2f}s  {'  ' * depth}{describe_span(span)}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='etaguessr', description='ETA Guesser offline tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    water = subparsers.add_parser('build-water-mask', help='Build per-city land/water masks')
+    water.add_argument('--city', choices=sorted(CITIES), help='Only build this city (default: all)')
+    water.add_argument('--polygons', required=True, help='GeoJSON file of water or land polygons')
+    water.add_argument('--polygons-are', choices=['water', 'land'], default='water',
+                       help='Whether the polygons describe water or land (default: water)')
+    water.add_argument('--resolution', type=float, default=25,
+                       help='Cell size in meters (default: 25)')
+    water.set_defaults(func=build_water_mask_command)
+
+    roads = subparsers.add_parser('build-road-nodes', help='Build per-city road-node snapping indexes')
+    roads.add_argument('--city', choices=sorted(CITIES), help='Only build this city (default: all)')
+    roads.add_argument('--osm', required=True, help='OSM XML extract (.osm) covering the city')
+    roads.add_argument('--spacing', type=float, default=25,
+                       help='Max spacing of nodes along a road in meters (default: 25)')
+    roads.set_defaults(func=build_road_nodes_command)
+
+    streets = subparsers.add_parser('build-street-graph', help='Build per-city walking/cycling street graphs')
+    streets.add_argument('--city', choices=sorted(CITIES), help='Only build this city (default: all)')
+    streets.add_argument('--osm', required=True, help='OSM XML extract (.osm) covering the city')
+    streets.set_defaults(func=build_street_graph_command)
+
+    pool = subparsers.add_parser('build-pool', help='Generate games into a resumable on-disk store')
+    pool.add_argument('--city', choices=sorted(CITIES), required=True, help='City to generate games for')
+    pool.add_argument('--games', type=int, required=True, help='Number of games the store should hold')
+    pool.add_argument('--output', help='JSON Lines file (default: data/<city>/games.jsonl)')
+    pool.add_argument('--workers', type=int, default=4, help='Concurrent generation workers (default: 4)')
+    pool.add_argument('--rps', type=float, default=10,
+                      help='Google Maps requests per second across all workers, 0 for no limit (default: 10)')
+    pool.add_argument('--bulk', action='store_true', help='Use bulk matrix generation')
+    pool.add_argument('--max-failures', type=int, default=10,
+                      help='Stop after this many failed generations in a row (default: 10)')
+    pool.add_argument('--verbose', action='store_true', help="Show the app's per-attempt output")
+    pool.set_defaults(func=build_pool_command)
+
+    revalidate = subparsers.add_parser('revalidate-pool', help='Refresh the ETAs of stored games')
+    revalidate.add_argument('--city', choices=sorted(CITIES), required=True, help='City whose games to revalidate')
+    revalidate.add_argument('--output', help='JSON Lines file (default: data/<city>/games.jsonl)')
+    revalidate.add_argument('--budget', type=int, default=1000,
+                            help='Most Distance Matrix elements to spend (default: 1000)')
+    revalidate.add_argument('--max-drift', type=float, default=0.5,
+                            help='Evict games whose ETAs changed by more than this fraction (default: 0.5)')
+    revalidate.add_argument('--verbose', action='store_true', help="Show the app's output")
+    revalidate.set_defaults(func=revalidate_pool_command)
+
+    traces = subparsers.add_parser('traces', help='Summarise the slowest traced requests')
+    traces.add_argument('--file', help='Trace file, read with its per-worker files '
+                        '(default: TRACE_PATH or data/traces.jsonl)')
+    traces.add_argument('--city', choices=sorted(CITIES), help='Only requests for this city')
+    traces.add_argument('--top', type=int, default=10, help='Number of slowest traces to list (default: 10)')
+    traces.add_argument('--trace', help='Show the critical path of this trace id (or prefix)')
+    traces.set_defaults(func=traces_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Learned index of where ferry routes happen.
+
+Every driving Directions check records whether the route needed a ferry,
+counted per geohash cell of both its origin and its destination, since
+either end can be the one across the water. Once a cell has enough samples
+it is either a known ferry cell (candidates with a point there are rejected
+without any API call) or proven ferry-free (the Directions request can be
+skipped when every point of a candidate is in such a cell). Counts live in
+a local SQLite file shared by all workers.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+from geo import geohash_encode
+
+logger = logging.getLogger(__name__)
+
+FERRY = 'ferry'
+CLEAR = 'clear'
+
+
+class FerryIndex:
+    """
+    Per-city geohash cells with ferry / no-ferry outcome counts.
+
+    - precision: geohash length of a cell (6 is about 1.2 km x 0.6 km).
+    - min_samples: outcomes a cell needs before it is trusted either way.
+    - confidence: share of ferry outcomes above which a cell counts as a
+      ferry cell, and of clear outcomes above which it counts as ferry-free.
+    """
+
+    def __init__(self, path, precision=6, min_samples=5, confidence=0.95):
+        self.path = path
+        self.precision = precision
+        self.min_samples = min_samples
+        self.confidence = confidence
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS ferry_cells ('
+                ' city TEXT NOT NULL,'
+                ' cell TEXT NOT NULL,'
+                ' ferry INTEGER NOT NULL DEFAULT 0,'
+                ' clear INTEGER NOT NULL DEFAULT 0,'
+                ' PRIMARY KEY (city, cell))'
+            )
+
+    def _connect(self):
+        """One connection per thread; SQLite connections can't be shared."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def cell(self, lat, lng):
+        """Geohash cell of a point."""
+        return geohash_encode(lat, lng, self.precision)
+
+    def record(self, city_id, lat, lng, has_ferry):
+        """Record the outcome of one Directions ferry check at one end of its route."""
+        column = 'ferry' if has_ferry else 'clear'
+        try:
+            with self._connect() as db:
+                db.execute(
+                    f'INSERT INTO ferry_cells (city, cell, {column}) VALUES (?, ?, 1) '
+                    f'ON CONFLICT (city, cell) DO UPDATE SET {column} = {column} + 1',
+                    (city_id, self.cell(lat, lng))
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Ferry index write failed: {e}")
+
+    def classify(self, city_id, lat, lng):
+        """
+        FERRY if the point's cell is a known ferry cell, CLEAR if it is
+        proven ferry-free, or None if there isn't enough evidence yet.
+        """
+        try:
+            row = self._connect().execute(
+                'SELECT ferry, clear FROM ferry_cells WHERE city = ? AND cell = ?',
+                (city_id, self.cell(lat, lng))
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Ferry index read failed: {e}")
+            return None
+
+        if row is None:
+            return None
+
+        ferry, clear = row
+        total = ferry + clear
+        if total < self.min_samples:
+            return None
+        if ferry / total >= self.confidence:
+            return FERRY
+        if clear / total >= self.confidence:
+            return CLEAR
+        return None
+
+    def ferry_cells(self, city_id):
+        """Every cell of a city that classify() would call FERRY."""
+        try:
+            rows = self._connect().execute(
+                'SELECT cell, ferry, clear FROM ferry_cells WHERE city = ? AND ferry > 0',
+                (city_id,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Ferry index read failed: {e}")
+            return set()
+
+        return {
+            cell for cell, ferry, clear in rows
+            if ferry + clear >= self.min_samples and ferry / (ferry + clear) >= self.confidence
+        }
@@ -0,0 +1,248 @@
+"""
+Pool of pre-generated games for the /random-destination endpoint.
+
+Each city gets a queue of validated games (the same dict the endpoint
+returns). A background worker keeps every queue topped up, so a request
+only has to pop a ready game instead of running the generation loop.
+
+The queues live in a SQLite file, like the geocode and ETA caches, so every
+gunicorn worker serves from the same pool: a pop takes a game out in one
+transaction, so no two requests get the same game, and restarts begin with
+whatever the pool held. Each worker runs a refill thread, but an exclusive
+lock on a file next to the database lets only one of them refill at a time.
+"""
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class GamePool:
+    """
+    Per-city queues of ready-to-serve games with a background refill worker.
+
+    - generate: callable taking a city id and returning a game dict, or None
+      if no valid game could be found.
+    - city_ids: cities the refill worker keeps topped up.
+    - target_size: number of games to keep per city.
+    - low_water: refill a city once its queue drops below this many games.
+    - path: SQLite file holding the queues, shared by every process.
+    - generate_many: optional callable taking a city id and returning a list
+      of game dicts (e.g. from bulk generation). Used instead of generate
+      when set; a batch may top a city up past target_size.
+    """
+
+    def __init__(self, generate, city_ids, target_size=10, low_water=5, path='game_pool.sqlite3', generate_many=None):
+        self.generate = generate
+        self.generate_many = generate_many
+        self.city_ids = list(city_ids)
+        self.target_size = target_size
+        self.low_water = min(low_water, target_size)
+        self.path = path
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self._connect()
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS games ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' city TEXT NOT NULL,'
+            ' game TEXT NOT NULL,'
+            ' added REAL NOT NULL)'
+        )
+        db.execute('CREATE INDEX IF NOT EXISTS games_city ON games (city, id)')
+
+    def _connect(self):
+        """One connection per thread; SQLite connections can't be shared."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit mode, so a pop is one explicit BEGIN IMMEDIATE
+            # transaction that locks out the other workers
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def __len__(self):
+        try:
+            return self._connect().execute('SELECT COUNT(*) FROM games').fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Game pool read failed: {e}")
+            return 0
+
+    def size(self, city_id):
+        """Number of games currently pooled for a city."""
+        try:
+            return self._connect().execute('SELECT COUNT(*) FROM games WHERE city = ?', (city_id,)).fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Game pool read failed: {e}")
+            return 0
+
+    def pop(self, city_id):
+        """
+        Take one game for a city (the oldest), or None if the pool for it is
+        empty. Wakes the refill worker when the city drops below the
+        low-water mark.
+        """
+        db = self._connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                row = db.execute(
+                    'SELECT id, game FROM games WHERE city = ? ORDER BY id LIMIT 1', (city_id,)
+                ).fetchone()
+                if row is not None:
+                    db.execute('DELETE FROM games WHERE id = ?', (row[0],))
+                remaining = db.execute('SELECT COUNT(*) FROM games WHERE city = ?', (city_id,)).fetchone()[0]
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Game pool pop failed: {e}")
+            return None
+
+        if remaining < self.low_water:
+            self._wakeup.set()
+        return json.loads(row[1]) if row is not None else None
+
+    def put(self, city_id, game, max_size=None):
+        """
+        Add a validated game to a city's queue. With max_size, the game is
+        only added if the queue holds fewer games than that, checked in the
+        same statement. Returns True if it was added.
+        """
+        try:
+            cursor = self._connect().execute(
+                'INSERT INTO games (city, game, added) SELECT ?, ?, ?'
+                ' WHERE ? IS NULL OR (SELECT COUNT(*) FROM games WHERE city = ?) < ?',
+                (city_id, json.dumps(game), time.time(), max_size, city_id, max_size)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Game pool write failed: {e}")
+            return False
+        return cursor.rowcount > 0
+
+    def games(self, city_id):
+        """Snapshot of the games currently pooled for a city, as (game id, game) pairs."""
+        try:
+            rows = self._connect().execute(
+                'SELECT id, game FROM games WHERE city = ? ORDER BY id', (city_id,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Game pool read failed: {e}")
+            return []
+        return [(game_id, json.loads(game)) for game_id, game in rows]
+
+    def apply(self, city_id, changes):
+        """
+        Replace or drop pooled games after revalidation. changes maps a game
+        id from games() to the updated game dict, or None to evict it. Games
+        popped in the meantime are left alone.
+        """
+        db = self._connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                evicted = 0
+                for game_id, game in changes.items():
+                    if game is None:
+                        evicted += db.execute(
+                            'DELETE FROM games WHERE id = ? AND city = ?', (game_id, city_id)
+                        ).rowcount
+                    else:
+                        db.execute('UPDATE games SET game = ? WHERE id = ? AND city = ?',
+                                   (json.dumps(game), game_id, city_id))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Game pool update failed: {e}")
+            return
+
+        if evicted:
+            self._wakeup.set()
+
+    def _refill_lock(self):
+        """
+        An exclusive, non-blocking lock on the refill lock file, or None if
+        another process holds it. Released when the returned file is closed
+        (or the process exits).
+        """
+        f = open(f"{self.path}.refill.lock", 'w')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None
+        return f
+
+    def refill(self):
+        """
+        Top up every city that is below the low-water mark back to the
+        target size, unless another process is already refilling. Returns
+        the number of games added.
+        """
+        try:
+            lock = self._refill_lock()
+        except OSError as e:
+            logger.warning(f"Could not open the game pool refill lock: {e}")
+            return 0
+        if lock is None:
+            return 0
+
+        added = 0
+        with lock:
+            for city_id in self.city_ids:
+                if self.size(city_id) >= self.low_water:
+                    continue
+
+                while self.size(city_id) < self.target_size:
+                    try:
+                        if self.generate_many is not None:
+                            games = self.generate_many(city_id)
+                        else:
+                            game = self.generate(city_id)
+                            games = [game] if game is not None else []
+                    except Exception as e:
+                        logger.warning(f"Game pool refill failed for {city_id}: {e}")
+                        games = []
+
+                    if not games:
+                        # Give up on this city for now, try again on the next wakeup
+                        break
+
+                    for game in games:
+                        self.put(city_id, game)
+                    added += len(games)
+        return added
+
+    def start(self, interval_seconds=60):
+        """
+        Start the background refill worker (daemon thread). The worker runs
+        whenever a pop drops a city below the low-water mark, and otherwise
+        every interval_seconds.
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                self.refill()
+                self._wakeup.wait(interval_seconds)
+                self._wakeup.clear()
+
+        self._thread = threading.Thread(target=run, name='game-pool-refill', daemon=True)
+        self._thread.start()
@@ -0,0 +1,98 @@
+"""
+Append-only on-disk store of generated games, one compact JSON object per
+line (JSON Lines).
+
+Each game is flushed to disk as soon as it is written, so an interrupted
+build keeps every finished game and a rerun picks up where it stopped. A
+partial last line left by a crash is dropped when the store is opened.
+"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class GameStore:
+    """
+    Thread-safe JSON Lines file of game dicts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._count = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._file = open(path, 'a')
+
+    def _recover(self):
+        """Count the complete games on disk and cut off a partial last line."""
+        if not os.path.exists(self.path):
+            return
+
+        good_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                good_bytes += len(line)
+                self._count += 1
+
+        if good_bytes < os.path.getsize(self.path):
+            logger.warning(f"Dropping a partial record at the end of {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_bytes)
+
+    def __len__(self):
+        with self._lock:
+            return self._count
+
+    def __iter__(self):
+        """Iterate over every stored game."""
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def append(self, game, limit=None):
+        """
+        Write one game to disk. Returns False without writing if the store
+        already holds limit games.
+        """
+        line = json.dumps(game, separators=(',', ':')) + '\n'
+        with self._lock:
+            if limit is not None and self._count >= limit:
+                return False
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._count += 1
+            return True
+
+    def rewrite(self, games):
+        """Atomically replace the store's contents with games."""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                for game in games:
+                    f.write(json.dumps(game, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, 'a')
+            self._count = len(games)
+
+    def close(self):
+        """Close the file; the store can't be appended to afterwards."""
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,249 @@
+"""
+Geometry helpers shared by the offline data builders and loaders: reading
+polygons from GeoJSON, laying a regular lat/lng grid over a city,
+rasterizing polygons onto that grid, and projecting lat/lng to local meters.
+"""
+import json
+import math
+
+import numpy as np
+
+# Meters per degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE = 111320.0
+
+# Mean Earth radius, used by the local projection
+EARTH_RADIUS_METERS = 6371008.8
+
+# Most (point x edge) cells points_in_polygons() works on at once
+POINTS_IN_POLYGONS_BATCH_CELLS = 1 << 20
+
+
+def load_geojson_polygons(path):
+    """
+    Read every Polygon / MultiPolygon in a GeoJSON file.
+    Returns a list of polygons, each a list of rings (outer ring first, then
+    holes) as (N, 2) float arrays of (lng, lat).
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    polygons = []
+
+    def visit(obj):
+        kind = obj.get('type')
+        if kind == 'FeatureCollection':
+            for feature in obj.get('features', []):
+                visit(feature)
+        elif kind == 'Feature':
+            if obj.get('geometry'):
+                visit(obj['geometry'])
+        elif kind == 'GeometryCollection':
+            for geometry in obj.get('geometries', []):
+                visit(geometry)
+        elif kind == 'Polygon':
+            polygons.append([np.asarray(ring, dtype=float)[:, :2] for ring in obj['coordinates']])
+        elif kind == 'MultiPolygon':
+            for rings in obj['coordinates']:
+                polygons.append([np.asarray(ring, dtype=float)[:, :2] for ring in rings])
+
+    visit(data)
+    return polygons
+
+
+def city_grid(city_config, resolution_meters, margin_meters=500):
+    """
+    Regular lat/lng grid covering a city's radius (plus a margin) with cells
+    of roughly resolution_meters on each side.
+    Cell (row, col) spans lat south + row * dlat and lng west + col * dlng.
+    """
+    center = city_config['center']
+    half_size = city_config['radius_meters'] + margin_meters
+
+    dlat = resolution_meters / METERS_PER_DEGREE
+    dlng = resolution_meters / (METERS_PER_DEGREE * math.cos(math.radians(center['lat'])))
+    cells = int(math.ceil(2 * half_size / resolution_meters))
+
+    return {
+        'south': center['lat'] - cells / 2 * dlat,
+        'west': center['lng'] - cells / 2 * dlng,
+        'dlat': dlat,
+        'dlng': dlng,
+        'rows': cells,
+        'cols': cells,
+        'resolution_meters': resolution_meters
+    }
+
+
+def grid_cells(grid, lats, lngs):
+    """
+    Grid (rows, cols) index arrays for arrays of points, plus a boolean array
+    of which points fall inside the grid at all.
+    """
+    rows = np.floor((np.asarray(lats, dtype=float) - grid['south']) / grid['dlat']).astype(np.int64)
+    cols = np.floor((np.asarray(lngs, dtype=float) - grid['west']) / grid['dlng']).astype(np.int64)
+    inside = (rows >= 0) & (rows < grid['rows']) & (cols >= 0) & (cols < grid['cols'])
+    return rows, cols, inside
+
+
+def rasterize_polygons(polygons, grid):
+    """
+    Mark every grid cell whose centre lies inside any of the polygons.
+    Holes are honoured (even-odd rule within a polygon); separate polygons
+    are combined as a union. Returns a (rows, cols) boolean array.
+    """
+    result = np.zeros((grid['rows'], grid['cols']), dtype=bool)
+    row_lats = grid['south'] + (np.arange(grid['rows']) + 0.5) * grid['dlat']
+
+    for rings in polygons:
+        # Edges of every ring in this polygon
+        starts = np.concatenate([ring for ring in rings])
+        ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+        x0, y0 = starts[:, 0], starts[:, 1]
+        x1, y1 = ends[:, 0], ends[:, 1]
+
+        # Only scan the rows this polygon can touch
+        first_row = max(0, int(np.floor((y0.min() - grid['south']) / grid['dlat'])))
+        last_row = min(grid['rows'], int(np.ceil((y0.max() - grid['south']) / grid['dlat'])) + 1)
+
+        for row in range(first_row, last_row):
+            y = row_lats[row]
+            crosses = (y0 <= y) != (y1 <= y)
+            if not crosses.any():
+                continue
+
+            xa, ya, xb, yb = x0[crosses], y0[crosses], x1[crosses], y1[crosses]
+            xs = xa + (y - ya) * (xb - xa) / (yb - ya)
+
+            # First column whose centre is right of each crossing; the
+            # parity of crossings to the left decides inside/outside
+            cols = np.ceil((xs - grid['west']) / grid['dlng'] - 0.5).astype(np.int64)
+            toggles = np.zeros(grid['cols'] + 1, dtype=np.int64)
+            np.add.at(toggles, np.clip(cols, 0, grid['cols']), 1)
+            result[row] |= (np.cumsum(toggles[:-1]) % 2).astype(bool)
+
+    return result
+
+
+class LocalProjection:
+    """
+    Azimuthal equidistant projection (spherical) around a city centre:
+    distances and bearings from the centre are exact, so a disk of radius r
+    meters around the centre is a true circle of radius r in x/y.
+    Works on scalars and numpy arrays.
+    """
+
+    def __init__(self, center_lat, center_lng):
+        self.center_lat = center_lat
+        self.center_lng = center_lng
+        self._phi1 = math.radians(center_lat)
+        self._lambda0 = math.radians(center_lng)
+        self._sin_phi1 = math.sin(self._phi1)
+        self._cos_phi1 = math.cos(self._phi1)
+
+    def to_xy(self, lat, lng):
+        """Project lat/lng to x (east) / y (north) meters from the centre."""
+        phi = np.radians(lat)
+        dlambda = np.radians(lng) - self._lambda0
+        sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+        cos_dlambda = np.cos(dlambda)
+
+        cos_c = np.clip(self._sin_phi1 * sin_phi + self._cos_phi1 * cos_phi * cos_dlambda, -1.0, 1.0)
+        c = np.arccos(cos_c)
+        # Scale factor c / sin(c), which tends to 1 at the centre
+        k = np.where(c > 1e-12, c / np.sin(np.maximum(c, 1e-12)), 1.0)
+
+        x = EARTH_RADIUS_METERS * k * cos_phi * np.sin(dlambda)
+        y = EARTH_RADIUS_METERS * k * (self._cos_phi1 * sin_phi - self._sin_phi1 * cos_phi * cos_dlambda)
+        return x, y
+
+    def to_latlng(self, x, y):
+        """Inverse of to_xy()."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        rho = np.hypot(x, y)
+        c = rho / EARTH_RADIUS_METERS
+        sin_c, cos_c = np.sin(c), np.cos(c)
+        safe_rho = np.where(rho > 0, rho, 1.0)
+
+        phi = np.arcsin(np.clip(
+            cos_c * self._sin_phi1 + y * sin_c * self._cos_phi1 / safe_rho, -1.0, 1.0
+        ))
+        lam = self._lambda0 + np.arctan2(
+            x * sin_c,
+            rho * self._cos_phi1 * cos_c - y * self._sin_phi1 * sin_c
+        )
+        return np.degrees(phi), np.degrees(lam)
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lng, precision=6):
+    """
+    Geohash of a point. Precision 6 cells are about 1.2 km x 0.6 km,
+    precision 7 about 150 m x 150 m.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+
+    while len(chars) < precision:
+        value, value_range = (lng, lng_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits <<= 1
+            value_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+
+    return ''.join(chars)
+
+
+def points_in_polygons(lats, lngs, polygons):
+    """
+    Exact point-in-polygon test for arrays of points against a list of
+    polygons (as returned by load_geojson_polygons). Holes are honoured
+    within a polygon; separate polygons are combined as a union.
+    Returns a boolean array.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    point_lats, point_lngs = lats.ravel(), lngs.ravel()
+    result = np.zeros(point_lats.shape, dtype=bool)
+
+    for rings in polygons:
+        starts = np.concatenate([ring for ring in rings])
+        ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+        x0, y0 = starts[:, 0], starts[:, 1]
+        x1, y1 = ends[:, 0], ends[:, 1]
+
+        # Points outside the polygon's bounding box (or already inside an
+        # earlier polygon) can't change the result
+        candidates = np.flatnonzero(
+            ~result
+            & (point_lngs >= x0.min()) & (point_lngs <= x0.max())
+            & (point_lats >= y0.min()) & (point_lats <= y0.max())
+        )
+
+        # Even-odd ray casting towards +lng over a (points x edges) array,
+        # in batches so it stays around POINTS_IN_POLYGONS_BATCH_CELLS cells
+        batch = max(1, POINTS_IN_POLYGONS_BATCH_CELLS // len(x0))
+        for lo in range(0, len(candidates), batch):
+            indices = candidates[lo:lo + batch]
+            lat = point_lats[indices, None]
+            lng = point_lngs[indices, None]
+            crosses = (y0 <= lat) != (y1 <= lat)
+            # Horizontal edges divide by zero, but never cross
+            with np.errstate(divide='ignore', invalid='ignore'):
+                xs = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+            result[indices] = np.count_nonzero(crosses & (xs > lng), axis=1) % 2 == 1
+
+    return result.reshape(lats.shape)
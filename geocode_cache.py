@@ -0,0 +1,143 @@
+"""
+Persistent cache for reverse-geocode results.
+
+Keyed on lat/lng rounded to a configurable number of decimal places, so the
+water check and the address lookup for the same point share one API call.
+Backed by a local SQLite file, so every gunicorn worker and restarts share
+it. Entries expire after a TTL, and the least recently used entries are
+evicted once the cache grows past max_entries.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How many puts happen between checks of the cache size
+EVICT_EVERY = 100
+
+
+class GeocodeCache:
+    """
+    SQLite-backed LRU + TTL cache of reverse-geocode results.
+
+    - path: SQLite file shared by every process using the cache.
+    - precision: decimal places lat/lng are rounded to for the key
+      (5 places is about 1 m).
+    - max_entries: LRU eviction threshold.
+    - ttl_seconds: entries older than this are treated as misses.
+    """
+
+    def __init__(self, path, precision=5, max_entries=100000, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.precision = precision
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS geocode ('
+                ' key TEXT PRIMARY KEY,'
+                ' result TEXT NOT NULL,'
+                ' created REAL NOT NULL,'
+                ' last_used REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS geocode_last_used ON geocode (last_used)')
+
+    def _connect(self):
+        """One connection per thread; SQLite connections can't be shared."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def key(self, lat, lng):
+        """Cache key for a point, rounded to the configured precision."""
+        return f"{lat:.{self.precision}f},{lng:.{self.precision}f}"
+
+    def get(self, lat, lng):
+        """
+        Cached reverse-geocode result for a point, or None on a miss.
+        A cached empty result ([]) is a hit.
+        """
+        key = self.key(lat, lng)
+        now = time.time()
+        try:
+            with self._connect() as db:
+                row = db.execute(
+                    'SELECT result FROM geocode WHERE key = ? AND created > ?',
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row is not None:
+                    db.execute('UPDATE geocode SET last_used = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Geocode cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, lat, lng, result):
+        """Store a reverse-geocode result for a point."""
+        now = time.time()
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO geocode (key, result, created, last_used) VALUES (?, ?, ?, ?)',
+                    (self.key(lat, lng), json.dumps(result), now, now)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Geocode cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over max_entries."""
+        try:
+            with self._connect() as db:
+                db.execute('DELETE FROM geocode WHERE created <= ?', (time.time() - self.ttl_seconds,))
+                count = db.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+                if count > self.max_entries:
+                    db.execute(
+                        'DELETE FROM geocode WHERE key IN '
+                        '(SELECT key FROM geocode ORDER BY last_used LIMIT ?)',
+                        (count - self.max_entries,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Geocode cache eviction failed: {e}")
+
+    def stats(self):
+        """Hit/miss counters for this process."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0
+        }
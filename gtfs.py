@@ -0,0 +1,116 @@
+"""
+Local GTFS transit data.
+
+Each city can have an unzipped GTFS feed in data/<city_id>/gtfs/. Its stops
+are loaded into a KD-tree so origins can be sampled near transit without
+calling the Places API.
+"""
+import csv
+import math
+import os
+import random
+
+import numpy as np
+
+from geo import LocalProjection
+from kdtree import KDTree
+
+
+def read_gtfs_table(gtfs_dir, name):
+    """
+    Iterate over the rows of one GTFS table (e.g. 'stops') as dicts.
+    Handles the UTF-8 byte order mark some agencies ship.
+    """
+    with open(os.path.join(gtfs_dir, f'{name}.txt'), newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def count_stop_departures(gtfs_dir):
+    """
+    Number of scheduled stop_times per stop_id, as a rough measure of how
+    frequently each stop is served.
+    """
+    counts = {}
+    for row in read_gtfs_table(gtfs_dir, 'stop_times'):
+        stop_id = row['stop_id']
+        counts[stop_id] = counts.get(stop_id, 0) + 1
+    return counts
+
+
+class TransitStops:
+    """
+    Boarding stops within a city's radius, in a KD-tree over local meters.
+    Sampling picks a stop (optionally weighted by service frequency) and is
+    entirely in memory.
+    """
+
+    def __init__(self, ids, names, lats, lngs, weights, projection):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.projection = projection
+
+        xs, ys = projection.to_xy(self.lats, self.lngs)
+        self.tree = KDTree(xs, ys)
+
+        self._indices = list(range(len(self.ids)))
+        self._cum_weights = np.cumsum(np.asarray(weights, dtype=float)).tolist()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_gtfs(cls, gtfs_dir, city_config, weight_by_frequency=False, margin_meters=500):
+        """
+        Load the stops of a GTFS feed that lie within a city's radius (plus a
+        margin). Stations and entrances are skipped; only boarding stops
+        (location_type 0) are kept. With weight_by_frequency, each stop is
+        weighted by its number of scheduled departures in stop_times.txt.
+        """
+        center = city_config['center']
+        projection = LocalProjection(center['lat'], center['lng'])
+        max_distance = city_config['radius_meters'] + margin_meters
+
+        ids, names, lats, lngs = [], [], [], []
+        for row in read_gtfs_table(gtfs_dir, 'stops'):
+            if row.get('location_type', '') not in ('', '0'):
+                continue
+            try:
+                lat, lng = float(row['stop_lat']), float(row['stop_lon'])
+            except (KeyError, ValueError):
+                continue
+
+            x, y = projection.to_xy(lat, lng)
+            if math.hypot(x, y) > max_distance:
+                continue
+
+            ids.append(row['stop_id'])
+            names.append(row.get('stop_name') or row['stop_id'])
+            lats.append(lat)
+            lngs.append(lng)
+
+        if weight_by_frequency:
+            counts = count_stop_departures(gtfs_dir)
+            weights = [counts.get(stop_id, 0) for stop_id in ids]
+            if not any(weights):
+                weights = [1] * len(ids)
+        else:
+            weights = [1] * len(ids)
+
+        return cls(ids, names, lats, lngs, weights, projection)
+
+    def sample(self):
+        """Index of a random stop, weighted by the stop weights."""
+        return random.choices(self._indices, cum_weights=self._cum_weights)[0]
+
+    def nearest(self, lat, lng):
+        """Index of the stop nearest to a point, and its distance in meters."""
+        x, y = self.projection.to_xy(lat, lng)
+        return self.tree.nearest(float(x), float(y))
+
+    def within(self, lat, lng, radius_meters):
+        """Indices of every stop within radius_meters of a point."""
+        x, y = self.projection.to_xy(lat, lng)
+        return self.tree.within(float(x), float(y), radius_meters)
@@ -0,0 +1,99 @@
+"""
+Static 2-d tree over projected (x, y) points, stored in flat arrays.
+
+Points are reordered at build time so the node for any index range
+[lo, hi) sits at (lo + hi) // 2, splitting on x at even depths and y at odd
+depths. No node objects are allocated, so trees over hundreds of thousands
+of points stay compact and queries run in microseconds.
+"""
+import math
+
+import numpy as np
+
+
+class KDTree:
+    """
+    Nearest-neighbour and radius queries over a fixed set of 2-d points.
+    Query results are indices into the arrays the tree was built from.
+    """
+
+    def __init__(self, xs, ys):
+        points = np.column_stack([np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)])
+        order = np.arange(len(points))
+
+        stack = [(0, len(points), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 1:
+                continue
+            mid = (lo + hi) // 2
+            sub = order[lo:hi]
+            order[lo:hi] = sub[np.argpartition(points[sub, depth % 2], mid - lo)]
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+
+        self.order = order
+        # Python lists make the scalar work in queries much faster than
+        # indexing numpy arrays element by element
+        self._coords = (points[order, 0].tolist(), points[order, 1].tolist())
+        self._ids = order.tolist()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def nearest(self, x, y):
+        """
+        Index of the point closest to (x, y) and its distance, or
+        (None, inf) for an empty tree.
+        """
+        xs, ys = self._coords
+        query = (x, y)
+        best, best_d2 = None, math.inf
+
+        stack = [(0, len(self._ids), 0, 0.0)]
+        while stack:
+            lo, hi, depth, plane_d2 = stack.pop()
+            if lo >= hi or plane_d2 >= best_d2:
+                continue
+
+            mid = (lo + hi) // 2
+            dx, dy = xs[mid] - x, ys[mid] - y
+            d2 = dx * dx + dy * dy
+            if d2 < best_d2:
+                best, best_d2 = mid, d2
+
+            axis = depth % 2
+            diff = query[axis] - self._coords[axis][mid]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            stack.append((far[0], far[1], depth + 1, diff * diff))
+            stack.append((near[0], near[1], depth + 1, 0.0))
+
+        if best is None:
+            return None, math.inf
+        return self._ids[best], math.sqrt(best_d2)
+
+    def within(self, x, y, radius):
+        """Indices of every point within radius of (x, y)."""
+        xs, ys = self._coords
+        query = (x, y)
+        r2 = radius * radius
+        found = []
+
+        stack = [(0, len(self._ids), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if lo >= hi:
+                continue
+
+            mid = (lo + hi) // 2
+            dx, dy = xs[mid] - x, ys[mid] - y
+            if dx * dx + dy * dy <= r2:
+                found.append(self._ids[mid])
+
+            diff = query[depth % 2] - self._coords[depth % 2][mid]
+            if diff - radius <= 0:
+                stack.append((lo, mid, depth + 1))
+            if diff + radius >= 0:
+                stack.append((mid + 1, hi, depth + 1))
+
+        return found
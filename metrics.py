@@ -0,0 +1,332 @@
+"""
+Prometheus metrics aggregated across gunicorn workers.
+
+Each process keeps its counters and histograms in memory and periodically
+writes a snapshot of them to a SQLite file shared by every worker (one row
+per process and series). /metrics flushes the serving worker's own values,
+sums every process's rows and renders the Prometheus text format, so a
+scrape sees the totals of the whole server whichever worker answers it.
+
+Every flush also stamps the process's last-seen time. When a worker
+starts, the rows of processes not seen for stale_seconds are added into
+a single 'exited' process and deleted. Counters never go backwards, and
+the table doesn't grow with every worker restart.
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+# Process the values of exited workers are folded into
+EXITED = 'exited'
+
+
+def escape_label(value):
+    """Label value escaped for the exposition format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=None):
+    """Prometheus label set text, e.g. '{city="toronto",mode="transit"}'."""
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in items) + '}'
+
+
+def add_values(a, b):
+    """Sum of two counter values or two histogram series."""
+    if isinstance(a, list):
+        return [x + y for x, y in zip(a, b)]
+    return a + b
+
+
+def subtract_values(a, b):
+    """a minus b, for counter values or histogram series."""
+    if isinstance(a, list):
+        return [x - y for x, y in zip(a, b)]
+    return a - b
+
+
+def format_value(value):
+    """Number text for the exposition format."""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """
+    Registry of counters and histograms for one process, shared with the
+    other workers through a SQLite file.
+
+    - path: SQLite file shared by every worker.
+    - flush_seconds: how often a background thread writes this process's
+      values to the file.
+    - stale_seconds: processes not seen for this long count as exited.
+    """
+
+    def __init__(self, path, flush_seconds=10, stale_seconds=600):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.stale_seconds = stale_seconds
+        # Unique per process start, so a recycled pid can't overwrite the
+        # totals of the worker that had it before
+        self.process_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._definitions = {}
+        self._values = {}
+        # Values last written, and values already folded into EXITED (if
+        # this process was wrongly taken for exited) that rows leave out
+        self._flushed = {}
+        self._folded = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS metrics ('
+                ' process TEXT NOT NULL,'
+                ' name TEXT NOT NULL,'
+                ' labels TEXT NOT NULL,'
+                ' value TEXT NOT NULL,'
+                ' updated REAL NOT NULL,'
+                ' PRIMARY KEY (process, name, labels))'
+            )
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS processes ('
+                ' process TEXT PRIMARY KEY,'
+                ' last_seen REAL NOT NULL)'
+            )
+        self.fold_exited()
+
+    def _connect(self):
+        """One connection per thread; SQLite connections can't be shared."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def counter(self, name, help_text):
+        """Define a counter."""
+        self._definitions[name] = (COUNTER, help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """Define a histogram with the given upper bucket bounds."""
+        self._definitions[name] = (HISTOGRAM, help_text, tuple(sorted(buckets)))
+
+    def inc(self, name, amount=1, **labels):
+        """Add amount to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram."""
+        buckets = self._definitions[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Per-bucket (not cumulative) counts, then sum and count
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the time spent in a with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def flush(self):
+        """Write this process's current values, and its last-seen time, to the shared file."""
+        with self._lock:
+            snapshot = {key: list(value) if isinstance(value, list) else value
+                        for key, value in self._values.items()}
+
+        now = time.time()
+        try:
+            with self._connect() as db:
+                db.execute('BEGIN IMMEDIATE')
+                seen = db.execute('SELECT 1 FROM processes WHERE process = ?', (self.process_id,)).fetchone()
+                if seen is None and self._flushed:
+                    # Folded into EXITED while still running: those values
+                    # are counted there now
+                    self._folded = dict(self._flushed)
+                db.execute('INSERT OR REPLACE INTO processes (process, last_seen) VALUES (?, ?)',
+                           (self.process_id, now))
+                rows = []
+                for (name, labels), value in snapshot.items():
+                    folded = self._folded.get((name, labels))
+                    if folded is not None:
+                        value = subtract_values(value, folded)
+                    rows.append((self.process_id, name, json.dumps(labels), json.dumps(value), now))
+                db.executemany(
+                    'INSERT OR REPLACE INTO metrics (process, name, labels, value, updated) VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Metrics flush failed: {e}")
+            return
+        self._flushed = snapshot
+
+    def fold_exited(self):
+        """
+        Add the rows of every process not seen for stale_seconds (or never
+        stamped) into the EXITED process's rows and delete them.
+        """
+        try:
+            with self._connect() as db:
+                db.execute('BEGIN IMMEDIATE')
+                stale = {process for (process,) in db.execute(
+                    'SELECT DISTINCT process FROM metrics WHERE process != ? AND process NOT IN '
+                    '(SELECT process FROM processes WHERE last_seen >= ?)',
+                    (EXITED, time.time() - self.stale_seconds)
+                )}
+                if not stale:
+                    return
+
+                totals = {}
+                for process, name, labels, value in db.execute(
+                        'SELECT process, name, labels, value FROM metrics WHERE process = ? OR process IN '
+                        f"({','.join('?' * len(stale))})", [EXITED, *stale]):
+                    value = json.loads(value)
+                    key = (name, labels)
+                    total = totals.get(key)
+                    if total is None:
+                        totals[key] = value
+                    elif not isinstance(value, list) or len(value) == len(total):
+                        totals[key] = add_values(total, value)
+
+                placeholders = ','.join('?' * len(stale))
+                db.execute(f'DELETE FROM metrics WHERE process IN ({placeholders})', list(stale))
+                db.execute(f'DELETE FROM processes WHERE process IN ({placeholders})', list(stale))
+                now = time.time()
+                db.executemany(
+                    'INSERT OR REPLACE INTO metrics (process, name, labels, value, updated) VALUES (?, ?, ?, ?, ?)',
+                    [(EXITED, name, labels, json.dumps(value), now) for (name, labels), value in totals.items()]
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Metrics cleanup failed: {e}")
+            return
+        logger.info(f"Folded metrics of {len(stale)} exited process(es)")
+
+    def start(self):
+        """Flush periodically in a daemon thread, and once more at exit."""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.flush_seconds)
+                self.flush()
+
+        self._thread = threading.Thread(target=run, name='metrics-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def collect(self):
+        """Totals across every process, as {(name, labels): value}."""
+        self.flush()
+        totals = {}
+        try:
+            with self._connect() as db:
+                rows = db.execute('SELECT name, labels, value FROM metrics').fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Metrics read failed: {e}")
+            rows = []
+
+        for name, labels, value in rows:
+            if name not in self._definitions:
+                continue
+            key = (name, tuple(tuple(pair) for pair in json.loads(labels)))
+            value = json.loads(value)
+            if isinstance(value, list):
+                total = totals.setdefault(key, [0] * len(value))
+                if len(total) == len(value):
+                    totals[key] = [a + b for a, b in zip(total, value)]
+            else:
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        totals = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in self._definitions.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (series_name, labels), value in sorted(totals.items()):
+                if series_name != name:
+                    continue
+                if kind == COUNTER:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', format_value(bound))])} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {format_value(value[-1])}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(value[-2])}")
+                lines.append(f"{name}_count{format_labels(labels)} {format_value(value[-1])}")
+        return '\n'.join(lines) + '\n'
+
+
+class InstrumentedClient:
+    """
+    Proxy for a googlemaps.Client that times every API method call into the
+    google_api_seconds histogram and counts exceptions in
+    google_api_errors_total, labelled by operation and (for routing calls)
+    travel mode.
+    """
+
+    def __init__(self, client, metrics):
+        self._client = client
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            labels = {'operation': name, 'mode': kwargs.get('mode') or ''}
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                self._metrics.inc('google_api_errors_total', **labels)
+                raise
+            finally:
+                self._metrics.observe('google_api_seconds', time.perf_counter() - start, **labels)
+        return call
@@ -0,0 +1,51 @@
+"""
+Minimal streaming reader for OpenStreetMap XML extracts (.osm).
+
+Only what the offline builders need: the highway ways of an extract and the
+coordinates of the nodes they use. Parsed with iterparse so a city-sized
+extract never has to be held as a full XML tree.
+"""
+import xml.etree.ElementTree as ET
+
+# Roads every travel mode can reach a point on
+ROUTABLE_HIGHWAYS = {
+    'primary', 'primary_link',
+    'secondary', 'secondary_link',
+    'tertiary', 'tertiary_link',
+    'unclassified', 'residential', 'living_street'
+}
+
+# Ways people can walk along
+WALKABLE_HIGHWAYS = ROUTABLE_HIGHWAYS | {
+    'service', 'pedestrian', 'footway', 'path', 'steps', 'track', 'cycleway'
+}
+
+# Ways people can cycle along (footways only with bicycle=yes)
+CYCLABLE_HIGHWAYS = ROUTABLE_HIGHWAYS | {'service', 'cycleway', 'path', 'track'}
+
+
+def read_osm_ways(path, highway_types=ROUTABLE_HIGHWAYS):
+    """
+    Read the ways of an OSM extract whose highway tag is in highway_types.
+    Returns (nodes, ways): nodes maps node id -> (lat, lng) for every node a
+    kept way uses, and ways is a list of (tags, node_ids) tuples.
+    """
+    all_nodes = {}
+    ways = []
+
+    for _, element in ET.iterparse(path, events=('end',)):
+        if element.tag == 'node':
+            all_nodes[int(element.get('id'))] = (float(element.get('lat')), float(element.get('lon')))
+            element.clear()
+        elif element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            if tags.get('highway') in highway_types:
+                ways.append((tags, [int(nd.get('ref')) for nd in element.iter('nd')]))
+            element.clear()
+        elif element.tag == 'relation':
+            element.clear()
+
+    used = {node_id for _, node_ids in ways for node_id in node_ids}
+    nodes = {node_id: all_nodes[node_id] for node_id in used if node_id in all_nodes}
+    ways = [(tags, [n for n in node_ids if n in nodes]) for tags, node_ids in ways]
+    return nodes, [(tags, node_ids) for tags, node_ids in ways if len(node_ids) >= 2]
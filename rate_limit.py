@@ -0,0 +1,255 @@
+"""
+Client-side rate limiting for Google Maps API calls.
+
+Wrap the googlemaps client in a RateLimitedClient and every API method call
+first waits for a token from a shared RateLimiter, so any number of threads
+together stay under one requests-per-second budget.
+
+Google's quotas are per project, though, not per process. A
+QuotaLimitedClient takes its tokens from a SharedRateLimiter instead: one
+token bucket per Google API, kept in a SQLite file that every gunicorn
+worker updates in a locked transaction. A call waits for its API's bucket
+up to a deadline and then raises Throttled rather than queueing without
+bound, as do calls Google itself answers with OVER_QUERY_LIMIT.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from googlemaps.exceptions import ApiError
+
+logger = logging.getLogger(__name__)
+
+# Google API (quota) each client method is billed against
+API_TYPES = {
+    'distance_matrix': 'distance_matrix',
+    'directions': 'directions',
+    'geocode': 'geocoding',
+    'reverse_geocode': 'geocoding',
+    'places_nearby': 'places'
+}
+
+# Default per-project rates per API, per second. The Distance Matrix quota
+# counts elements (origins x destinations), the others requests.
+DEFAULT_RATES = {
+    'distance_matrix': 1000,
+    'directions': 50,
+    'geocoding': 50,
+    'places': 100
+}
+
+
+class RateLimiter:
+    """
+    Token bucket allowing rate acquisitions per second on average, with
+    bursts of up to burst (default: one second's worth).
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedClient:
+    """
+    Proxy for a googlemaps.Client whose method calls each take a token from
+    the limiter first. Attributes that aren't methods pass straight through.
+    """
+
+    def __init__(self, client, limiter):
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._limiter.acquire()
+            return attr(*args, **kwargs)
+        return call
+
+
+class Throttled(Exception):
+    """
+    A call was refused for lack of quota: no token within the wait allowed,
+    or Google answered OVER_QUERY_LIMIT.
+    """
+
+    def __init__(self, api, message):
+        super().__init__(message)
+        self.api = api
+
+
+def parse_rates(value, defaults=DEFAULT_RATES):
+    """
+    Per-API rates from an 'api=rate,api=rate' string, filling in the
+    defaults for APIs it doesn't mention.
+    """
+    rates = dict(defaults)
+    for item in (value or '').split(','):
+        if '=' in item:
+            api, rate = item.split('=', 1)
+            rates[api.strip()] = float(rate)
+    return rates
+
+
+class SharedRateLimiter:
+    """
+    Token buckets per API, shared by every process using the same file.
+
+    - path: SQLite file holding the buckets.
+    - rates: API -> tokens per second.
+    - burst_seconds: bucket capacity, in seconds' worth of tokens.
+    """
+
+    def __init__(self, path, rates, burst_seconds=1.0):
+        self.path = path
+        self.rates = dict(rates)
+        self.burst_seconds = burst_seconds
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self._connect()
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            ' api TEXT PRIMARY KEY,'
+            ' tokens REAL NOT NULL,'
+            ' updated REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        """One connection per thread; SQLite connections can't be shared."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit mode, so each bucket update is one explicit
+            # BEGIN IMMEDIATE transaction that locks out the other workers
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def capacity(self, api):
+        """Most tokens an API's bucket holds."""
+        return max(1.0, self.rates[api] * self.burst_seconds)
+
+    def try_acquire(self, api, cost=1):
+        """
+        Take cost tokens from an API's bucket if it has them. Returns 0 on
+        success, else the seconds until it will have them. APIs without a
+        rate aren't limited.
+        """
+        if api not in self.rates:
+            return 0
+        rate = self.rates[api]
+        capacity = self.capacity(api)
+        cost = min(cost, capacity)
+
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = db.execute('SELECT tokens, updated FROM buckets WHERE api = ?', (api,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0 if tokens >= cost else (cost - tokens) / rate
+            if wait == 0:
+                tokens -= cost
+            db.execute('INSERT OR REPLACE INTO buckets (api, tokens, updated) VALUES (?, ?, ?)',
+                       (api, tokens, now))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return wait
+
+    def acquire(self, api, cost=1, max_wait=None):
+        """
+        Block until cost tokens are taken from an API's bucket. Raises
+        Throttled if that would take longer than max_wait seconds. If the
+        shared file can't be used, the call isn't limited.
+        """
+        deadline = time.monotonic() + max_wait if max_wait is not None else None
+        while True:
+            try:
+                wait = self.try_acquire(api, cost)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared rate limiter unavailable: {e}")
+                return
+            if wait == 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise Throttled(api, f"No {api} quota within {max_wait:.1f}s")
+            time.sleep(wait)
+
+
+def call_cost(api, args, kwargs):
+    """Tokens a call takes: elements for the Distance Matrix, else 1."""
+    if api != 'distance_matrix':
+        return 1
+    origins = kwargs.get('origins', args[0] if args else None)
+    destinations = kwargs.get('destinations', args[1] if len(args) > 1 else None)
+
+    def count(points):
+        return len(points) if isinstance(points, (list, tuple)) else 1
+    return count(origins) * count(destinations)
+
+
+class QuotaLimitedClient:
+    """
+    Proxy for a googlemaps.Client whose method calls each take their cost
+    from the API's shared bucket first, waiting at most max_wait() seconds.
+    Calls that can't get quota, or that Google rejects with
+    OVER_QUERY_LIMIT, raise Throttled after on_throttle(api) is called.
+    Build the googlemaps.Client with retry_over_query_limit=False, or it
+    retries those itself for up to a minute.
+    """
+
+    def __init__(self, client, limiter, max_wait, on_throttle=None):
+        self._client = client
+        self._limiter = limiter
+        self._max_wait = max_wait
+        self._on_throttle = on_throttle
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        api = API_TYPES.get(name)
+
+        def call(*args, **kwargs):
+            try:
+                if api is not None:
+                    self._limiter.acquire(api, call_cost(api, args, kwargs), self._max_wait())
+                try:
+                    return attr(*args, **kwargs)
+                except ApiError as e:
+                    if e.status == 'OVER_QUERY_LIMIT':
+                        raise Throttled(api or name, f"Google {name} OVER_QUERY_LIMIT") from e
+                    raise
+            except Throttled as e:
+                if self._on_throttle is not None:
+                    self._on_throttle(e.api)
+                raise
+        return call
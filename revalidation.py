@@ -0,0 +1,226 @@
+"""
+Revalidation of stored games.
+
+A pooled or exported game's ETAs go stale as transit schedules and traffic
+change. The Revalidator re-queries the oldest games first (by their
+'validated_at' time), grouping games that share a destination into one
+matrix request per mode, and stops once the day's API budget is spent.
+Games whose route for a required mode no longer exists are evicted, as are
+games whose ETAs drifted too far to still be the same puzzle; the rest get
+the fresh ETAs. A game whose fetch failed (an error, a throttled request)
+is left as it was, so it is still the oldest and is retried on the next run.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Error of an ETA whose route doesn't exist; any other error is a failed request
+ROUTE_NOT_AVAILABLE = 'Route not available'
+
+
+class DailyBudget:
+    """
+    Number of API elements that can be spent per UTC calendar day.
+
+    - limit: elements per day.
+    - path: SQLite file the day's spend is kept in, so every process using
+      the same file shares one budget (None: this process only).
+    """
+
+    def __init__(self, limit, path=None):
+        self.limit = limit
+        self.path = path
+        self.day = None
+        self.used = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connect().execute(
+                'CREATE TABLE IF NOT EXISTS daily_budget ('
+                ' day TEXT PRIMARY KEY,'
+                ' used INTEGER NOT NULL)'
+            )
+
+    def _connect(self):
+        """One connection per thread; SQLite connections can't be shared."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit mode, so each take is one explicit BEGIN IMMEDIATE
+            # transaction that locks out the other workers
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def today():
+        """The current UTC date, as YYYY-MM-DD."""
+        return datetime.now(timezone.utc).date().isoformat()
+
+    def take(self, amount):
+        """Spend amount if today's budget allows it. Returns True if it did."""
+        today = self.today()
+        if self.path is None:
+            with self._lock:
+                if today != self.day:
+                    self.day = today
+                    self.used = 0
+                if self.used + amount > self.limit:
+                    return False
+                self.used += amount
+                return True
+
+        # Nothing is spent if the shared file can't be used
+        try:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                row = db.execute('SELECT used FROM daily_budget WHERE day = ?', (today,)).fetchone()
+                used = row[0] if row is not None else 0
+                taken = used + amount <= self.limit
+                if taken:
+                    db.execute('INSERT OR REPLACE INTO daily_budget (day, used) VALUES (?, ?)',
+                               (today, used + amount))
+                    # Earlier days are never read again
+                    db.execute('DELETE FROM daily_budget WHERE day < ?', (today,))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Daily budget unavailable: {e}", extra={'stage': 'revalidate'})
+            return False
+        return taken
+
+    def remaining(self):
+        """Elements left in today's budget."""
+        today = self.today()
+        if self.path is None:
+            with self._lock:
+                return self.limit - (self.used if today == self.day else 0)
+
+        try:
+            row = self._connect().execute('SELECT used FROM daily_budget WHERE day = ?', (today,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Daily budget unavailable: {e}", extra={'stage': 'revalidate'})
+            return 0
+        return self.limit - (row[0] if row is not None else 0)
+
+
+def failed_modes(etas):
+    """Modes whose fresh ETA is the error of a failed request rather than a missing route."""
+    return [mode for mode, eta in etas.items() if eta.get('error', ROUTE_NOT_AVAILABLE) != ROUTE_NOT_AVAILABLE]
+
+
+def eta_drift(old_etas, new_etas, modes):
+    """
+    Largest relative change in duration across modes, ignoring modes that
+    lack a duration on either side.
+    """
+    drift = 0.0
+    for mode in modes:
+        old = old_etas.get(mode, {}).get('duration_seconds')
+        new = new_etas.get(mode, {}).get('duration_seconds')
+        if old and new is not None:
+            drift = max(drift, abs(new - old) / old)
+    return drift
+
+
+class Revalidator:
+    """
+    Refreshes the ETAs of stored games within a daily budget.
+
+    - fetch: callable (origins, destination) -> {mode: [eta per origin]} in
+      the get_etas() format.
+    - cost: callable (origins, destination) -> API elements fetch will use.
+    - budget: DailyBudget shared by every revalidation run (and, with a
+      path, by every process).
+    - required_modes: modes both origins must still have.
+    - max_drift: relative change in a required mode's duration past which
+      a game is evicted rather than updated.
+    """
+
+    def __init__(self, fetch, cost, budget, required_modes, max_drift=0.5):
+        self.fetch = fetch
+        self.cost = cost
+        self.budget = budget
+        self.required_modes = list(required_modes)
+        self.max_drift = max_drift
+
+    def check(self, game, etas1, etas2):
+        """Reason to evict a game given fresh ETAs, or None to keep it."""
+        for name, etas in (('origin1', etas1), ('origin2', etas2)):
+            missing = [mode for mode in self.required_modes if 'error' in etas.get(mode, {'error': ''})]
+            if missing:
+                return f"{name} missing modes: {missing}"
+
+        drift = max(
+            eta_drift(game['etas1'], etas1, self.required_modes),
+            eta_drift(game['etas2'], etas2, self.required_modes)
+        )
+        if drift > self.max_drift:
+            return f"ETAs drifted by {drift:.0%}"
+        return None
+
+    def revalidate(self, games, max_games=None):
+        """
+        Revalidate games oldest first until the budget (or max_games) runs
+        out. Games sharing a destination are fetched together.
+
+        Returns {id(game): updated game dict, or None if it should be
+        evicted} for every game checked; the input dicts aren't modified.
+        Games whose fetch failed are left out, to be retried next time.
+        """
+        by_age = sorted(games, key=lambda game: game.get('validated_at', 0))
+        if max_games is not None:
+            by_age = by_age[:max_games]
+
+        # Group by destination, keeping the oldest-first order of groups
+        groups = {}
+        for game in by_age:
+            destination = game['destination']
+            groups.setdefault((destination['lat'], destination['lng']), []).append(game)
+
+        changes = {}
+        for group in groups.values():
+            destination = group[0]['destination']
+            origins = []
+            for game in group:
+                for name in ('origin1', 'origin2'):
+                    if game[name] not in origins:
+                        origins.append(game[name])
+
+            if not self.budget.take(self.cost(origins, destination)):
+                break
+
+            etas = self.fetch(origins, destination)
+            now = time.time()
+            for game in group:
+                index1, index2 = origins.index(game['origin1']), origins.index(game['origin2'])
+                etas1 = {mode: mode_etas[index1] for mode, mode_etas in etas.items()}
+                etas2 = {mode: mode_etas[index2] for mode, mode_etas in etas.items()}
+
+                failed = failed_modes(etas1) + failed_modes(etas2)
+                if failed:
+                    logger.debug(f"Could not revalidate game, keeping it: {sorted(set(failed))} failed",
+                                 extra={'stage': 'revalidate'})
+                    continue
+
+                reason = self.check(game, etas1, etas2)
+                if reason:
+                    logger.debug(f"✗ Evicting stale game: {reason}", extra={'stage': 'revalidate'})
+                    changes[id(game)] = None
+                else:
+                    changes[id(game)] = dict(game, etas1=etas1, etas2=etas2, validated_at=now)
+
+        return changes
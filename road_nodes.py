@@ -0,0 +1,116 @@
+"""
+Road-node index for snapping candidate points onto routable streets.
+
+Random points often land in backyards, ravines or rail corridors where
+routing fails or returns odd ETAs. Snapping each candidate to the nearest
+point on a routable road (within a tolerance) before validation raises the
+acceptance rate. The nodes are extracted offline from an OSM extract with:
+
+    python -m etaguessr build-road-nodes --city toronto --osm toronto.osm
+
+and stored as an (N, 2) float32 array of (lat, lng) in
+data/<city_id>/road_nodes.npy, loaded into a KD-tree at startup.
+"""
+import os
+
+import numpy as np
+
+from geo import LocalProjection
+from kdtree import KDTree
+from osm import ROUTABLE_HIGHWAYS, read_osm_ways
+
+# Spacing of the points interpolated along each road, in meters
+DEFAULT_SPACING_METERS = 25
+
+
+def extract_road_nodes(osm_path, city_config, spacing_meters=DEFAULT_SPACING_METERS,
+                       margin_meters=500, highway_types=ROUTABLE_HIGHWAYS):
+    """
+    Points along every routable road of an OSM extract within a city's
+    radius (plus a margin), interpolated so consecutive points on a road are
+    at most spacing_meters apart. Returns an (N, 2) float32 array of (lat, lng).
+    """
+    nodes, ways = read_osm_ways(osm_path, highway_types)
+    center = city_config['center']
+    projection = LocalProjection(center['lat'], center['lng'])
+    max_distance = city_config['radius_meters'] + margin_meters
+
+    xs_parts, ys_parts = [], []
+    for _, node_ids in ways:
+        lats, lngs = zip(*(nodes[node_id] for node_id in node_ids))
+        xs, ys = projection.to_xy(np.array(lats), np.array(lngs))
+
+        # Interpolate along each segment of the way
+        lengths = np.hypot(np.diff(xs), np.diff(ys))
+        steps = np.maximum(np.ceil(lengths / spacing_meters).astype(np.int64), 1)
+        segment = np.repeat(np.arange(len(lengths)), steps)
+        t = np.concatenate([np.arange(count) / count for count in steps])
+        xs_parts.append(np.append(xs[segment] + t * np.diff(xs)[segment], xs[-1]))
+        ys_parts.append(np.append(ys[segment] + t * np.diff(ys)[segment], ys[-1]))
+
+    if not xs_parts:
+        return np.empty((0, 2), dtype=np.float32)
+
+    xs, ys = np.concatenate(xs_parts), np.concatenate(ys_parts)
+    keep = np.hypot(xs, ys) <= max_distance
+    lats, lngs = projection.to_latlng(xs[keep], ys[keep])
+    return np.column_stack([lats, lngs]).astype(np.float32)
+
+
+def save_road_nodes(path, points):
+    """Write road nodes as a .npy array."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.save(path, points)
+
+
+class RoadNodes:
+    """
+    KD-tree of a city's road nodes for snapping points onto routable roads.
+    """
+
+    def __init__(self, points, city_config):
+        center = city_config['center']
+        self.points = np.asarray(points, dtype=float)
+        self.projection = LocalProjection(center['lat'], center['lng'])
+        xs, ys = self.projection.to_xy(self.points[:, 0], self.points[:, 1])
+        self.tree = KDTree(xs, ys)
+
+    @classmethod
+    def load(cls, path, city_config):
+        """Load road nodes written by save_road_nodes()."""
+        return cls(np.load(path), city_config)
+
+    def __len__(self):
+        return len(self.points)
+
+    def snap(self, lat, lng, tolerance_meters):
+        """
+        Nearest road node to a point as (lat, lng), or None if there is no
+        node within tolerance_meters.
+        """
+        x, y = self.projection.to_xy(lat, lng)
+        index, distance = self.tree.nearest(float(x), float(y))
+        if index is None or distance > tolerance_meters:
+            return None
+        return float(self.points[index, 0]), float(self.points[index, 1])
+
+    def snap_many(self, lats, lngs, tolerance_meters):
+        """
+        Snap arrays of points. Returns (lats, lngs, snapped) where points
+        with no node within tolerance_meters keep their coordinates and are
+        False in snapped.
+        """
+        lats = np.array(lats, dtype=float)
+        lngs = np.array(lngs, dtype=float)
+        snapped = np.zeros(lats.shape, dtype=bool)
+
+        xs, ys = self.projection.to_xy(lats, lngs)
+        for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+            index, distance = self.tree.nearest(x, y)
+            if index is not None and distance <= tolerance_meters:
+                lats[i], lngs[i] = self.points[index]
+                snapped[i] = True
+
+        return lats, lngs, snapped
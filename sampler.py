@@ -0,0 +1,113 @@
+"""
+Adaptive importance sampler for candidate points.
+
+Uniform sampling over a city's disk keeps landing in places that always
+fail the checks (lake, harbour, rail yards). This sampler splits the disk
+into grid cells, keeps acceptance counts per cell from every attempt's
+outcome, and draws points in proportion to each cell's estimated acceptance
+probability. A floor keeps every cell in play, so coverage stays spread out
+and cells can recover from a bad run.
+"""
+import math
+import threading
+
+import numpy as np
+
+from geo import LocalProjection
+
+
+class AdaptiveSampler:
+    """
+    Per-city grid of acceptance counts used to bias point sampling.
+
+    - cell_meters: side of a grid cell.
+    - floor: minimum sampling weight of a cell relative to a cell that
+      always accepts, so no part of the city is ever starved.
+    """
+
+    def __init__(self, city_config, cell_meters=500, floor=0.05):
+        center = city_config['center']
+        self.radius_meters = city_config['radius_meters']
+        self.cell_meters = cell_meters
+        self.floor = floor
+        self.projection = LocalProjection(center['lat'], center['lng'])
+
+        # Cells whose square touches the disk, by their lower-left corner
+        cells_per_side = int(math.ceil(self.radius_meters / cell_meters))
+        offsets = np.arange(-cells_per_side, cells_per_side) * cell_meters
+        xs, ys = np.meshgrid(offsets, offsets)
+        xs, ys = xs.ravel(), ys.ravel()
+        # Point of each cell closest to the centre
+        nearest_x = np.clip(0, xs, xs + cell_meters)
+        nearest_y = np.clip(0, ys, ys + cell_meters)
+        touches = np.hypot(nearest_x, nearest_y) <= self.radius_meters
+
+        self.cell_x = xs[touches].astype(float)
+        self.cell_y = ys[touches].astype(float)
+        self.cell_index = {
+            (int(x // cell_meters), int(y // cell_meters)): i
+            for i, (x, y) in enumerate(zip(self.cell_x, self.cell_y))
+        }
+        # Distance from the centre to the middle of each cell
+        self.cell_distance = np.hypot(self.cell_x + cell_meters / 2, self.cell_y + cell_meters / 2)
+
+        self.attempts = np.zeros(len(self.cell_x))
+        self.accepted = np.zeros(len(self.cell_x))
+        self._lock = threading.Lock()
+
+    def weights(self, max_distance=None):
+        """
+        Sampling weight per cell: the smoothed acceptance rate, never below
+        the floor. Cells further than max_distance from the centre get 0.
+        """
+        with self._lock:
+            rate = (self.accepted + 1) / (self.attempts + 2)
+        weights = np.maximum(rate, self.floor)
+        if max_distance is not None:
+            weights = np.where(self.cell_distance <= max_distance + self.cell_meters, weights, 0.0)
+        return weights
+
+    def sample_many(self, n, max_distance=None):
+        """
+        Draw n points within max_distance of the centre (default: the city
+        radius) as (lats, lngs) arrays, favouring cells that have accepted
+        more often.
+        """
+        max_distance = min(max_distance or self.radius_meters, self.radius_meters)
+        cumulative = np.cumsum(self.weights(max_distance))
+
+        xs_parts, ys_parts = [], []
+        found = 0
+        while found < n:
+            # Pick cells by weight, then a uniform point within each; points
+            # outside the disk are redrawn from scratch so edge cells are
+            # weighted by the share of their area inside it
+            batch = n - found + 8
+            cells = np.searchsorted(cumulative, np.random.uniform(0, cumulative[-1], batch), side='right')
+            cells = np.minimum(cells, len(cumulative) - 1)
+            xs = self.cell_x[cells] + np.random.uniform(0, self.cell_meters, batch)
+            ys = self.cell_y[cells] + np.random.uniform(0, self.cell_meters, batch)
+            inside = np.hypot(xs, ys) <= max_distance
+            xs_parts.append(xs[inside])
+            ys_parts.append(ys[inside])
+            found += int(inside.sum())
+
+        xs = np.concatenate(xs_parts)[:n]
+        ys = np.concatenate(ys_parts)[:n]
+        return self.projection.to_latlng(xs, ys)
+
+    def sample(self, max_distance=None):
+        """Draw a single (lat, lng) point, see sample_many()."""
+        lats, lngs = self.sample_many(1, max_distance)
+        return float(lats[0]), float(lngs[0])
+
+    def record(self, lat, lng, accepted):
+        """Record whether a candidate using this point was accepted."""
+        x, y = self.projection.to_xy(lat, lng)
+        cell = self.cell_index.get((int(x // self.cell_meters), int(y // self.cell_meters)))
+        if cell is None:
+            return
+        with self._lock:
+            self.attempts[cell] += 1
+            if accepted:
+                self.accepted[cell] += 1
@@ -0,0 +1,304 @@
+"""
+Local walking and cycling router over a city's street graph.
+
+Walking and cycling ETAs depend almost entirely on the street network, so
+they can be computed locally instead of with a Distance Matrix request.
+The graph is extracted offline from an OSM extract with:
+
+    python -m etaguessr build-street-graph --city toronto --osm toronto.osm
+
+and stored in data/<city_id>/street_graph.npz in CSR form: the edges
+leaving node i are indices[indptr[i]:indptr[i + 1]], with their lengths and
+a bitmask of the modes allowed along them. Chains of nodes between
+intersections are collapsed into single edges. Queries run bidirectional
+A* with straight-line potentials.
+"""
+import heapq
+import math
+import os
+
+import numpy as np
+
+from geo import LocalProjection
+from kdtree import KDTree
+from osm import CYCLABLE_HIGHWAYS, WALKABLE_HIGHWAYS, read_osm_ways
+
+WALK = 1
+BIKE = 2
+
+MODE_FLAGS = {'walking': WALK, 'bicycling': BIKE}
+
+# Average travel speeds in m/s
+MODE_SPEEDS = {'walking': 1.35, 'bicycling': 4.4}
+
+# Farthest a point can be from the graph to route from or to it
+SNAP_RADIUS_METERS = 500
+
+INF = float('inf')
+
+
+def way_modes(tags):
+    """
+    Modes allowed along an OSM way as (forward, backward) bitmasks.
+    Walking ignores one-way restrictions; cycling honours them unless
+    oneway:bicycle=no.
+    """
+    highway = tags.get('highway')
+
+    def allowed(mode_tag, highways):
+        value = tags.get(mode_tag) or tags.get('access')
+        if value in ('no', 'private'):
+            return False
+        return highway in highways or value in ('yes', 'designated', 'permissive')
+
+    walk = WALK if allowed('foot', WALKABLE_HIGHWAYS) else 0
+    bike = BIKE if allowed('bicycle', CYCLABLE_HIGHWAYS) else 0
+
+    oneway = tags.get('oneway:bicycle') or tags.get('oneway')
+    if oneway is None and tags.get('junction') == 'roundabout':
+        oneway = 'yes'
+
+    if oneway in ('yes', 'true', '1'):
+        return walk | bike, walk
+    if oneway == '-1':
+        return walk, walk | bike
+    return walk | bike, walk | bike
+
+
+def build_street_graph(osm_path, city_config, margin_meters=2000):
+    """
+    Street graph of an OSM extract within a city's radius (plus a margin).
+    Returns a dict of arrays: lats, lngs (per node), indptr, indices,
+    lengths (meters) and modes (bitmask) in CSR order.
+    """
+    nodes, ways = read_osm_ways(osm_path, WALKABLE_HIGHWAYS | CYCLABLE_HIGHWAYS | {'footway'})
+    center = city_config['center']
+    projection = LocalProjection(center['lat'], center['lng'])
+    max_distance = city_config['radius_meters'] + margin_meters
+
+    osm_ids = list(nodes)
+    lats = np.array([nodes[node_id][0] for node_id in osm_ids])
+    lngs = np.array([nodes[node_id][1] for node_id in osm_ids])
+    xs, ys = projection.to_xy(lats, lngs)
+    position = {node_id: i for i, node_id in enumerate(osm_ids)}
+    xs, ys = xs.tolist(), ys.tolist()
+
+    # Intersections and way ends become graph nodes; the points between
+    # them only contribute to edge lengths
+    uses = {}
+    for _, node_ids in ways:
+        for node_id in node_ids:
+            uses[node_id] = uses.get(node_id, 0) + 1
+        uses[node_ids[0]] = uses[node_ids[-1]] = 2
+
+    sources, targets, lengths, modes = [], [], [], []
+    for tags, node_ids in ways:
+        forward, backward = way_modes(tags)
+        if not forward and not backward:
+            continue
+
+        start = position[node_ids[0]]
+        length = 0.0
+        for a, b in zip(node_ids, node_ids[1:]):
+            i, j = position[a], position[b]
+            length += math.hypot(xs[j] - xs[i], ys[j] - ys[i])
+            if uses[b] < 2:
+                continue
+            if forward:
+                sources.append(start)
+                targets.append(j)
+                lengths.append(length)
+                modes.append(forward)
+            if backward:
+                sources.append(j)
+                targets.append(start)
+                lengths.append(length)
+                modes.append(backward)
+            start, length = j, 0.0
+
+    sources = np.array(sources, dtype=np.int64)
+    targets = np.array(targets, dtype=np.int64)
+    lengths = np.array(lengths, dtype=np.float32)
+    modes = np.array(modes, dtype=np.uint8)
+
+    # Keep edges inside the area, renumbering the nodes they use
+    inside = np.hypot(np.array(xs), np.array(ys)) <= max_distance
+    keep = inside[sources] & inside[targets] & (sources != targets)
+    sources, targets, lengths, modes = sources[keep], targets[keep], lengths[keep], modes[keep]
+
+    used = np.unique(np.concatenate([sources, targets]))
+    renumber = np.full(len(osm_ids), -1, dtype=np.int64)
+    renumber[used] = np.arange(len(used))
+    sources, targets = renumber[sources], renumber[targets]
+
+    order = np.argsort(sources, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(used)))])
+    return {
+        'lats': lats[used],
+        'lngs': lngs[used],
+        'indptr': indptr.astype(np.int64),
+        'indices': targets[order].astype(np.int32),
+        'lengths': lengths[order],
+        'modes': modes[order]
+    }
+
+
+def save_street_graph(path, graph):
+    """Write a street graph as a .npz archive."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez(path, **graph)
+
+
+def load_street_graph(path):
+    """Load a street graph written by save_street_graph()."""
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def csr(node_count, sources, targets, lengths):
+    """(indptr, indices, lengths) of the edges sources -> targets, grouped by source."""
+    order = np.argsort(sources, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=node_count))])
+    return indptr.tolist(), targets[order], lengths[order].astype(float)
+
+
+def largest_component(node_count, sources, targets):
+    """Sorted node ids of the largest connected component, ignoring edge direction."""
+    neighbours = csr(node_count, np.concatenate([sources, targets]), np.concatenate([targets, sources]),
+                     np.zeros(2 * len(sources)))
+    indptr, indices, _ = neighbours
+    component = np.full(node_count, -1, dtype=np.int64)
+    best, best_size = -1, 0
+
+    for root in np.unique(sources).tolist():
+        if component[root] >= 0:
+            continue
+        component[root] = root
+        stack, size = [root], 0
+        while stack:
+            u = stack.pop()
+            size += 1
+            for v in indices[indptr[u]:indptr[u + 1]].tolist():
+                if component[v] < 0:
+                    component[v] = root
+                    stack.append(v)
+        if size > best_size:
+            best, best_size = root, size
+
+    return np.flatnonzero(component == best)
+
+
+class StreetRouter:
+    """
+    Shortest paths for one travel mode over a city's street graph.
+    """
+
+    def __init__(self, graph, mode, city_config, margin_meters=2000):
+        center = city_config['center']
+        self.projection = LocalProjection(center['lat'], center['lng'])
+        self.max_distance = city_config['radius_meters'] + margin_meters
+        self.speed = MODE_SPEEDS[mode]
+
+        node_count = len(graph['lats'])
+        xs, ys = self.projection.to_xy(graph['lats'], graph['lngs'])
+        self.xs, self.ys = xs.tolist(), ys.tolist()
+
+        keep = (graph['modes'] & MODE_FLAGS[mode]) != 0
+        sources = np.repeat(np.arange(node_count), np.diff(graph['indptr']))[keep]
+        targets = graph['indices'][keep].astype(np.int64)
+        lengths = graph['lengths'][keep]
+        self.forward = csr(node_count, sources, targets, lengths)
+        self.backward = csr(node_count, targets, sources, lengths)
+
+        # Points are snapped onto the largest connected part of the network,
+        # so a stray footway or private road can't strand them
+        self.nodes = largest_component(node_count, sources, targets)
+        self.tree = KDTree(xs[self.nodes], ys[self.nodes])
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def contains(self, lat, lng):
+        """True if a point is within the area the router covers."""
+        x, y = self.projection.to_xy(lat, lng)
+        return math.hypot(float(x), float(y)) <= self.max_distance
+
+    def snap(self, lat, lng):
+        """Nearest usable node to a point and its distance, or (None, None)."""
+        x, y = self.projection.to_xy(lat, lng)
+        index, distance = self.tree.nearest(float(x), float(y))
+        if index is None or distance > SNAP_RADIUS_METERS:
+            return None, None
+        return int(self.nodes[index]), distance
+
+    def shortest_path(self, source, target):
+        """
+        Length in meters of the shortest path between two nodes, or None if
+        target can't be reached. Bidirectional A* with the average of the
+        forward and backward straight-line potentials, which keeps both
+        searches consistent so they can stop as soon as their frontiers'
+        keys add up to the best path found.
+        """
+        if source == target:
+            return 0.0
+
+        xs, ys = self.xs, self.ys
+        sx, sy, tx, ty = xs[source], ys[source], xs[target], ys[target]
+
+        def potential(v):
+            return (math.hypot(xs[v] - tx, ys[v] - ty) - math.hypot(xs[v] - sx, ys[v] - sy)) / 2
+
+        graphs = (self.forward, self.backward)
+        signs = (1, -1)
+        distances = ({source: 0.0}, {target: 0.0})
+        heaps = ([(potential(source), source)], [(-potential(target), target)])
+        settled = (set(), set())
+        best = INF
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+
+            indptr, indices, lengths = graphs[side]
+            start, end = indptr[u], indptr[u + 1]
+            distance = distances[side][u]
+            other = distances[1 - side]
+            for v, length in zip(indices[start:end].tolist(), lengths[start:end].tolist()):
+                candidate = distance + length
+                if candidate < distances[side].get(v, INF):
+                    distances[side][v] = candidate
+                    heapq.heappush(heaps[side], (candidate + signs[side] * potential(v), v))
+                    if v in other and candidate + other[v] < best:
+                        best = candidate + other[v]
+
+        return best if best < INF else None
+
+    def etas(self, origins, destination, departure=None):
+        """
+        (duration_seconds, distance_meters) or None from each (lat, lng)
+        origin to one (lat, lng) destination. The straight-line gaps between
+        the points and the graph are added to the distance. departure is
+        accepted like TransitRouter.etas() takes it, but street times don't
+        depend on the clock.
+        """
+        target, target_gap = self.snap(*destination)
+        results = []
+        for lat, lng in origins:
+            source, source_gap = self.snap(lat, lng)
+            if source is None or target is None:
+                results.append(None)
+                continue
+            meters = self.shortest_path(source, target)
+            if meters is None:
+                results.append(None)
+                continue
+            meters += source_gap + target_gap
+            results.append((round(meters / self.speed), round(meters)))
+        return results
@@ -0,0 +1,88 @@
+"""
+Tests for the backend's glue in app.py, run against a temporary data
+directory and a dummy API key so nothing touches the real caches or pool.
+
+Run with pytest, or directly: python test_app.py
+"""
+import os
+import random
+import tempfile
+
+os.environ['ETAGUESSR_DATA_DIR'] = tempfile.mkdtemp(prefix='etaguessr-test-')
+os.environ.setdefault('GOOGLE_MAPS_API_KEY', 'AIza-test-key')
+os.environ['GAME_POOL_SIZE'] = '0'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import app  # noqa: E402
+from street_router import StreetRouter  # noqa: E402
+from test_street_router import random_graph  # noqa: E402
+from test_transit_router import STOPS, build_router  # noqa: E402
+
+TORONTO = app.CITIES['toronto']
+
+
+def with_local_routers(routers, test):
+    """Run test() with app.local_routers replaced by routers."""
+    saved = dict(app.local_routers)
+    app.local_routers.clear()
+    app.local_routers.update(routers)
+    try:
+        test()
+    finally:
+        app.local_routers.clear()
+        app.local_routers.update(saved)
+
+
+def point(lat, lng):
+    return {'lat': lat, 'lng': lng}
+
+
+def assert_etas(etas, count):
+    """count ETAs in get_mode_etas()'s format, none of them errors."""
+    assert len(etas) == count
+    for eta in etas:
+        assert 'error' not in eta, eta
+        assert eta['duration_seconds'] > 0 and eta['duration']
+
+
+def test_local_transit_etas():
+    """With TRANSIT_PROVIDER=gtfs, transit ETAs come from the RAPTOR router."""
+    def test():
+        etas = app.get_local_etas('transit', [point(*STOPS['A']), point(*STOPS['B'])], point(*STOPS['C']))
+        assert_etas(etas, 2)
+
+    with_local_routers({'transit': {'toronto': build_router()}}, test)
+
+
+def test_local_street_etas():
+    """With STREET_PROVIDER=osm, walking and bicycling ETAs come from the street router."""
+    graph = random_graph(random.Random(0))
+    routers = {mode: {'toronto': StreetRouter(graph, mode, TORONTO)} for mode in app.STREET_MODES}
+
+    def test():
+        router = routers['walking']['toronto']
+        nodes = [int(node) for node in router.nodes[:3]]
+        origins = [point(graph['lats'][node], graph['lngs'][node]) for node in nodes[1:]]
+        destination = point(graph['lats'][nodes[0]], graph['lngs'][nodes[0]])
+        assert_etas(app.get_local_etas('walking', origins, destination), 2)
+        bicycling = app.get_local_etas('bicycling', origins, destination)
+        assert len(bicycling) == 2
+        assert all('error' not in eta or eta['error'] == 'Route not available' for eta in bicycling)
+
+    with_local_routers(routers, test)
+
+
+def test_no_local_router():
+    """Modes without a local router covering the destination go to Google."""
+    def test():
+        assert app.get_local_etas('walking', [TORONTO['center']], TORONTO['center']) is None
+        assert app.get_local_etas('driving', [TORONTO['center']], TORONTO['center']) is None
+
+    with_local_routers({}, test)
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
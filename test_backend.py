@@ -3,7 +3,6 @@
 Test script to validate the ETA Guesser backend functionality.
 """
 import requests
-import json
 import math
 
 BACKEND_URL = "http://localhost:5001"
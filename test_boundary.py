@@ -0,0 +1,120 @@
+"""
+Tests for the city boundary's grid classification (boundary.py):
+contains_many() must agree with the exact geo.points_in_polygons() test on
+random points, points on grid-cell edges and corners, and points off the
+grid.
+
+Run with pytest, or directly: python test_boundary.py
+"""
+import math
+import random
+
+import numpy as np
+
+from boundary import BOUNDARY, INSIDE, OUTSIDE, CityBoundary
+from geo import METERS_PER_DEGREE, city_grid, points_in_polygons
+
+CITY = {'center': {'lat': 43.65, 'lng': -79.38}, 'radius_meters': 10000}
+
+
+def ring(center_lat, center_lng, radii_meters, rng):
+    """A closed (lng, lat) ring around a centre with a jagged radius per vertex."""
+    count = len(radii_meters)
+    points = []
+    for i, radius in enumerate(radii_meters):
+        angle = 2 * math.pi * (i + rng.uniform(-0.3, 0.3)) / count
+        lat = center_lat + radius * math.sin(angle) / METERS_PER_DEGREE
+        lng = center_lng + radius * math.cos(angle) / (METERS_PER_DEGREE * math.cos(math.radians(center_lat)))
+        points.append((lng, lat))
+    points.append(points[0])
+    return np.array(points)
+
+
+def city_polygons(rng):
+    """
+    A jagged city outline with a hole in it, plus a separate island, in
+    load_geojson_polygons()' format.
+    """
+    center = CITY['center']
+    outline = ring(center['lat'], center['lng'], [rng.uniform(4000, 9000) for _ in range(60)], rng)
+    hole = ring(center['lat'] + 0.005, center['lng'], [rng.uniform(800, 1500) for _ in range(12)], rng)
+    island = ring(center['lat'] - 0.08, center['lng'] + 0.05, [rng.uniform(300, 900) for _ in range(9)], rng)
+    return [[outline, hole], [island]]
+
+
+def check(boundary, lats, lngs):
+    """contains_many() and the exact test agree on every point."""
+    lats, lngs = np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)
+    expected = points_in_polygons(lats, lngs, boundary.polygons)
+    found = boundary.contains_many(lats, lngs)
+    mismatched = np.flatnonzero(found != expected)
+    assert not len(mismatched), [(lats[i], lngs[i], expected[i]) for i in mismatched[:5]]
+    return expected
+
+
+def test_grid_has_every_kind_of_cell():
+    """The grid is mostly decided cells, with boundary cells along the edges."""
+    boundary = CityBoundary(city_polygons(random.Random(0)), city_grid(CITY, 200))
+    for kind in (INSIDE, OUTSIDE, BOUNDARY):
+        assert (boundary.cells == kind).any()
+    assert (boundary.cells != BOUNDARY).mean() > 0.5
+
+
+def test_random_points_match_exact_test():
+    """Random points across the grid and beyond it."""
+    for seed in range(3):
+        rng = random.Random(seed)
+        boundary = CityBoundary(city_polygons(rng), city_grid(CITY, rng.choice([100, 200, 350])))
+        grid = boundary.grid
+        height, width = grid['rows'] * grid['dlat'], grid['cols'] * grid['dlng']
+        lats = [grid['south'] + rng.uniform(-0.1, 1.1) * height for _ in range(20000)]
+        lngs = [grid['west'] + rng.uniform(-0.1, 1.1) * width for _ in range(20000)]
+        inside = check(boundary, lats, lngs)
+        assert 0 < inside.sum() < len(inside)
+
+
+def test_points_on_cell_edges_match_exact_test():
+    """Points exactly on cell edges and corners, including the grid's outer edges."""
+    rng = random.Random(4)
+    boundary = CityBoundary(city_polygons(rng), city_grid(CITY, 200))
+    grid = boundary.grid
+    rows = np.arange(grid['rows'] + 1)
+    cols = np.arange(grid['cols'] + 1)
+
+    # Every corner
+    corner_lats, corner_lngs = np.meshgrid(grid['south'] + rows * grid['dlat'], grid['west'] + cols * grid['dlng'])
+    check(boundary, corner_lats.ravel(), corner_lngs.ravel())
+
+    # Random points along horizontal and vertical cell edges
+    edge_rows = rng.choices(rows.tolist(), k=20000)
+    edge_cols = rng.choices(cols.tolist(), k=20000)
+    check(boundary,
+          [grid['south'] + row * grid['dlat'] for row in edge_rows],
+          [grid['west'] + rng.uniform(0, grid['cols']) * grid['dlng'] for _ in edge_rows])
+    check(boundary,
+          [grid['south'] + rng.uniform(0, grid['rows']) * grid['dlat'] for _ in edge_cols],
+          [grid['west'] + col * grid['dlng'] for col in edge_cols])
+
+
+def test_polygon_vertices_match_exact_test():
+    """The polygons' own vertices, which sit on their edges."""
+    boundary = CityBoundary(city_polygons(random.Random(5)), city_grid(CITY, 100))
+    vertices = np.concatenate([r for rings in boundary.polygons for r in rings])
+    check(boundary, vertices[:, 1], vertices[:, 0])
+
+
+def test_contains():
+    """The one-point form agrees with contains_many()."""
+    rng = random.Random(6)
+    boundary = CityBoundary(city_polygons(rng), city_grid(CITY, 200))
+    center = CITY['center']
+    points = [(center['lat'] + rng.uniform(-0.1, 0.1), center['lng'] + rng.uniform(-0.15, 0.15)) for _ in range(200)]
+    many = boundary.contains_many([lat for lat, _ in points], [lng for _, lng in points])
+    assert [boundary.contains(lat, lng) for lat, lng in points] == many.tolist()
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
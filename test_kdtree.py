@@ -0,0 +1,70 @@
+"""
+Tests for the flat-array KD-tree (kdtree.py): nearest() and within() must
+agree with brute force over random points, duplicates and edge cases.
+
+Run with pytest, or directly: python test_kdtree.py
+"""
+import math
+import random
+
+from kdtree import KDTree
+
+
+def random_points(rng, count, spread=10000):
+    """count random (x, y) points, some of them repeated."""
+    xs = [rng.uniform(-spread, spread) for _ in range(count)]
+    ys = [rng.uniform(-spread, spread) for _ in range(count)]
+    for _ in range(count // 20):
+        i, j = rng.randrange(count), rng.randrange(count)
+        xs[i], ys[i] = xs[j], ys[j]
+    return xs, ys
+
+
+def test_nearest_matches_brute_force():
+    """nearest() finds a point at the smallest distance, and reports it."""
+    rng = random.Random(1)
+    for count in (1, 2, 7, 100, 2000):
+        xs, ys = random_points(rng, count)
+        tree = KDTree(xs, ys)
+        for _ in range(200):
+            x, y = rng.uniform(-12000, 12000), rng.uniform(-12000, 12000)
+            index, distance = tree.nearest(x, y)
+            expected = min(math.hypot(xs[i] - x, ys[i] - y) for i in range(count))
+            assert math.isclose(distance, expected, rel_tol=1e-12, abs_tol=1e-9)
+            assert math.isclose(math.hypot(xs[index] - x, ys[index] - y), expected, rel_tol=1e-12, abs_tol=1e-9)
+
+
+def test_within_matches_brute_force():
+    """within() returns exactly the points inside the radius."""
+    rng = random.Random(2)
+    for count in (1, 5, 100, 2000):
+        xs, ys = random_points(rng, count)
+        tree = KDTree(xs, ys)
+        for radius in (0, 50, 500, 5000, 50000):
+            for _ in range(50):
+                x, y = rng.uniform(-12000, 12000), rng.uniform(-12000, 12000)
+                expected = {i for i in range(count) if math.hypot(xs[i] - x, ys[i] - y) <= radius}
+                found = tree.within(x, y, radius)
+                assert len(found) == len(set(found))
+                assert set(found) == expected
+
+
+def test_within_on_a_point():
+    """A zero radius at a point finds that point and its duplicates."""
+    xs, ys = [0.0, 1.0, 1.0, 2.0], [0.0, 1.0, 1.0, 2.0]
+    assert sorted(KDTree(xs, ys).within(1.0, 1.0, 0)) == [1, 2]
+
+
+def test_empty_tree():
+    """An empty tree has no nearest point and nothing within any radius."""
+    tree = KDTree([], [])
+    assert len(tree) == 0
+    assert tree.nearest(0.0, 0.0) == (None, math.inf)
+    assert tree.within(0.0, 0.0, 1000) == []
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
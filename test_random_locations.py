@@ -8,11 +8,16 @@ import googlemaps
 import random
 import math
 import os
-from datetime import datetime
 from dotenv import load_dotenv
 import folium
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+
+from candidates import CandidateGenerator, water_filter
+from cities import DATA_DIR, city_data_path, local_now
+from eta_cache import EtaCache, distance_matrix_eta
+from water_mask import WaterMask
+
 try:
     from selenium import webdriver
     from selenium.webdriver.chrome.options import Options
@@ -32,6 +37,9 @@ if not API_KEY:
 
 gmaps = googlemaps.Client(key=API_KEY)
 
+# Shared with the app (see ETA_CACHE_PATH in app.py)
+eta_cache = EtaCache(os.getenv('ETA_CACHE_PATH', os.path.join(DATA_DIR, 'eta_cache.sqlite3')))
+
 # Toronto Union Station coordinates
 UNION_STATION = {
     'lat': 43.6452,
@@ -124,7 +132,7 @@ def has_ferry_in_route(origin, destination):
             origin_str,
             dest_str,
             mode='driving',
-            departure_time=datetime.now()
+            departure_time=local_now(destination)
         )
 
         if directions:
@@ -148,36 +156,64 @@ def check_all_modes_available(origin, destination):
     """
     Check if all four transport modes are available for the route.
     Returns True if all modes available, False otherwise.
+    Uses the app's ETA cache, so routes it has already seen are free.
     """
     modes = ['driving', 'transit', 'bicycling', 'walking']
     origin_str = f"{origin['lat']},{origin['lng']}"
     dest_str = f"{destination['lat']},{destination['lng']}"
 
     for mode in modes:
-        try:
-            result = gmaps.distance_matrix(
-                origins=origin_str,
-                destinations=dest_str,
-                mode=mode,
-                departure_time=datetime.now()
-            )
-
-            if result['rows'][0]['elements'][0]['status'] != 'OK':
+        departure = local_now(destination)
+        eta = eta_cache.get(mode, origin, destination, departure)
+        if eta is None:
+            try:
+                result = gmaps.distance_matrix(
+                    origins=origin_str,
+                    destinations=dest_str,
+                    mode=mode,
+                    departure_time=departure
+                )
+            except Exception as e:
                 return False
 
-        except Exception as e:
+            eta = distance_matrix_eta(result['rows'][0]['elements'][0])
+            eta_cache.put(mode, origin, destination, eta, departure)
+
+        if 'error' in eta:
             return False
 
     return True
 
 
-def generate_valid_locations(num_points=100):
+def build_candidate_generator():
+    """
+    Batched candidate generator over the radius, prefiltered with the local
+    water mask when one has been built for Toronto.
+    """
+    filters = []
+    mask_path = city_data_path('toronto', 'water_mask.npy')
+    if os.path.exists(mask_path):
+        filters.append(water_filter(WaterMask.load(mask_path)))
+
+    return CandidateGenerator.uniform(
+        UNION_STATION['lat'],
+        UNION_STATION['lng'],
+        MAX_RADIUS_METERS,
+        filters
+    )
+
+
+def generate_valid_locations(num_points=100, batch_size=500):
     """
     Generate valid random locations following the app's criteria.
+    Candidates are drawn batch_size at a time, already filtered against the
+    local water mask (if any), before the API checks run on each one.
     """
     valid_locations = []
     attempts = 0
     max_attempts = num_points * 50  # Allow more attempts to find valid points
+    generator = build_candidate_generator()
+    candidates = []
 
     print(f"Generating {num_points} valid random locations...")
     print(f"Criteria: Within {MAX_RADIUS_KM}km of Union Station")
@@ -188,12 +224,15 @@ def generate_valid_locations(num_points=100):
     while len(valid_locations) < num_points and attempts < max_attempts:
         attempts += 1
 
-        # Generate random point
-        dest_lat, dest_lng = generate_random_point_in_radius(
-            UNION_STATION['lat'],
-            UNION_STATION['lng'],
-            MAX_RADIUS_METERS
-        )
+        # Next prefiltered candidate point
+        if not candidates:
+            lats, lngs = generator.generate(batch_size)
+            candidates = list(zip(lats.tolist(), lngs.tolist()))
+            candidates.reverse()
+        if not candidates:
+            print("✗ Candidate generator found no points that pass the local filters")
+            break
+        dest_lat, dest_lng = candidates.pop()
 
         destination = {
             'lat': dest_lat,
@@ -0,0 +1,149 @@
+"""
+Tests for the shared per-API token buckets (rate_limit.py) against a
+temporary SQLite file: bursts, refill, sharing between limiters, and
+Throttled from both the local buckets and Google's OVER_QUERY_LIMIT.
+
+Run with pytest, or directly: python test_rate_limit.py
+"""
+import os
+import tempfile
+import time
+
+from googlemaps.exceptions import ApiError
+
+from rate_limit import QuotaLimitedClient, SharedRateLimiter, Throttled, call_cost
+
+
+def limiter(directory, rates=None, burst_seconds=1.0):
+    """A limiter over a quota file in directory."""
+    return SharedRateLimiter(os.path.join(directory, 'quota.sqlite3'), rates or {'directions': 10}, burst_seconds)
+
+
+def test_burst_then_empty():
+    """A full bucket allows one burst of capacity tokens, then asks to wait."""
+    with tempfile.TemporaryDirectory() as directory:
+        quota = limiter(directory)
+        assert quota.capacity('directions') == 10
+        for _ in range(10):
+            assert quota.try_acquire('directions') == 0
+        wait = quota.try_acquire('directions')
+        assert 0 < wait <= 0.1
+
+
+def test_refill():
+    """Tokens come back at the API's rate."""
+    with tempfile.TemporaryDirectory() as directory:
+        quota = limiter(directory)
+        assert quota.try_acquire('directions', 10) == 0
+        time.sleep(0.25)
+        assert quota.try_acquire('directions', 2) == 0
+        assert quota.try_acquire('directions', 10) > 0
+
+
+def test_shared_between_limiters():
+    """Limiters on the same file (e.g. in other workers) share the buckets."""
+    with tempfile.TemporaryDirectory() as directory:
+        first, second = limiter(directory), limiter(directory)
+        assert first.try_acquire('directions', 10) == 0
+        assert second.try_acquire('directions') > 0
+
+
+def test_cost_capped_at_capacity():
+    """A call costing more than the bucket holds still gets through once it's full."""
+    with tempfile.TemporaryDirectory() as directory:
+        quota = limiter(directory, {'distance_matrix': 5})
+        assert quota.try_acquire('distance_matrix', 25) == 0
+        assert quota.try_acquire('distance_matrix', 25) > 0
+
+
+def test_unlimited_api():
+    """APIs without a rate are never limited."""
+    with tempfile.TemporaryDirectory() as directory:
+        quota = limiter(directory)
+        for _ in range(100):
+            assert quota.try_acquire('places') == 0
+
+
+def test_acquire_waits_within_max_wait():
+    """acquire() sleeps until the tokens are there if that's soon enough."""
+    with tempfile.TemporaryDirectory() as directory:
+        quota = limiter(directory)
+        quota.acquire('directions', 10)
+        start = time.monotonic()
+        quota.acquire('directions', 1, max_wait=1.0)
+        assert 0.05 < time.monotonic() - start < 1.0
+
+
+def test_acquire_throttled_past_max_wait():
+    """acquire() raises Throttled rather than wait longer than max_wait."""
+    with tempfile.TemporaryDirectory() as directory:
+        quota = limiter(directory, {'directions': 1})
+        quota.acquire('directions')
+        start = time.monotonic()
+        try:
+            quota.acquire('directions', max_wait=0.1)
+        except Throttled as e:
+            assert e.api == 'directions'
+        else:
+            raise AssertionError('expected Throttled')
+        assert time.monotonic() - start < 0.1
+
+
+def test_call_cost():
+    """Distance Matrix calls cost one token per element, others one."""
+    assert call_cost('distance_matrix', (), {'origins': ['a', 'b'], 'destinations': ['c', 'd', 'e']}) == 6
+    assert call_cost('distance_matrix', ('a', ['c', 'd']), {}) == 2
+    assert call_cost('directions', ('a', 'b'), {}) == 1
+
+
+class FakeClient:
+    """Stands in for googlemaps.Client, answering OVER_QUERY_LIMIT on demand."""
+
+    def __init__(self):
+        self.calls = 0
+        self.over_limit = False
+
+    def directions(self, origin, destination, **kwargs):
+        self.calls += 1
+        if self.over_limit:
+            raise ApiError('OVER_QUERY_LIMIT')
+        return [{'legs': []}]
+
+
+def test_quota_limited_client():
+    """
+    Calls take tokens first; running out, or Google answering
+    OVER_QUERY_LIMIT, raises Throttled and reports the API to on_throttle.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        fake = FakeClient()
+        throttled = []
+        client = QuotaLimitedClient(fake, limiter(directory, {'directions': 1}), lambda: 0,
+                                    on_throttle=throttled.append)
+
+        assert client.directions('a', 'b') == [{'legs': []}]
+        try:
+            client.directions('a', 'b')
+        except Throttled:
+            pass
+        else:
+            raise AssertionError('expected Throttled')
+        assert fake.calls == 1
+        assert throttled == ['directions']
+
+        time.sleep(1.0)
+        fake.over_limit = True
+        try:
+            client.directions('a', 'b')
+        except Throttled as e:
+            assert isinstance(e.__cause__, ApiError)
+        else:
+            raise AssertionError('expected Throttled')
+        assert throttled == ['directions', 'directions']
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
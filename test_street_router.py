@@ -0,0 +1,118 @@
+"""
+Tests for the local street router (street_router.py): its bidirectional A*
+must find the same shortest paths as a plain Dijkstra search, on random
+graphs with one-way edges, mode restrictions and unreachable nodes.
+
+Run with pytest, or directly: python test_street_router.py
+"""
+import heapq
+import math
+import random
+
+import numpy as np
+
+from geo import LocalProjection
+from street_router import BIKE, WALK, StreetRouter
+
+CITY = {'center': {'lat': 43.65, 'lng': -79.38}, 'radius_meters': 10000}
+
+
+def random_graph(rng, node_count=300, neighbours=3):
+    """
+    A street graph in build_street_graph()'s format: nodes scattered over
+    the city, each linked to a few of its nearest nodes. Edge lengths are
+    at least the straight-line distance, as road lengths are, and some
+    edges are one-way or walking-only.
+    """
+    xs = [rng.uniform(-8000, 8000) for _ in range(node_count)]
+    ys = [rng.uniform(-8000, 8000) for _ in range(node_count)]
+
+    sources, targets, lengths, modes = [], [], [], []
+    for i in range(node_count):
+        nearest = sorted(range(node_count), key=lambda j: math.hypot(xs[j] - xs[i], ys[j] - ys[i]))
+        for j in nearest[1:neighbours + 1]:
+            length = math.hypot(xs[j] - xs[i], ys[j] - ys[i]) * rng.uniform(1.001, 1.6)
+            mode = WALK | BIKE if rng.random() < 0.8 else WALK
+            sources.append(i)
+            targets.append(j)
+            lengths.append(length)
+            modes.append(mode)
+            if rng.random() < 0.7:
+                sources.append(j)
+                targets.append(i)
+                lengths.append(length)
+                modes.append(mode)
+
+    sources = np.array(sources)
+    order = np.argsort(sources, kind='stable')
+    lats, lngs = LocalProjection(CITY['center']['lat'], CITY['center']['lng']).to_latlng(xs, ys)
+    return {
+        'lats': lats,
+        'lngs': lngs,
+        'indptr': np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=node_count))]),
+        'indices': np.array(targets, dtype=np.int32)[order],
+        'lengths': np.array(lengths)[order],
+        'modes': np.array(modes, dtype=np.uint8)[order]
+    }
+
+
+def dijkstra(router, source, target):
+    """Shortest path length over the router's forward edges, or None."""
+    indptr, indices, lengths = router.forward
+    distances = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        distance, u = heapq.heappop(heap)
+        if u == target:
+            return distance
+        if distance > distances[u]:
+            continue
+        for v, length in zip(indices[indptr[u]:indptr[u + 1]].tolist(),
+                             lengths[indptr[u]:indptr[u + 1]].tolist()):
+            if distance + length < distances.get(v, math.inf):
+                distances[v] = distance + length
+                heapq.heappush(heap, (distance + length, v))
+    return None
+
+
+def check_against_dijkstra(mode, seed, pairs=200):
+    """Compare random queries on one random graph; returns how many had no path."""
+    rng = random.Random(seed)
+    router = StreetRouter(random_graph(rng), mode, CITY)
+    node_count = len(router.forward[0]) - 1
+    unreachable = 0
+    for _ in range(pairs):
+        source, target = rng.randrange(node_count), rng.randrange(node_count)
+        expected = dijkstra(router, source, target)
+        found = router.shortest_path(source, target)
+        if expected is None:
+            unreachable += 1
+            assert found is None, (source, target, found)
+        else:
+            assert found is not None and math.isclose(found, expected, rel_tol=1e-9), (source, target, found, expected)
+    return unreachable
+
+
+def test_walking_matches_dijkstra():
+    """A* agrees with Dijkstra on every walking query."""
+    for seed in range(3):
+        check_against_dijkstra('walking', seed)
+
+
+def test_bicycling_matches_dijkstra():
+    """With walking-only edges left out, some pairs are unreachable by bike."""
+    unreachable = sum(check_against_dijkstra('bicycling', seed) for seed in range(3))
+    assert unreachable > 0
+
+
+def test_same_node():
+    """A path from a node to itself is empty."""
+    router = StreetRouter(random_graph(random.Random(0)), 'walking', CITY)
+    assert router.shortest_path(5, 5) == 0.0
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
@@ -0,0 +1,149 @@
+"""
+Tests for the local RAPTOR transit router (transit_router.py) on a tiny
+synthetic GTFS feed, so they run without any downloaded data.
+
+The feed has two weekday routes in America/Toronto:
+
+    Line 1: A -> B -> C, departing A at 08:00 and 23:10 (and 24:30, i.e.
+            00:30 the next morning on the previous day's service)
+    Line 2: C -> D, departing C at 08:15
+
+Run with pytest, or directly: python test_transit_router.py
+"""
+import os
+import tempfile
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from transit_router import TransitRouter
+
+TORONTO = ZoneInfo('America/Toronto')
+
+CITY = {'center': {'lat': 43.65, 'lng': -79.38}, 'radius_meters': 10000}
+
+STOPS = {
+    'A': (43.60, -79.38),
+    'B': (43.63, -79.38),
+    'C': (43.66, -79.38),
+    'D': (43.66, -79.34)
+}
+
+FEED = {
+    'agency': [
+        'agency_id,agency_name,agency_url,agency_timezone',
+        'T,Test Transit,https://example.com,America/Toronto'
+    ],
+    'stops': ['stop_id,stop_name,stop_lat,stop_lon'] + [
+        f'{stop_id},Stop {stop_id},{lat},{lng}' for stop_id, (lat, lng) in STOPS.items()
+    ],
+    'calendar': [
+        'service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date',
+        'WD,1,1,1,1,1,0,0,20260101,20261231'
+    ],
+    'trips': [
+        'route_id,service_id,trip_id',
+        '1,WD,1-morning',
+        '1,WD,1-night',
+        '1,WD,1-late',
+        '2,WD,2-morning'
+    ],
+    'stop_times': [
+        'trip_id,arrival_time,departure_time,stop_id,stop_sequence',
+        '1-morning,08:00:00,08:00:00,A,1',
+        '1-morning,08:05:00,08:05:00,B,2',
+        '1-morning,08:10:00,08:10:00,C,3',
+        '1-night,23:10:00,23:10:00,A,1',
+        '1-night,23:15:00,23:15:00,B,2',
+        '1-night,23:20:00,23:20:00,C,3',
+        '1-late,24:30:00,24:30:00,A,1',
+        '1-late,24:35:00,24:35:00,B,2',
+        '1-late,24:40:00,24:40:00,C,3',
+        '2-morning,08:15:00,08:15:00,C,1',
+        '2-morning,08:25:00,08:25:00,D,2'
+    ]
+}
+
+# Walking the 6.7 km from A to C takes about 107 minutes
+WALK_A_TO_C = 6415
+
+_router = None
+
+
+def build_router():
+    """The router over the synthetic feed (built once)."""
+    global _router
+    if _router is None:
+        with tempfile.TemporaryDirectory() as gtfs_dir:
+            for name, lines in FEED.items():
+                with open(os.path.join(gtfs_dir, f'{name}.txt'), 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+            _router = TransitRouter.from_gtfs(gtfs_dir, CITY)
+    return _router
+
+
+def eta(origin, destination, departure):
+    """(duration_seconds, distance_meters) between two stops of the feed."""
+    return build_router().query(*STOPS[origin], [STOPS[destination]], departure)[0]
+
+
+def test_reads_agency_timezone():
+    """The feed's agency_timezone becomes the router's clock."""
+    assert build_router().timezone == TORONTO
+
+
+def test_single_ride():
+    """Boarding at the origin stop and riding to the destination stop."""
+    duration, distance = eta('A', 'C', datetime(2026, 6, 1, 8, 0, tzinfo=TORONTO))
+    assert duration == 600
+    assert 6600 < distance < 6750
+
+
+def test_waits_for_next_departure():
+    """Leaving a few minutes early adds the wait to the journey."""
+    duration, _ = eta('A', 'C', datetime(2026, 6, 1, 7, 55, tzinfo=TORONTO))
+    assert duration == 900
+
+
+def test_transfer():
+    """Two rides with a transfer at C, in the second round."""
+    duration, _ = eta('A', 'D', datetime(2026, 6, 1, 8, 0, tzinfo=TORONTO))
+    assert duration == 1500
+
+
+def test_walks_when_no_service():
+    """On a Saturday nothing runs, so the ETA is the walk."""
+    duration, _ = eta('A', 'C', datetime(2026, 6, 6, 8, 0, tzinfo=TORONTO))
+    assert abs(duration - WALK_A_TO_C) < 20
+
+
+def test_after_midnight_trip():
+    """A 24:30:00 trip runs in the small hours on the previous day's service."""
+    duration, _ = eta('A', 'C', datetime(2026, 6, 6, 0, 20, tzinfo=TORONTO))
+    assert duration == 1200
+
+
+def test_utc_departure_uses_agency_timezone():
+    """
+    03:00 UTC on Saturday 6 June is 23:00 on Friday in Toronto, so the
+    Friday 23:10 trip is found (read as Saturday 03:00, nothing would run).
+    """
+    duration, _ = eta('A', 'C', datetime(2026, 6, 6, 3, 0, tzinfo=timezone.utc))
+    assert duration == 1200
+
+
+def test_naive_departure_is_feed_time():
+    """Naive datetimes are taken to be on the feed's clock already."""
+    assert eta('A', 'C', datetime(2026, 6, 1, 8, 0)) == eta('A', 'C', datetime(2026, 6, 1, 8, 0, tzinfo=TORONTO))
+
+
+def test_etas_many_origins():
+    """etas() answers each origin to one destination."""
+    results = build_router().etas([STOPS['A'], STOPS['B']], STOPS['C'], datetime(2026, 6, 1, 8, 0, tzinfo=TORONTO))
+    assert [duration for duration, _ in results] == [600, 600]
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✓ {name}")
@@ -0,0 +1,301 @@
+"""
+Lightweight request tracing.
+
+A trace is a tree of timed spans: a root span per /random-destination
+request, a child span per generation attempt and a grandchild span per
+Google Maps call. The current span is kept in a context variable, so work
+submitted to a thread pool with a copy of the caller's context
+(contextvars.copy_context) continues the caller's trace.
+
+A trace's spans are buffered until its root span ends, and then either
+dropped or written together: every trace is kept with probability
+sample_rate, and traces slower than slow_seconds are always kept. Kept
+spans are written as JSON lines by a background thread, like the logs.
+Rotating a file several processes append to isn't safe, so each process
+writes its own size-rotated file next to the configured path
+(traces.<pid>.jsonl for traces.jsonl), and read_spans() reads them all.
+"""
+import contextvars
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_collector = contextvars.ContextVar('span_collector', default=None)
+
+
+class Trace:
+    """The spans of one trace, buffered until its root span ends."""
+
+    def __init__(self, sampled):
+        self.trace_id = uuid.uuid4().hex
+        self.sampled = sampled
+        self.spans = []
+        self.finished = False
+        self.kept = False
+        self.lock = threading.Lock()
+
+
+class Span:
+    """One timed operation in a trace, with free-form attributes."""
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        """Add or overwrite attributes (also after the span ended)."""
+        self.attributes.update(attributes)
+
+    def end(self, error=None):
+        """Stop the span's clock."""
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self):
+        """The span as one JSON-serializable record."""
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration': round(self.duration, 6) if self.duration is not None else None,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class SpanFormatter(logging.Formatter):
+    """Formats a record whose msg is a span dict as one JSON line."""
+
+    def format(self, record):
+        return json.dumps(record.msg, default=str, separators=(',', ':'))
+
+
+class Tracer:
+    """
+    Creates spans and exports kept traces.
+
+    - path: JSON Lines file the spans are written next to; this process
+      writes process_path(path).
+    - sample_rate: fraction of traces kept regardless of duration.
+    - slow_seconds: traces whose root span took at least this long are
+      always kept (None: only sampling decides).
+    - max_bytes / backups: rotation of the file.
+
+    With sample_rate 0 and no slow_seconds, tracing is off and every span
+    is a no-op.
+    """
+
+    def __init__(self, path, sample_rate=0.1, slow_seconds=None, max_bytes=10 * 1024 * 1024, backups=3):
+        self.path = path
+        self.file = process_path(path)
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.enabled = sample_rate > 0 or slow_seconds is not None
+        self._listener = None
+
+        if self.enabled:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(self.file, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(SpanFormatter())
+            self._queue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(self._queue, handler)
+            self._listener.start()
+
+    def close(self):
+        """Write out the queued spans and stop the writer thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def _export(self, spans):
+        # Serialized by the writer thread, not the request thread
+        for span in spans:
+            self._queue.put_nowait(logging.makeLogRecord({'msg': span.to_dict()}))
+
+    @contextmanager
+    def _run(self, span):
+        token = _current_span.set(span)
+        collector = _collector.get()
+        if collector is not None:
+            collector.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        else:
+            span.end()
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span):
+        trace = span.trace
+        with trace.lock:
+            if span.parent_id is None:
+                trace.finished = True
+                trace.kept = trace.sampled or (
+                    self.slow_seconds is not None and span.duration >= self.slow_seconds
+                )
+                spans, trace.spans = trace.spans + [span], []
+                export = trace.kept
+            elif trace.finished:
+                # Ended after its request (e.g. a losing speculative attempt)
+                spans, export = [span], trace.kept
+            else:
+                trace.spans.append(span)
+                return
+        if export:
+            self._export(spans)
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Start a new trace with a root span; yields it (None when off)."""
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace(sampled=random.random() < self.sample_rate)
+        with self._run(Span(trace, name, None, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Start a child of the current span; yields it, or None (and records
+        nothing) outside a trace.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        with self._run(Span(parent.trace, name, parent.span_id, attributes)) as span:
+            yield span
+
+    def set(self, **attributes):
+        """Add attributes to the current span, if there is one."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    @contextmanager
+    def collect(self):
+        """Yields a list that collects the spans started inside the block."""
+        spans = []
+        token = _collector.set(spans)
+        try:
+            yield spans
+        finally:
+            _collector.reset(token)
+
+
+class TracedClient:
+    """
+    Proxy for a googlemaps.Client that records a span per API method call,
+    named after the method and labelled with the travel mode.
+    """
+
+    def __init__(self, client, tracer):
+        self._client = client
+        self._tracer = tracer
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._tracer.span(f"google.{name}", mode=kwargs.get('mode') or ''):
+                return attr(*args, **kwargs)
+        return call
+
+
+def process_path(path, pid=None):
+    """The file one process (default: this one) writes for path, e.g. traces.123.jsonl."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def read_spans(path):
+    """
+    Every span in path, in the per-process files written for it (see
+    process_path()), and in all their rotated backups (.1, .2, ...).
+    """
+    root, ext = os.path.splitext(path)
+    files = [path] + glob.glob(f"{glob.escape(root)}.*{ext}")
+    paths = sorted({p for file in files for p in [file] + glob.glob(f"{glob.escape(file)}.[0-9]*")
+                    if os.path.exists(p)})
+    spans = []
+    for p in paths:
+        with open(p) as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    return spans
+
+
+def group_traces(spans):
+    """{trace_id: (root span, {span_id: [child spans]})} for traces with a root."""
+    by_trace = {}
+    for span in spans:
+        by_trace.setdefault(span['trace_id'], []).append(span)
+
+    traces = {}
+    for trace_id, trace_spans in by_trace.items():
+        root = next((s for s in trace_spans if s['parent_id'] is None), None)
+        if root is None:
+            continue
+        children = {}
+        for span in trace_spans:
+            if span['parent_id'] is not None:
+                children.setdefault(span['parent_id'], []).append(span)
+        traces[trace_id] = (root, children)
+    return traces
+
+
+def span_end(span):
+    """Epoch time a span dict ended."""
+    return span['start'] + (span['duration'] or 0)
+
+
+def critical_path(span, children, depth=0):
+    """
+    Spans that determined when span ended, as chronological (depth, span)
+    pairs starting with span itself: working back from its end, the child
+    that finished last, then the child that finished last before that one
+    started, and so on, each expanded the same way.
+    """
+    steps = []
+    cursor = span_end(span) + 1e-3
+    remaining = [child for child in children.get(span['span_id'], []) if child['duration'] is not None]
+    while True:
+        before = [child for child in remaining if span_end(child) <= cursor]
+        if not before:
+            break
+        child = max(before, key=span_end)
+        steps.insert(0, critical_path(child, children, depth + 1))
+        cursor = child['start'] + 1e-3
+        remaining = [other for other in before if other is not child]
+    return [(depth, span)] + [step for path in steps for step in path]
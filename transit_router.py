@@ -0,0 +1,455 @@
+"""
+Local transit router over a city's GTFS feed.
+
+Answers earliest-arrival queries with RAPTOR (round-based public transit
+routing): round k scans every route serving a stop that improved in round
+k - 1, so after k rounds each stop holds the earliest arrival using at most
+k vehicles. Trips are grouped into route patterns (trips visiting the same
+stop sequence) with their times in (trips x stops) arrays, so finding the
+next departure is a binary search and no graph of connections is built.
+
+Access, egress and transfers are walked in straight lines at WALK_SPEED
+with a detour factor, which is what most ETA estimates from a stop-level
+timetable come down to anyway.
+
+Timetables are in the feed's agency_timezone (agency.txt): departures are
+converted into it before picking the service day and the time of day, so
+the answer doesn't depend on the server's time zone.
+"""
+import math
+import threading
+from array import array
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from gtfs import TransitStops, read_gtfs_table
+
+# Walking assumptions for access, egress and transfers
+WALK_SPEED = 1.3  # m/s
+WALK_DETOUR = 1.25
+
+# Farthest a stop can be from an origin or destination to walk to it
+ACCESS_RADIUS_METERS = 1000
+
+# Farthest two stops can be apart to transfer between them on foot
+TRANSFER_RADIUS_METERS = 250
+
+# Most vehicles a journey can use
+MAX_ROUNDS = 5
+
+# Journeys longer than this aren't worth reporting
+MAX_TRIP_SECONDS = 3 * 3600
+
+# Dates whose active timetables are kept built
+TIMETABLE_CACHE_DAYS = 3
+
+INF = float('inf')
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def parse_gtfs_time(value):
+    """Seconds after midnight of the service day for an H:MM:SS GTFS time (may exceed 24h)."""
+    hours, minutes, seconds = value.strip().split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def walk_seconds(meters):
+    """Time to walk a straight-line distance, allowing for detours."""
+    return meters * WALK_DETOUR / WALK_SPEED
+
+
+def split_overtaking(departures, arrivals):
+    """
+    Split the trips of one stop pattern (rows, sorted by first departure)
+    into groups in which no trip overtakes another, so each stop's
+    departure column is sorted within a group. Returns lists of row indices.
+    """
+    groups = []
+    for row in range(len(departures)):
+        for group in groups:
+            last = group[-1]
+            if (departures[row] >= departures[last]).all() and (arrivals[row] >= arrivals[last]).all():
+                group.append(row)
+                break
+        else:
+            groups.append([row])
+    return groups
+
+
+class TransitRouter:
+    """
+    RAPTOR earliest-arrival router for one city's GTFS feed.
+
+    Built with from_gtfs(); query() answers one origin to many destinations,
+    etas() many origins to one destination.
+    """
+
+    def __init__(self, stops, patterns, services, calendar, exceptions, max_distance, timezone=None):
+        """
+        - stops: TransitStops of every boarding stop the router knows.
+        - patterns: list of (stop_indices, departures, arrivals, trip_services)
+          where the time arrays are (trips x stops) and trip_services gives
+          each trip's service index.
+        - services: list of service_ids, by index.
+        - calendar: service index -> (weekday flags, start date, end date).
+        - exceptions: date -> {service index: True (added) / False (removed)}.
+        - max_distance: meters from the city centre the router covers.
+        - timezone: the tzinfo the timetable's times are in (None: the
+          server's local time).
+        """
+        self.stops = stops
+        self.timezone = timezone
+        self.services = services
+        self.calendar = calendar
+        self.exceptions = exceptions
+        self.max_distance = max_distance
+
+        self.pattern_stops = [stop_indices.tolist() for stop_indices, _, _, _ in patterns]
+        self.pattern_departures = [departures for _, departures, _, _ in patterns]
+        self.pattern_arrivals = [arrivals for _, _, arrivals, _ in patterns]
+        self.pattern_services = [trip_services for _, _, _, trip_services in patterns]
+
+        # Along-route distance from each pattern's first stop, so journeys
+        # can report a distance as well as a duration
+        xs, ys = stops.projection.to_xy(stops.lats, stops.lngs)
+        self.xs, self.ys = xs.tolist(), ys.tolist()
+        self.pattern_offsets = []
+        for stop_indices in self.pattern_stops:
+            offsets = [0.0]
+            for a, b in zip(stop_indices, stop_indices[1:]):
+                offsets.append(offsets[-1] + math.hypot(self.xs[b] - self.xs[a], self.ys[b] - self.ys[a]))
+            self.pattern_offsets.append(offsets)
+
+        # Patterns (and positions along them) serving each stop
+        self.stop_patterns = [[] for _ in range(len(stops))]
+        for pattern, stop_indices in enumerate(self.pattern_stops):
+            for position, stop in enumerate(stop_indices):
+                self.stop_patterns[stop].append((pattern, position))
+
+        # Walking transfers between nearby stops
+        self.transfers = []
+        for stop in range(len(stops)):
+            links = []
+            for other in stops.tree.within(self.xs[stop], self.ys[stop], TRANSFER_RADIUS_METERS):
+                if other != stop:
+                    meters = math.hypot(self.xs[other] - self.xs[stop], self.ys[other] - self.ys[stop])
+                    links.append((other, walk_seconds(meters), meters))
+            self.transfers.append(links)
+
+        # Latest time in the feed, past 24:00:00 if trips run after midnight
+        self.latest_time = max((int(arrivals.max()) for arrivals in self.pattern_arrivals), default=0)
+
+        self._timetables = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.pattern_stops)
+
+    @classmethod
+    def from_gtfs(cls, gtfs_dir, city_config, margin_meters=5000):
+        """
+        Build a router from an unzipped GTFS feed, keeping the stops within
+        a city's radius plus a margin (so journeys can leave the city and
+        come back) and every trip's visits to them.
+        """
+        stops = TransitStops.from_gtfs(gtfs_dir, city_config, margin_meters=margin_meters)
+        stop_index = {stop_id: i for i, stop_id in enumerate(stops.ids)}
+
+        services = []
+        service_index = {}
+        trip_index = {}
+        trip_services = []
+        for row in read_gtfs_table(gtfs_dir, 'trips'):
+            service = service_index.setdefault(row['service_id'], len(service_index))
+            if service == len(services):
+                services.append(row['service_id'])
+            trip_index[row['trip_id']] = len(trip_services)
+            trip_services.append(service)
+
+        # stop_times can run to millions of rows, so keep the columns in
+        # compact arrays rather than per-row objects
+        trips, sequences, stop_ids, arrivals, departures = (array('l') for _ in range(5))
+        for row in read_gtfs_table(gtfs_dir, 'stop_times'):
+            stop = stop_index.get(row['stop_id'])
+            trip = trip_index.get(row['trip_id'])
+            arrival = row.get('arrival_time') or row.get('departure_time')
+            if stop is None or trip is None or not arrival:
+                continue
+            trips.append(trip)
+            sequences.append(int(row['stop_sequence']))
+            stop_ids.append(stop)
+            arrivals.append(parse_gtfs_time(arrival))
+            departures.append(parse_gtfs_time(row.get('departure_time') or arrival))
+
+        trips, sequences, stop_ids, arrivals, departures = (
+            np.frombuffer(column, dtype=column.typecode) if len(column) else np.empty(0, dtype=np.int64)
+            for column in (trips, sequences, stop_ids, arrivals, departures)
+        )
+        order = np.lexsort((sequences, trips))
+        trips, stop_ids, arrivals, departures = trips[order], stop_ids[order], arrivals[order], departures[order]
+
+        # Group trips by the exact sequence of stops they visit
+        bounds = np.flatnonzero(np.diff(trips)) + 1
+        by_sequence = {}
+        for lo, hi in zip(np.concatenate([[0], bounds]).tolist(), np.concatenate([bounds, [len(trips)]]).tolist()):
+            if hi - lo >= 2:
+                by_sequence.setdefault(tuple(stop_ids[lo:hi].tolist()), []).append((lo, hi))
+
+        patterns = []
+        for sequence, ranges in by_sequence.items():
+            pattern_departures = np.array([departures[lo:hi] for lo, hi in ranges], dtype=np.int32)
+            pattern_arrivals = np.array([arrivals[lo:hi] for lo, hi in ranges], dtype=np.int32)
+            pattern_services = np.array([trip_services[trips[lo]] for lo, _ in ranges], dtype=np.int32)
+
+            by_start = np.argsort(pattern_departures[:, 0], kind='stable')
+            pattern_departures = pattern_departures[by_start]
+            pattern_arrivals = pattern_arrivals[by_start]
+            pattern_services = pattern_services[by_start]
+
+            for group in split_overtaking(pattern_departures, pattern_arrivals):
+                patterns.append((
+                    np.array(sequence),
+                    pattern_departures[group],
+                    pattern_arrivals[group],
+                    pattern_services[group]
+                ))
+
+        calendar, exceptions = cls.read_calendar(gtfs_dir, service_index)
+        max_distance = city_config['radius_meters'] + margin_meters
+        timezone = cls.read_timezone(gtfs_dir)
+        return cls(stops, patterns, services, calendar, exceptions, max_distance, timezone)
+
+    @staticmethod
+    def read_timezone(gtfs_dir):
+        """
+        The agency_timezone of agency.txt as a ZoneInfo, or None if the file
+        is missing or doesn't name one.
+        """
+        try:
+            for row in read_gtfs_table(gtfs_dir, 'agency'):
+                name = (row.get('agency_timezone') or '').strip()
+                if name:
+                    return ZoneInfo(name)
+        except FileNotFoundError:
+            pass
+        return None
+
+    @staticmethod
+    def read_calendar(gtfs_dir, service_index):
+        """
+        Read calendar.txt and calendar_dates.txt (either may be missing).
+        Returns (calendar, exceptions) as described in __init__.
+        """
+        calendar = {}
+        exceptions = {}
+
+        try:
+            for row in read_gtfs_table(gtfs_dir, 'calendar'):
+                service = service_index.get(row['service_id'])
+                if service is None:
+                    continue
+                calendar[service] = (
+                    tuple(row[day] == '1' for day in WEEKDAYS),
+                    datetime.strptime(row['start_date'], '%Y%m%d').date(),
+                    datetime.strptime(row['end_date'], '%Y%m%d').date()
+                )
+        except FileNotFoundError:
+            pass
+
+        try:
+            for row in read_gtfs_table(gtfs_dir, 'calendar_dates'):
+                service = service_index.get(row['service_id'])
+                if service is None:
+                    continue
+                date = datetime.strptime(row['date'], '%Y%m%d').date()
+                exceptions.setdefault(date, {})[service] = row['exception_type'] == '1'
+        except FileNotFoundError:
+            pass
+
+        return calendar, exceptions
+
+    def active_services(self, date):
+        """Indices of the services running on a date."""
+        active = set()
+        for service, (days, start, end) in self.calendar.items():
+            if days[date.weekday()] and start <= date <= end:
+                active.add(service)
+        for service, added in self.exceptions.get(date, {}).items():
+            if added:
+                active.add(service)
+            else:
+                active.discard(service)
+        return active
+
+    def timetable(self, date):
+        """
+        The (departures, arrivals) arrays of each pattern restricted to the
+        trips running on a date, or None for patterns with no trips that day.
+        """
+        with self._lock:
+            if date not in self._timetables:
+                active = np.array(sorted(self.active_services(date)), dtype=np.int32)
+                timetable = []
+                for departures, arrivals, services in zip(
+                        self.pattern_departures, self.pattern_arrivals, self.pattern_services):
+                    running = np.isin(services, active)
+                    timetable.append((departures[running], arrivals[running]) if running.any() else None)
+
+                if len(self._timetables) >= TIMETABLE_CACHE_DAYS:
+                    self._timetables.pop(next(iter(self._timetables)))
+                self._timetables[date] = timetable
+            return self._timetables[date]
+
+    def contains(self, lat, lng):
+        """True if a point is within the area the router covers."""
+        x, y = self.stops.projection.to_xy(lat, lng)
+        return math.hypot(float(x), float(y)) <= self.max_distance
+
+    def walk_links(self, lat, lng):
+        """(stop, seconds, meters) for every stop within walking distance of a point."""
+        x, y = self.stops.projection.to_xy(lat, lng)
+        x, y = float(x), float(y)
+        links = []
+        for stop in self.stops.tree.within(x, y, ACCESS_RADIUS_METERS):
+            meters = math.hypot(self.xs[stop] - x, self.ys[stop] - y)
+            links.append((stop, walk_seconds(meters), meters))
+        return links
+
+    def local_time(self, departure=None):
+        """
+        departure (a datetime, default now) as a naive datetime on the
+        timetable's clock. Aware datetimes are converted into the feed's
+        time zone; naive ones are taken to be on its clock already.
+        """
+        if departure is None:
+            departure = datetime.now(self.timezone)
+        elif departure.tzinfo is not None and self.timezone is not None:
+            departure = departure.astimezone(self.timezone)
+        return departure.replace(tzinfo=None)
+
+    def query(self, lat, lng, destinations, departure=None):
+        """
+        Earliest arrival from one origin to many destinations, leaving at
+        departure (a datetime, default now; see local_time()). Returns one
+        (duration_seconds, distance_meters) tuple per (lat, lng)
+        destination, or None where no journey (walking the whole way
+        included) arrives within MAX_TRIP_SECONDS.
+        """
+        departure = self.local_time(departure)
+        start = departure.hour * 3600 + departure.minute * 60 + departure.second
+        origin_x, origin_y = self.stops.projection.to_xy(lat, lng)
+
+        # Walking the whole way is always an option
+        durations = []
+        distances = []
+        egress = {}
+        for target, (dest_lat, dest_lng) in enumerate(destinations):
+            dest_x, dest_y = self.stops.projection.to_xy(dest_lat, dest_lng)
+            meters = math.hypot(float(dest_x - origin_x), float(dest_y - origin_y))
+            durations.append(walk_seconds(meters))
+            distances.append(meters)
+            for stop, seconds, meters in self.walk_links(dest_lat, dest_lng):
+                egress.setdefault(stop, []).append((target, seconds, meters))
+
+        access = self.walk_links(lat, lng)
+        self.scan(self.timetable(departure.date()), start, access, egress, durations, distances)
+
+        # Trips of the previous service day still running after midnight
+        # (GTFS times past 24:00:00)
+        if start + 86400 < self.latest_time:
+            yesterday = self.timetable(departure.date() - timedelta(days=1))
+            self.scan(yesterday, start + 86400, access, egress, durations, distances)
+
+        return [
+            (round(duration), round(distance)) if duration <= MAX_TRIP_SECONDS else None
+            for duration, distance in zip(durations, distances)
+        ]
+
+    def scan(self, timetable, start, access, egress, durations, distances):
+        """
+        RAPTOR rounds over one service day's timetable from time start (in
+        that day's seconds). access is the origin's walk_links(); egress maps
+        stop -> [(target, seconds, meters)]. durations and distances hold the
+        best journey found so far to each target and are improved in place.
+        """
+        latest = start + MAX_TRIP_SECONDS
+
+        n = len(self.stops)
+        best = [INF] * n
+        previous = [INF] * n
+        previous_distance = [0.0] * n
+        marked = set()
+        for stop, seconds, meters in access:
+            previous[stop] = best[stop] = start + seconds
+            previous_distance[stop] = meters
+            marked.add(stop)
+
+        for _ in range(MAX_ROUNDS):
+            if not marked:
+                break
+            # Stop pruning once no destination can be improved
+            bound = min(latest, start + max(durations))
+
+            # Each pattern is scanned once, from the first marked stop on it
+            queue = {}
+            for stop in marked:
+                for pattern, position in self.stop_patterns[stop]:
+                    if timetable[pattern] is not None and position < queue.get(pattern, INF):
+                        queue[pattern] = position
+
+            current = previous[:]
+            current_distance = previous_distance[:]
+            improved = set()
+            for pattern, first in queue.items():
+                departures, arrivals = timetable[pattern]
+                stops = self.pattern_stops[pattern]
+                offsets = self.pattern_offsets[pattern]
+                trip = None
+                boarded_distance = 0.0
+
+                for position in range(first, len(stops)):
+                    stop = stops[position]
+                    if trip is not None:
+                        arrival = int(arrivals[trip, position])
+                        if arrival < best[stop] and arrival < bound:
+                            current[stop] = best[stop] = arrival
+                            current_distance[stop] = boarded_distance + offsets[position]
+                            improved.add(stop)
+
+                    # Catch an earlier trip if this stop was reached in time for one
+                    ready = previous[stop]
+                    if ready < INF and (trip is None or ready < departures[trip, position]):
+                        earlier = int(np.searchsorted(departures[:, position], ready))
+                        if earlier < len(departures) and (trip is None or earlier < trip):
+                            trip = earlier
+                            boarded_distance = previous_distance[stop] - offsets[position]
+
+            # Walk to nearby stops for the next round's transfers
+            marked = set(improved)
+            for stop in improved:
+                for other, seconds, meters in self.transfers[stop]:
+                    arrival = current[stop] + seconds
+                    if arrival < best[other] and arrival < bound:
+                        current[other] = best[other] = arrival
+                        current_distance[other] = current_distance[stop] + meters
+                        marked.add(other)
+
+            for stop in marked:
+                for target, seconds, meters in egress.get(stop, ()):
+                    duration = current[stop] + seconds - start
+                    if duration < durations[target]:
+                        durations[target] = duration
+                        distances[target] = current_distance[stop] + meters
+
+            previous, previous_distance = current, current_distance
+
+    def etas(self, origins, destination, departure=None):
+        """
+        (duration_seconds, distance_meters) or None from each (lat, lng)
+        origin to one (lat, lng) destination.
+        """
+        departure = self.local_time(departure)
+        return [self.query(lat, lng, [destination], departure)[0] for lat, lng in origins]
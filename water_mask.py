@@ -0,0 +1,96 @@
+"""
+Precomputed land/water masks, so checking whether a point is on water is an
+in-process array lookup instead of a reverse geocode.
+
+A mask covers one city's radius with a regular grid. Each cell is one bit
+(1 = water), packed into a .npy file that is memory-mapped at load time,
+with the grid layout stored next to it in a small JSON file.
+Masks are built offline from a local water (or land) polygon file with:
+
+    python -m etaguessr build-water-mask --city toronto --polygons water.geojson
+"""
+import json
+import os
+
+import numpy as np
+
+from geo import city_grid, grid_cells, rasterize_polygons
+
+# Default cell size of a water mask, in meters
+DEFAULT_RESOLUTION_METERS = 25
+
+
+class WaterMask:
+    """
+    Memory-mapped, bit-packed land/water grid for one city.
+    """
+
+    def __init__(self, bits, grid):
+        self.bits = bits
+        self.grid = grid
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a mask written by save_water_mask(). The bit array is
+        memory-mapped, so loading is cheap and shared between processes.
+        """
+        with open(metadata_path(path)) as f:
+            grid = json.load(f)
+        return cls(np.load(path, mmap_mode='r'), grid)
+
+    def is_water(self, lat, lng):
+        """
+        True if the point is on water, False if on land, or None if the
+        point is outside the area the mask covers.
+        """
+        row = int((lat - self.grid['south']) // self.grid['dlat'])
+        col = int((lng - self.grid['west']) // self.grid['dlng'])
+        if not (0 <= row < self.grid['rows'] and 0 <= col < self.grid['cols']):
+            return None
+        return bool((self.bits[row, col >> 3] >> (7 - (col & 7))) & 1)
+
+    def is_water_many(self, lats, lngs):
+        """
+        Vectorized is_water() for arrays of points.
+        Returns (on_water, covered) boolean arrays; on_water is False wherever
+        covered is False.
+        """
+        rows, cols, covered = grid_cells(self.grid, lats, lngs)
+        on_water = np.zeros(covered.shape, dtype=bool)
+        r, c = rows[covered], cols[covered]
+        on_water[covered] = ((self.bits[r, c >> 3] >> (7 - (c & 7))) & 1).astype(bool)
+        return on_water, covered
+
+
+def metadata_path(path):
+    """JSON file holding the grid layout for a mask file."""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def build_water_mask(city_config, polygons, polygons_are='water',
+                     resolution_meters=DEFAULT_RESOLUTION_METERS):
+    """
+    Rasterize polygons over a city's grid.
+    polygons_are says whether the polygons describe water (lakes, sea, rivers)
+    or land (e.g. a land polygon / coastline dataset, inverted here).
+    Returns (water, grid) where water is a (rows, cols) boolean array.
+    """
+    if polygons_are not in ('water', 'land'):
+        raise ValueError(f"polygons_are must be 'water' or 'land', not {polygons_are!r}")
+
+    grid = city_grid(city_config, resolution_meters)
+    inside = rasterize_polygons(polygons, grid)
+    water = inside if polygons_are == 'water' else ~inside
+    return water, grid
+
+
+def save_water_mask(path, water, grid):
+    """Write a mask as a bit-packed .npy file plus its JSON grid layout."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    np.save(path, np.packbits(water, axis=1))
+    with open(metadata_path(path), 'w') as f:
+        json.dump(grid, f, indent=2)